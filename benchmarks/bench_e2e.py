@@ -0,0 +1,202 @@
+"""
+Сквозной бенчмарк: настоящий вход, запрос выгрузок, скачивание, разбор и запись отчетов против локальной
+замены МТС Линк (benchmarks/fake_mts_link.py, запускается отдельным процессом). Печатает пропускную способность
+(мероприятий в минуту) и задержки этапов (p50/p95 по интервалам metrics) и сохраняет их в JSON.
+
+По умолчанию выгрузки скачиваются через HTTP (http_export), а вход восстанавливается из кэша сессии,
+поэтому Chrome не нужен. С --browser вход и клики по кнопкам выполняет Selenium, как на настоящем сайте.
+
+Запуск:
+    python -m benchmarks.bench_e2e --events 20 --rows 2000 --latency-ms 50 --output e2e.json
+    python -m benchmarks.bench_e2e --events 20 --failure-rate 0.05 --export-timeout-rate 0.1 --export-timeout-sec 5
+    python -m benchmarks.bench_e2e --events 5 --browser
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reporter import config, metrics, session_store
+from reporter.config_loader import load_config
+from benchmarks.bench_pipeline import metadata
+
+
+def start_server(args, data_dir):
+    """
+    Запускает fake_mts_link отдельным процессом и ждет готовности.
+    :return: Пара (процесс, базовый URL).
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    command = [
+        sys.executable, "-m", "benchmarks.fake_mts_link", "--config", args.config, "--port", str(port),
+        "--data-dir", data_dir, "--rows", str(args.rows), "--latency-ms", str(args.latency_ms),
+        "--jitter-ms", str(args.jitter_ms), "--failure-rate", str(args.failure_rate),
+        "--export-delay-sec", str(args.export_delay_sec), "--export-timeout-rate", str(args.export_timeout_rate),
+    ]
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    base_url = f"http://127.0.0.1:{port}"
+    # Первый запуск генерирует синтетические выгрузки, поэтому ожидание щедрое
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {process.returncode}")
+        try:
+            requests.get(f"{base_url}/__stats", timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Сервер не запустился за отведенное время")
+
+
+def bench_config(args, base_url, work_dir):
+    """Конфиг отчета, направленный на локальный сервер; состояние (кэш, база, сессия) — во временной директории."""
+    overrides = {
+        'source_settings': {
+            'login_url': f"{base_url}/",
+            'session_cache': {'enabled': not args.browser, 'path': os.path.join(work_dir, "session.json"),
+                              'check_url': f"{base_url}/check", 'check_marker': None},
+            'http_export': {'enabled': not args.browser, 'poll_interval_sec': 0.2, 'timeout_sec': args.export_timeout_sec},
+            'network_capture': {'enabled': True, 'timeout_sec': args.export_timeout_sec},
+        },
+        'processing_settings': {
+            'parse_cache': {'enabled': False},
+            'attendee_db': {'path': os.path.join(work_dir, "attendees.sqlite3")},
+        },
+        'pipeline': {'enabled': not args.sequential, 'max_concurrent_events': args.concurrency},
+        'metrics': {'trace_dir': None},
+    }
+    if args.no_rate_limit:
+        overrides['rate_limit'] = {'requests_per_sec': None}
+    return load_config(args.config, overrides=overrides)
+
+
+def seed_session(base_url, cache_path):
+    """Входит на сервер через форму по HTTP и сохраняет cookies, как после входа через Selenium."""
+    session = requests.Session()
+    session.post(f"{base_url}/login", data={'email': "bench@example.com", 'password': "bench"}, allow_redirects=False)
+    cookies = [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in session.cookies]
+    session_store.save_session(cache_path, cookies, max_age_hours=1)
+
+
+def run_events(report_config, base_url, events_count, work_dir):
+    """
+    Обрабатывает events_count мероприятий и замеряет общее время.
+    :return: Пара (результаты по мероприятиям, время в секундах).
+    """
+    from reporter import BrowserManager, pipeline, process_event, rate_limit
+    browser_manager = BrowserManager(output_dir=os.path.join(work_dir, "downloads"), report_config=report_config,
+                                     rate_limiter=rate_limit.from_settings(report_config.get('rate_limit')))
+    os.makedirs(browser_manager.output_dir, exist_ok=True)
+    events = [(f"{base_url}/event/{i}", os.path.join(work_dir, "reports", f"event_{i}")) for i in range(events_count)]
+    try:
+        started = time.perf_counter()
+        if not browser_manager.login():
+            raise RuntimeError("Не удалось войти на локальный сервер")
+        if (report_config.get('pipeline') or {}).get('enabled'):
+            results = pipeline.run(browser_manager, events, report_config)
+        else:
+            results = []
+            for page_url, report_dir in events:
+                with metrics.span('event', url=page_url) as event_span:
+                    ok, error = process_event(browser_manager, page_url, report_config, report_dir)
+                    event_span['status'] = 'ok' if ok else 'error'
+                results.append({'url': page_url, 'status': 'ok' if ok else 'failed', 'error': error})
+        return results, time.perf_counter() - started
+    finally:
+        browser_manager.quit_driver()
+
+
+def stage_latencies(spans):
+    """Сводит интервалы metrics по этапам: число, p50, p95, максимум и сумма в секундах."""
+    by_name = defaultdict(list)
+    for record in spans:
+        by_name[record['name']].append(record.get('wall_sec', 0.0))
+    stages = {}
+    for name, values in by_name.items():
+        values.sort()
+        stages[name] = {
+            'count': len(values),
+            'p50_sec': values[int(0.5 * (len(values) - 1))],
+            'p95_sec': values[int(0.95 * (len(values) - 1))],
+            'max_sec': values[-1],
+            'total_sec': sum(values),
+        }
+    return stages
+
+
+def print_result(result):
+    run = result['run']
+    print(f"\nМероприятий: {run['events']}, успешно {run['succeeded']}, за {run['wall_sec']:.1f} с "
+          f"-> {run['events_per_minute']:.1f} мероприятий/мин")
+    print(f"  {'этап':<20} {'число':>6} {'p50, с':>9} {'p95, с':>9} {'макс, с':>9}")
+    for name, stage in sorted(result['stages'].items(), key=lambda item: -item[1]['total_sec']):
+        print(f"  {name:<20} {stage['count']:>6} {stage['p50_sec']:>9.3f} {stage['p95_sec']:>9.3f} {stage['max_sec']:>9.3f}")
+    print(f"  сервер: {result['server']}")
+    for failure in result['failures']:
+        print(f"  [FAIL] {failure['url']}: {failure['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк конвейера против локальной замены МТС Линк.")
+    parser.add_argument("-c", "--config", default="configs/mts_link_report.yaml")
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--rows", type=int, default=1000, help="Сеансов в выгрузке статистики каждого мероприятия.")
+    parser.add_argument("--data-dir", default="bench_data", help="Директория для синтетических файлов (переиспользуются).")
+    parser.add_argument("--concurrency", type=int, default=2, help="pipeline.max_concurrent_events.")
+    parser.add_argument("--sequential", action="store_true", help="Обрабатывать мероприятия по одному, без конвейера.")
+    parser.add_argument("--browser", action="store_true", help="Вход и выгрузки через Chrome (Selenium).")
+    parser.add_argument("--no-rate-limit", action="store_true", help="Отключить ограничение частоты запросов из конфига.")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--export-delay-sec", type=float, default=0.5)
+    parser.add_argument("--export-timeout-rate", type=float, default=0.0)
+    parser.add_argument("--export-timeout-sec", type=float, default=30, help="Сколько ждать готовности выгрузки.")
+    parser.add_argument("--output", help="Сохранить результат в JSON.")
+    args = parser.parse_args()
+
+    # Форма локального сервера принимает любые учетные данные
+    config.LOGIN = config.LOGIN or "bench@example.com"
+    config.PASSWORD = config.PASSWORD or "bench"
+    os.makedirs(args.data_dir, exist_ok=True)
+    process, base_url = start_server(args, os.path.abspath(args.data_dir))
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            report_config = bench_config(args, base_url, work_dir)
+            if not args.browser:
+                seed_session(base_url, report_config['source_settings']['session_cache']['path'])
+            metrics.reset()
+            results, wall = run_events(report_config, base_url, args.events, work_dir)
+        succeeded = sum(1 for r in results if r['status'] == 'ok')
+        result = {
+            'meta': {**metadata(), 'args': vars(args)},
+            'run': {'events': len(results), 'succeeded': succeeded, 'wall_sec': wall,
+                    'events_per_minute': succeeded / wall * 60 if wall else 0.0},
+            'stages': stage_latencies(metrics.spans()),
+            'server': requests.get(f"{base_url}/__stats", timeout=5).json(),
+            'failures': [{'url': r['url'], 'error': r['error']} for r in results if r['status'] != 'ok'],
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+    print_result(result)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультат сохранен: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Бенчмарк этапов обработки data_processor на синтетических выгрузках.
+Для каждого размера входных данных измеряет время (wall/CPU) и пиковую память (tracemalloc) этапов:
+чтение статистики, _filter_data, сведение сеансов к участникам (sessions.aggregate), _create_geography_df, _create_webinar_df, чтение чата
+и запись каждого выходного файла. Результат сохраняется в JSON, который можно сравнить с прошлым запуском.
+
+Запуск:
+    python -m benchmarks.bench_pipeline --rows 1000 10000 100000 --output bench_result.json
+    python -m benchmarks.bench_pipeline --rows 10000 --compare bench_result.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reporter import data_processor, excel_reader, report_writer, sessions
+from reporter.config_loader import load_config
+from benchmarks import synthetic_data
+
+
+def run_pipeline(stats_path, chat_path, report_config, out_dir, trace_memory):
+    """
+    Прогоняет этапы обработки по очереди и измеряет каждый.
+    :param trace_memory: Включить tracemalloc (точная пиковая память, но медленнее).
+    :return: Словарь {этап: {'wall_sec', 'cpu_sec', 'peak_mb', 'rows'}}.
+    """
+    proc_settings = report_config['processing_settings']
+    stages = {}
+
+    def measure(name, fn):
+        if trace_memory:
+            tracemalloc.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = fn()
+        stage = {'wall_sec': time.perf_counter() - wall, 'cpu_sec': time.process_time() - cpu}
+        if trace_memory:
+            stage['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            tracemalloc.stop()
+        if isinstance(result, pd.DataFrame):
+            stage['rows'] = len(result)
+        stages[name] = stage
+        return result
+
+    df = measure('read_statistics', lambda: excel_reader.read_sheet_columns(
+        stats_path, proc_settings['sheet_name'], proc_settings['column_map'], proc_settings.get('dtypes')))
+    df = measure('filter_data', lambda: data_processor._filter_data(df, report_config))
+
+    def aggregate():
+        # Как в data_processor._load_statistics: присутствие по сеансам, затем сведение к строке на участника
+        attended = (data_processor._attendance_mask(df['entry_time'], list(report_config.not_attended_values))
+                    if 'entry_time' in df.columns else None)
+        return sessions.aggregate(df, attended, proc_settings.get('sessions'))
+
+    df = measure('aggregate_sessions', aggregate)
+    geography_df = measure('create_geography_df', lambda: data_processor._create_geography_df(df, report_config))
+    webinar_df = measure('create_webinar_df', lambda: data_processor._create_webinar_df(df, geography_df, None, report_config))
+    chat = measure('read_chat', lambda: data_processor._load_chat(chat_path, report_config))
+
+    sheet_cache = {}
+    for output in report_config.outputs:
+        filepath = os.path.join(out_dir, f"{output.key}.xlsx")
+
+        def write():
+            if output.type == 'attended_emails_only':
+                attended_df = data_processor._create_attended_emails_df(geography_df, filepath, report_config)
+                if attended_df is not None:
+                    report_writer.write_workbook(filepath, [('Sheet1', report_writer.dataframe_rows(attended_df, header=False))])
+            else:
+                sheets = data_processor._build_standard_sheets(filepath, output, geography_df, webinar_df, chat, sheet_cache, report_config)
+                report_writer.write_workbook(filepath, sheets)
+
+        measure(f"write:{output.key}", write)
+    return stages
+
+
+def benchmark(report_config, rows_list, data_dir, trace_memory=True):
+    """Генерирует данные (или берет уже созданные) и измеряет этапы для каждого размера."""
+    runs = []
+    for rows in rows_list:
+        stats_path = os.path.join(data_dir, f"statistic_{rows}.xlsx")
+        chat_path = os.path.join(data_dir, f"chat_{rows}.xlsx")
+        if not (os.path.exists(stats_path) and os.path.exists(chat_path)):
+            print(f"Генерирую данные: {rows} строк...", file=sys.stderr)
+            stats_path, chat_path = synthetic_data.generate(data_dir, report_config, rows)
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            stages = run_pipeline(stats_path, chat_path, report_config, out_dir, trace_memory=False)
+            if trace_memory:
+                # Память измеряется отдельным прогоном, чтобы tracemalloc не искажал время
+                memory = run_pipeline(stats_path, chat_path, report_config, out_dir, trace_memory=True)
+                for name, stage in memory.items():
+                    stages[name]['peak_mb'] = stage['peak_mb']
+        runs.append({'rows': rows, 'stages': stages})
+        print_run(runs[-1])
+    return runs
+
+
+def metadata():
+    """Сведения об окружении для сопоставимости результатов."""
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = None
+    return {
+        'revision': revision,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def print_run(run):
+    print(f"\n{run['rows']} строк:")
+    for name, stage in run['stages'].items():
+        peak = f"{stage['peak_mb']:8.1f} MB" if 'peak_mb' in stage else ""
+        print(f"  {name:<24} {stage['wall_sec']:8.3f} с  CPU {stage['cpu_sec']:8.3f} с {peak}")
+
+
+def compare(current, baseline):
+    """Печатает отношение времени и памяти текущего запуска к базовому (>1 — стало хуже)."""
+    baseline_runs = {run['rows']: run for run in baseline['runs']}
+    print(f"\nСравнение с {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}):")
+    for run in current['runs']:
+        base = baseline_runs.get(run['rows'])
+        if not base:
+            continue
+        print(f"  {run['rows']} строк:")
+        for name, stage in run['stages'].items():
+            base_stage = base['stages'].get(name)
+            if not base_stage:
+                continue
+            time_ratio = stage['wall_sec'] / base_stage['wall_sec'] if base_stage['wall_sec'] else float('nan')
+            line = f"    {name:<24} время x{time_ratio:5.2f}"
+            if 'peak_mb' in stage and base_stage.get('peak_mb'):
+                line += f"  память x{stage['peak_mb'] / base_stage['peak_mb']:5.2f}"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов обработки отчетов.")
+    parser.add_argument("-c", "--config", default="configs/mts_link_report.yaml")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--data-dir", default="bench_data", help="Директория для синтетических файлов (переиспользуются).")
+    parser.add_argument("--output", help="Сохранить результат в JSON.")
+    parser.add_argument("--compare", help="JSON прошлого запуска для сравнения.")
+    parser.add_argument("--no-memory", action="store_true", help="Не измерять пиковую память.")
+    args = parser.parse_args()
+
+    report_config = load_config(args.config)
+    result = {'meta': metadata(), 'runs': benchmark(report_config, args.rows, args.data_dir, not args.no_memory)}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультат сохранен: {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
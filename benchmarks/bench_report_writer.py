@@ -0,0 +1,82 @@
+"""
+Сравнивает прежнюю запись отчетов (pandas.ExcelWriter, каждый файл и лист заново, последовательно)
+с report_writer (однократная сериализация листов, write-only openpyxl, пул процессов).
+
+Запуск: python -m benchmarks.bench_report_writer --rows 50000 --outputs 3
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reporter import report_writer
+
+
+def make_frames(rows):
+    """Создает листы, похожие на 'география' и 'чат'."""
+    rng = np.random.default_rng(0)
+    geography = pd.DataFrame({
+        "Имя": [f"Имя{i}" for i in range(rows)],
+        "Фамилия": [f"Фамилия{i}" for i in range(rows)],
+        "Email": [f"user{i}@example.com" for i in range(rows)],
+        "Регион": rng.choice(["Москва", "Санкт-Петербург", "Татарстан", None], rows),
+        "Город": rng.choice(["Москва", "Казань", "Пермь"], rows),
+        "Присутствие на вебинаре": rng.choice(["да", "нет"], rows),
+        "Откуда узнали": rng.choice(["Рассылка", "Соцсети", "Коллеги"], rows),
+    })
+    chat = pd.DataFrame({
+        "Время": pd.date_range("2024-01-01 10:00", periods=rows // 2, freq="s"),
+        "Имя": [f"Имя{i} Фамилия{i}" for i in range(rows // 2)],
+        "Сообщение": ["Добрый день! Вопрос по теме вебинара?"] * (rows // 2),
+    })
+    return geography, chat
+
+
+def legacy_write(out_dir, outputs, geography, chat):
+    """Прежний путь: каждая книга и каждый лист сериализуются заново."""
+    for i in range(outputs):
+        with pd.ExcelWriter(os.path.join(out_dir, f"legacy_{i}.xlsx"), engine="openpyxl") as writer:
+            geography.to_excel(writer, sheet_name="география участников", index=False)
+            chat.to_excel(writer, sheet_name="чат", index=False)
+
+
+def new_write(out_dir, outputs, geography, chat, workers):
+    """Новый путь: листы сериализуются один раз и пишутся параллельно."""
+    geo_rows = report_writer.dataframe_rows(geography)
+    chat_rows = report_writer.dataframe_rows(chat)
+    jobs = [
+        (os.path.join(out_dir, f"new_{i}.xlsx"), [("география участников", geo_rows), ("чат", chat_rows)])
+        for i in range(outputs)
+    ]
+    report_writer.write_workbooks(jobs, max_workers=workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк записи отчетов.")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--outputs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    geography, chat = make_frames(args.rows)
+    with tempfile.TemporaryDirectory() as out_dir:
+        started = time.perf_counter()
+        legacy_write(out_dir, args.outputs, geography, chat)
+        legacy_sec = time.perf_counter() - started
+
+        started = time.perf_counter()
+        new_write(out_dir, args.outputs, geography, chat, args.workers)
+        new_sec = time.perf_counter() - started
+
+    print(f"Строк: {args.rows}, файлов: {args.outputs}")
+    print(f"pandas.ExcelWriter: {legacy_sec:.2f} с")
+    print(f"report_writer:      {new_sec:.2f} с (ускорение x{legacy_sec / new_sec:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Локальная замена МТС Линк для сквозных и нагрузочных тестов без доступа к сайту.
+Отдает то, с чем работают BrowserManager, http_exporter и downloader:
+  /                          форма входа в два шага (email, затем пароль) или кабинет с "Мой тариф" после входа;
+  /check                     200 для авторизованной сессии, иначе 401 (session_cache.check_url);
+  /event/<id>                страница мероприятия: кнопки выгрузок с data-bind "'xls', 'stats'" / "'xls', 'chat'",
+                             уведомление (Snackbar) со ссылкой, метка "Ведущий вебинара:" и виджет новых email;
+  /event/<id>/export/xls/<kind>  JSON {"url": null} пока файл "готовится", затем {"url": "<ссылка на файл>"};
+  /files/<kind>.xlsx         синтетические выгрузки (benchmarks/synthetic_data.py);
+  /__stats                   счетчики запросов и внесенных сбоев.
+Задержка ответов, доля ответов 503 и доля выгрузок, которые никогда не будут готовы, настраиваются.
+
+Запуск:
+    python -m benchmarks.fake_mts_link --port 8900 --rows 5000 --latency-ms 50 --jitter-ms 30 --failure-rate 0.05
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import secrets
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reporter.config_loader import load_config
+from benchmarks import synthetic_data
+
+DEFAULT_SETTINGS = {
+    'rows': 1000,
+    'chat_rows': None,
+    'latency_ms': 0,
+    'jitter_ms': 0,
+    'failure_rate': 0.0,
+    'export_delay_sec': 0.5,
+    'export_timeout_rate': 0.0,
+    'presenter': "Анна Смирнова",
+    'new_emails': 42,
+    'seed': 0,
+}
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Вход</title></head><body>
+<form method="get" action="/login/password">
+  <input type="email" name="email" placeholder="Email">
+  <button type="submit">Продолжить</button>
+</form>
+</body></html>"""
+
+PASSWORD_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Вход</title></head><body>
+<form method="post" action="/login">
+  <input type="hidden" name="email" value="{email}">
+  <input type="password" name="password" placeholder="Пароль">
+  <button type="submit">Войти</button>
+</form>
+</body></html>"""
+
+DASHBOARD_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Кабинет</title></head><body>
+<nav><span>Мой тариф</span></nav>
+</body></html>"""
+
+# Выгрузка, как и на сайте, запрашивается скриптом по клику; ссылка появляется в уведомлении
+EVENT_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Вебинар {event_id}</title>
+<script>
+function exportFile(format, kind) {{
+  var url = location.pathname.replace(/\\/$/, '') + '/export/' + format + '/' + kind;
+  (function poll() {{
+    fetch(url, {{credentials: 'same-origin'}}).then(function (r) {{ return r.json(); }}).then(function (data) {{
+      if (!data.url) {{ setTimeout(poll, 300); return; }}
+      showSnackbar(data.url);
+    }}).catch(function () {{ setTimeout(poll, 1000); }});
+  }})();
+}}
+function showSnackbar(url) {{
+  var bar = document.createElement('div');
+  bar.className = 'MuiSnackbarContent-root';
+  bar.innerHTML = '<span>Файл подготовлен</span> <a href="' + url + '">Скачать</a>' +
+                  '<button class="MuiIconButton-root" type="button">×</button>';
+  bar.querySelector('button').onclick = function () {{ bar.remove(); }};
+  document.body.appendChild(bar);
+}}
+</script></head><body>
+<h1>Синтетический вебинар {event_id}</h1>
+<div>Ведущий вебинара:</div><div>{presenter}</div>
+<table><tr><td data-testid="PlotPie.LabelNumber.visitorsChart.0">{new_emails}</td></tr></table>
+<div>Скачать статистику <a href="#" data-bind="click: function () {{ exportFile('xls', 'stats') }}"
+  onclick="exportFile('xls', 'stats'); return false;">XLS</a></div>
+<div>Скачать чат <a href="#" data-bind="click: function () {{ exportFile('xls', 'chat') }}"
+  onclick="exportFile('xls', 'chat'); return false;">XLS</a></div>
+</body></html>"""
+
+
+class FakeMtsLink:
+    """Состояние сервера: сессии, подготавливаемые выгрузки, файлы и счетчики."""
+    def __init__(self, files, settings):
+        """
+        :param files: Словарь {'stats': путь, 'chat': путь} к отдаваемым выгрузкам.
+        :param settings: DEFAULT_SETTINGS с переопределениями.
+        """
+        self.files = files
+        self.settings = settings
+        self.sessions = set()
+        self.exports = {}  # (сессия, мероприятие, вид) -> время первого запроса
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(settings['seed'])
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def inject(self):
+        """Выдерживает задержку и решает, ответить ли сбоем. :return: True — ответить 503."""
+        latency = self.settings['latency_ms'] + self.random.uniform(0, self.settings['jitter_ms'])
+        if latency:
+            time.sleep(latency / 1000)
+        with self.lock:
+            failed = self.random.random() < self.settings['failure_rate']
+            if failed:
+                self.counters['injected_503'] += 1
+        return failed
+
+    def export_ready(self, sid, event_id, kind):
+        """Выгрузка готова через export_delay_sec после первого запроса; часть мероприятий не готова никогда."""
+        # Решение о "зависшей" выгрузке детерминировано для мероприятия, чтобы повторы вели себя одинаково
+        if zlib.crc32(f"{event_id}:{kind}".encode()) % 10000 < self.settings['export_timeout_rate'] * 10000:
+            return False
+        with self.lock:
+            started = self.exports.setdefault((sid, event_id, kind), time.monotonic())
+        return time.monotonic() - started >= self.settings['export_delay_sec']
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state = None
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if url.path == '/__stats':
+            return self._json(200, dict(self.state.counters))
+        self.state.count('requests')
+        if url.path == '/':
+            self.state.count('login_page')
+            return self._html(DASHBOARD_PAGE if self._session() else LOGIN_PAGE)
+        if url.path == '/login/password':
+            email = (parse_qs(url.query).get('email') or [''])[0]
+            return self._html(PASSWORD_PAGE.format(email=email.replace('"', '')))
+        if url.path == '/check':
+            return self._json(200, {'ok': True}) if self._session() else self._json(401, {'error': 'unauthorized'})
+
+        if self.state.inject():
+            return self._json(503, {'error': 'injected failure'})
+        sid = self._session()
+        if not sid:
+            return self._redirect('/')
+        if len(parts) == 2 and parts[0] == 'event':
+            self.state.count('event_page')
+            return self._html(EVENT_PAGE.format(event_id=parts[1], presenter=self.state.settings['presenter'],
+                                                new_emails=self.state.settings['new_emails']))
+        if len(parts) == 5 and parts[0] == 'event' and parts[2] == 'export' and parts[4] in self.state.files:
+            self.state.count(f"export_poll_{parts[4]}")
+            if not self.state.export_ready(sid, parts[1], parts[4]):
+                return self._json(200, {'url': None, 'status': 'preparing'})
+            return self._json(200, {'url': f"http://{self.headers.get('Host')}/files/{parts[4]}.xlsx"})
+        if len(parts) == 2 and parts[0] == 'files' and parts[1].endswith('.xlsx') and parts[1][:-5] in self.state.files:
+            self.state.count(f"file_{parts[1][:-5]}")
+            return self._file(self.state.files[parts[1][:-5]])
+        return self._json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/login':
+            return self._json(404, {'error': 'not found'})
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        if not form.get('email') or not form.get('password'):
+            return self._html(LOGIN_PAGE, status=401)
+        sid = secrets.token_hex(16)
+        with self.state.lock:
+            self.state.sessions.add(sid)
+            self.state.counters['logins'] += 1
+        self.send_response(302)
+        self.send_header('Location', '/')
+        self.send_header('Set-Cookie', f"sid={sid}; Path=/; HttpOnly")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _session(self):
+        """Возвращает id сессии из cookie, если она выдана этим сервером."""
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == 'sid' and value in self.state.sessions:
+                return value
+        return None
+
+    def _html(self, text, status=200):
+        self._send(status, text.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _json(self, status, body):
+        self._send(status, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _redirect(self, location):
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _file(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        self._send(200, data, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент вправе закрыть keep-alive соединение в любой момент; остальные ошибки печатаются как обычно
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(report_config, settings, data_dir, host='127.0.0.1', port=0):
+    """
+    Готовит выгрузки и создает сервер (не запуская его).
+    :param report_config: Конфиг отчета: имена столбцов и лист синтетической статистики.
+    :param data_dir: Директория для синтетических файлов (переиспользуются между запусками).
+    :return: HTTP-сервер; server.server_port — выбранный порт.
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    stats_path = os.path.join(data_dir, f"statistic_{settings['rows']}.xlsx")
+    chat_path = os.path.join(data_dir, f"chat_{settings['rows']}.xlsx")
+    if settings['chat_rows'] is not None or not (os.path.exists(stats_path) and os.path.exists(chat_path)):
+        stats_path, chat_path = synthetic_data.generate(data_dir, report_config, settings['rows'],
+                                                        settings['chat_rows'], seed=settings['seed'])
+    handler = type('Handler', (_Handler,), {'state': FakeMtsLink({'stats': stats_path, 'chat': chat_path}, settings)})
+    return _Server((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена МТС Линк для сквозных тестов.")
+    parser.add_argument("-c", "--config", default="configs/mts_link_report.yaml")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--data-dir", default="bench_data", help="Директория для синтетических файлов (переиспользуются).")
+    parser.add_argument("--rows", type=int, default=DEFAULT_SETTINGS['rows'], help="Сеансов в выгрузке статистики.")
+    parser.add_argument("--chat-rows", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Задержка каждого ответа.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Случайная добавка к задержке (0..jitter).")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Доля ответов 503 (кроме входа).")
+    parser.add_argument("--export-delay-sec", type=float, default=DEFAULT_SETTINGS['export_delay_sec'],
+                        help="Через сколько секунд после запроса выгрузка готова.")
+    parser.add_argument("--export-timeout-rate", type=float, default=0.0,
+                        help="Доля выгрузок, которые никогда не будут готовы (проверка таймаутов).")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = {
+        'rows': args.rows, 'chat_rows': args.chat_rows, 'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms,
+        'failure_rate': args.failure_rate, 'export_delay_sec': args.export_delay_sec,
+        'export_timeout_rate': args.export_timeout_rate, 'seed': args.seed,
+    }
+    server = make_server(load_config(args.config), settings, args.data_dir, args.host, args.port)
+    print(f"Сервер запущен: http://{args.host}:{server.server_port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
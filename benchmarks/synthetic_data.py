@@ -0,0 +1,140 @@
+"""
+Генератор синтетических выгрузок МТС Линк: лист статистики ("Сеансы входов") и лист чата ("Сообщения чата").
+Имена столбцов берутся из processing_settings.column_map конфига, поэтому файлы совпадают по структуре
+с тем, что ожидает data_processor.
+
+Запуск: python -m benchmarks.synthetic_data --rows 100000 --out-dir bench_data
+"""
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reporter.config_loader import load_config
+
+CHAT_SHEET_NAME = "Сообщения чата"
+CHAT_COLUMNS = ["Время", "Имя", "Email", "Сообщение"]
+
+REGIONS = ["Москва", "Санкт-Петербург", "Татарстан", "Свердловская область", "Новосибирская область", "Краснодарский край"]
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Екатеринбург", "Новосибирск", "Краснодар", "Пермь"]
+ORIGINS = ["Рассылка", "Соцсети", "Коллеги", "Сайт", None]
+MESSAGES = ["Добрый день!", "Спасибо за вебинар", "Когда будет запись?", "Слышно хорошо", "Можно презентацию?", "+"]
+
+
+def generate_statistics(path, report_config, rows, duplicate_rate=0.2, excluded_role_rate=0.02,
+                        not_attended_rate=0.3, seed=0):
+    """
+    Записывает файл статистики с rows строками-сеансами.
+    :param duplicate_rate: Доля строк, повторяющих уже встречавшегося участника (переподключения).
+    :param excluded_role_rate: Доля строк с исключаемыми ролями из filter.roles_to_exclude.
+    :param not_attended_rate: Доля строк со значениями из not_attended_values.
+    :return: Путь к файлу.
+    """
+    proc_settings = report_config['processing_settings']
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 3, 14, 11, 0)
+    end = start + timedelta(hours=1, minutes=30)
+
+    people = max(1, int(rows * (1 - duplicate_rate)))
+    person_ids = np.concatenate([np.arange(people), rng.integers(0, people, rows - people)])
+    rng.shuffle(person_ids)
+
+    excluded_roles = proc_settings.get('filter', {}).get('roles_to_exclude') or ["Ведущий"]
+    not_attended_values = [v for v in proc_settings.get('not_attended_values', []) if v] + [None, ""]
+    role_draw = rng.random(rows)
+    attend_draw = rng.random(rows)
+    entry_offsets = rng.integers(0, 80, rows)
+    watch_minutes = rng.integers(1, 90, rows)
+
+    def value(internal_name, i, pid):
+        if internal_name == 'first_name':
+            return f"Имя{pid}"
+        if internal_name == 'last_name':
+            return f"Фамилия{pid}"
+        if internal_name == 'email':
+            return f"user{pid}@example.com"
+        if internal_name == 'region':
+            return REGIONS[pid % len(REGIONS)]
+        if internal_name == 'city':
+            return CITIES[pid % len(CITIES)]
+        if internal_name == 'start_time':
+            return start
+        if internal_name == 'end_time':
+            return end
+        if internal_name == 'webinar_topic':
+            return "Синтетический вебинар"
+        if internal_name == 'entry_time':
+            if attend_draw[i] < not_attended_rate:
+                return not_attended_values[i % len(not_attended_values)]
+            return start + timedelta(minutes=int(entry_offsets[i]))
+        if internal_name == 'exit_time':
+            if attend_draw[i] < not_attended_rate:
+                return None
+            return min(end, start + timedelta(minutes=int(entry_offsets[i] + watch_minutes[i])))
+        if internal_name == 'origin_question':
+            return ORIGINS[pid % len(ORIGINS)]
+        if internal_name == 'role':
+            return excluded_roles[i % len(excluded_roles)] if role_draw[i] < excluded_role_rate else "Участник"
+        if internal_name == 'event_date':
+            return start.replace(hour=0, minute=0)
+        return f"{internal_name}-{pid}"
+
+    column_map = proc_settings['column_map']
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=proc_settings['sheet_name'])
+    ws.append(list(column_map.keys()))
+    internal_names = list(column_map.values())
+    for i, pid in enumerate(person_ids.tolist()):
+        ws.append([value(name, i, pid) for name in internal_names])
+    wb.save(path)
+    return path
+
+
+def generate_chat(path, rows, participants, seed=0):
+    """Записывает файл чата с rows сообщениями от participants участников."""
+    rng = np.random.default_rng(seed + 1)
+    start = datetime(2024, 3, 14, 11, 0)
+    authors = rng.integers(0, max(1, participants), rows)
+    seconds = np.sort(rng.integers(0, 90 * 60, rows))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=CHAT_SHEET_NAME)
+    ws.append(CHAT_COLUMNS)
+    for i, (pid, sec) in enumerate(zip(authors.tolist(), seconds.tolist())):
+        ws.append([start + timedelta(seconds=sec), f"Имя{pid} Фамилия{pid}", f"user{pid}@example.com", MESSAGES[i % len(MESSAGES)]])
+    wb.save(path)
+    return path
+
+
+def generate(out_dir, report_config, rows, chat_rows=None, seed=0):
+    """
+    Создает пару файлов (статистика, чат) и возвращает их пути.
+    По умолчанию сообщений в чате в 10 раз меньше, чем сеансов.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    stats_path = generate_statistics(os.path.join(out_dir, f"statistic_{rows}.xlsx"), report_config, rows, seed=seed)
+    chat_rows = chat_rows if chat_rows is not None else max(1, rows // 10)
+    chat_path = generate_chat(os.path.join(out_dir, f"chat_{rows}.xlsx"), chat_rows, rows, seed=seed)
+    return stats_path, chat_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических выгрузок МТС Линк.")
+    parser.add_argument("-c", "--config", default="configs/mts_link_report.yaml")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000], help="Число строк статистики (от 1k до 1M).")
+    parser.add_argument("--chat-rows", type=int, default=None)
+    parser.add_argument("--out-dir", default="bench_data")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    report_config = load_config(args.config)
+    for rows in args.rows:
+        print(*generate(args.out_dir, report_config, rows, args.chat_rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
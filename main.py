@@ -1,15 +1,200 @@
 import argparse
+import csv
 import logging
+import os
+import sys
+import time
+from contextlib import closing
 
+# Модули с тяжелыми зависимостями (Selenium, pandas) импортируются там, где они нужны
 from reporter import (
     OUTPUT_DIR,
-    BrowserManager,
+    REPORT_DIR,
     cleanup_files,
+    event_dir_name,
+    find_saved_exports,
     load_config,
-    process_and_generate_reports,
     setup_logging,
     validate_credentials,
 )
+from reporter import metrics
+
+
+def read_urls(lines):
+    """
+    Извлекает URL из строк, пропуская пустые строки и комментарии (#).
+    """
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            urls.append(line)
+    return urls
+
+
+def collect_urls(args):
+    """
+    Собирает список URL мероприятий из аргументов, файла или stdin.
+    Если ничего не передано и stdin интерактивен, запрашивает один URL через input().
+    """
+    urls = []
+    read_stdin = "-" in args.urls
+    urls.extend(url for url in args.urls if url != "-")
+
+    if args.urls_file:
+        try:
+            with open(args.urls_file, "r", encoding="utf-8") as f:
+                urls.extend(read_urls(f))
+        except OSError as e:
+            logging.error(f"Не удалось прочитать файл со списком URL {args.urls_file}: {e}")
+
+    if not urls and not args.urls_file and not sys.stdin.isatty():
+        read_stdin = True
+    if read_stdin:
+        urls.extend(read_urls(sys.stdin))
+
+    if not urls and not args.urls_file and not read_stdin:
+        page_url = input("Пожалуйста, введите URL страницы для парсинга: ").strip()
+        if page_url:
+            urls.append(page_url)
+
+    # Убираем повторы, сохраняя порядок
+    return list(dict.fromkeys(urls))
+
+
+def process_saved_event(event, report_config, report_dir):
+    """
+    Генерирует отчеты по сохраненным выгрузкам, без браузера и сети.
+    Исходные файлы не удаляются.
+    :param event: Словарь из find_saved_exports (stats, chat, page_html).
+    :return: Кортеж (успех, сообщение об ошибке или None).
+    """
+    from reporter import process_and_generate_reports, scraper
+    if not event['stats'] or not os.path.exists(event['stats']):
+        return False, f"Файл статистики не найден: {event['stats'] or '-'}"
+    try:
+        page_data = None
+        if event['page_html']:
+            with open(event['page_html'], "r", encoding="utf-8", errors="replace") as f:
+                page_html = f.read()
+            with metrics.span('page_scrape') as scrape_span:
+                scrape_span['bytes'] = len(page_html)
+                page_data = scraper.scrape_page(page_html, report_config)
+        else:
+            logging.warning(f"Сохраненная страница мероприятия для {event['stats']} не указана: поля страницы будут пустыми.")
+
+        if not process_and_generate_reports(
+            statistic_file_path=event['stats'],
+            chat_file_path=event['chat'],
+            page_data=page_data,
+            report_config=report_config,
+            report_dir=report_dir,
+        ):
+            return False, "Не удалось сгенерировать отчеты"
+        return True, None
+    except Exception as e:
+        logging.error(f"Ошибка при обработке {event['stats']}: {e}", exc_info=True)
+        return False, str(e)
+
+
+def write_batch_summary(results, report_dir):
+    """
+    Записывает итоги пакетной обработки в CSV и дублирует их в лог.
+    :param results: Список словарей с ключами url, status, report_dir, duration_sec, error.
+    :return: Путь к файлу с итогами или None в случае ошибки.
+    """
+    succeeded = sum(1 for r in results if r["status"] == "ok")
+    logging.info(f"Итоги: обработано {len(results)} мероприятий, успешно {succeeded}, с ошибками {len(results) - succeeded}.")
+    for r in results:
+        if r["status"] == "ok":
+            logging.info(f"  [OK] {r['url']} -> {r['report_dir']} ({r['duration_sec']} с)")
+        else:
+            logging.warning(f"  [FAIL] {r['url']}: {r['error']}")
+
+    summary_path = os.path.join(report_dir, f"batch_summary_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+    try:
+        os.makedirs(report_dir, exist_ok=True)
+        with open(summary_path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["url", "status", "report_dir", "duration_sec", "error"])
+            writer.writeheader()
+            writer.writerows(results)
+        logging.info(f"Итоги пакетной обработки сохранены: {summary_path}")
+        return summary_path
+    except OSError as e:
+        logging.error(f"Не удалось сохранить итоги пакетной обработки: {e}")
+        return None
+
+
+def print_attendee_report(report_config, since_date=None, min_events=2):
+    """
+    Выводит сводку по локальной базе участников: повторные посещения и тренды по регионам.
+    """
+    from reporter import attendee_db
+    db_path = (report_config['processing_settings'].get('attendee_db') or {}).get('path', 'attendees.sqlite3')
+    if not os.path.exists(db_path):
+        logging.error(f"База участников не найдена: {db_path}")
+        return
+    with closing(attendee_db.connect(db_path)) as conn:
+        print(f"Участники, посетившие {min_events}+ мероприятий:")
+        for email, first_name, last_name, count in attendee_db.repeat_attendance(conn, min_events):
+            print(f"  {count:>4}  {first_name or ''} {last_name or ''} <{email}>")
+        print("Присутствие по регионам:")
+        for event_date, region, count in attendee_db.region_trends(conn, since_date):
+            print(f"  {event_date[:10] if event_date else '-'}  {region}: {count}")
+
+
+def schedule_events(page_urls, report_config, run_at=None):
+    """
+    Ставит мероприятия в очередь планировщика.
+    :param run_at: Время запуска строкой "YYYY-MM-DD HH:MM" (местное время) или None — сразу.
+    """
+    from datetime import datetime
+    from reporter import scheduler
+    if not page_urls:
+        logging.error("Не передано ни одного URL для постановки в очередь.")
+        return
+    try:
+        run_at_ts = datetime.strptime(run_at, "%Y-%m-%d %H:%M").timestamp() if run_at else None
+    except ValueError:
+        logging.error(f"Неверное время запуска '{run_at}'. Ожидается формат YYYY-MM-DD HH:MM.")
+        return
+    settings = scheduler.settings_for(report_config)
+    with closing(scheduler.connect(settings['db_path'])) as conn:
+        for page_url in page_urls:
+            job_id = scheduler.enqueue(conn, page_url, run_at_ts, max_attempts=settings['max_attempts'])
+            logging.info(f"Задание {job_id} в очереди: {page_url}")
+        print(scheduler.format_stats(scheduler.queue_stats(conn)))
+
+
+def run_from_files(paths, report_config):
+    """
+    Повторная обработка сохраненных выгрузок (--from-files).
+    Несколько мероприятий обрабатываются как пакет: у каждого своя папка отчетов и общий CSV с итогами.
+    """
+    events = find_saved_exports(paths)
+    if not events:
+        logging.error("Не найдено сохраненных выгрузок для обработки.")
+        return
+    batch_mode = len(events) > 1
+    results = []
+    for index, event in enumerate(events, start=1):
+        logging.info(f"--> main: Processing saved event {index}/{len(events)}: {event['name']}")
+        report_dir = os.path.join(REPORT_DIR, event['name']) if batch_mode else REPORT_DIR
+        started = time.monotonic()
+        with metrics.span('event', source=event['stats']) as event_span:
+            ok, error = process_saved_event(event, report_config, report_dir)
+            event_span['status'] = 'ok' if ok else 'error'
+        results.append({
+            "url": event['stats'] or event['name'],
+            "status": "ok" if ok else "failed",
+            "report_dir": report_dir,
+            "duration_sec": round(time.monotonic() - started, 1),
+            "error": error or "",
+        })
+    if batch_mode:
+        write_batch_summary(results, REPORT_DIR)
+    elif results[0]["status"] != "ok":
+        logging.error(f"Не удалось обработать сохраненные выгрузки: {results[0]['error']}")
 
 
 def main():
@@ -30,31 +215,126 @@ def main():
             default="configs/mts_link_report.yaml",
             help="Путь к файлу конфигурации YAML. По умолчанию: configs/mts_link_report.yaml",
         )
+        parser.add_argument(
+            "urls",
+            nargs="*",
+            help="URL страниц мероприятий. '-' — читать список URL из stdin.",
+        )
+        parser.add_argument(
+            "-f",
+            "--urls-file",
+            type=str,
+            help="Файл со списком URL мероприятий (по одному на строку, # — комментарий).",
+        )
+        parser.add_argument(
+            "--http-only",
+            action="store_true",
+            help="Скачивать выгрузки через HTTP без браузера (браузер нужен только для входа).",
+        )
+        parser.add_argument(
+            "--attendee-report",
+            action="store_true",
+            help="Вывести сводку по локальной базе участников и завершить работу.",
+        )
+        parser.add_argument(
+            "--since",
+            type=str,
+            help="Для --attendee-report: учитывать мероприятия начиная с даты (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--from-files",
+            nargs="+",
+            metavar="PATH",
+            help="Сгенерировать отчеты по уже скачанным файлам без браузера: директории мероприятий "
+                 "(statistic_*.xlsx, chat_*.xlsx, *.html) или файлы статистики, чата и страницы одного мероприятия.",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="Запустить сервис отчетов с пулом авторизованных сессий браузера (адрес и размер пула — раздел daemon конфига).",
+        )
+        parser.add_argument(
+            "--schedule",
+            action="store_true",
+            help="Поставить мероприятия (URL из аргументов, файла или stdin) в очередь планировщика и завершить работу.",
+        )
+        parser.add_argument(
+            "--at",
+            type=str,
+            help="Для --schedule: время запуска (YYYY-MM-DD HH:MM, местное время). По умолчанию — сразу.",
+        )
+        parser.add_argument(
+            "--scheduler",
+            action="store_true",
+            help="Обрабатывать очередь планировщика до остановки (раздел scheduler конфига).",
+        )
+        parser.add_argument(
+            "--queue-status",
+            action="store_true",
+            help="Вывести глубину очереди планировщика и задержки заданий и завершить работу.",
+        )
         args = parser.parse_args()
         logging.info("--> main: Parsed arguments.")
 
         # 2. Загрузка конфигурации
-        report_config = load_config(args.config)
+        # Переопределения из аргументов накладываются до проверки: готовый конфиг неизменяем
+        overrides = {'source_settings': {'http_export': {'enabled': True}}} if args.http_only else None
+        report_config = load_config(args.config, overrides=overrides)
         if not report_config:
             return
         logging.info("--> main: Loaded report config.")
+        if args.attendee_report:
+            print_attendee_report(report_config, args.since)
+            return
+        if args.schedule:
+            schedule_events(collect_urls(args), report_config, args.at)
+            return
+        if args.queue_status:
+            from reporter import scheduler
+            with closing(scheduler.connect(scheduler.settings_for(report_config)['db_path'])) as conn:
+                print(scheduler.format_stats(scheduler.queue_stats(conn)))
+            return
+        if args.from_files:
+            try:
+                run_from_files(args.from_files, report_config)
+            finally:
+                metrics.export(report_config.get('metrics'))
+            return
 
         if not validate_credentials():
             return
         logging.info("--> main: Validated credentials.")
+        # Синтаксическая ошибка CSS-селектора видна до запуска браузера
+        try:
+            report_config.scraper_engine.compile_selectors()
+        except ValueError as e:
+            logging.error(f"Ошибка в конфигурации: source_settings.selectors.scraper: {e}")
+            return
+        if args.daemon:
+            from reporter import daemon
+            daemon.serve(report_config)
+            return
+        if args.scheduler:
+            from reporter import scheduler
+            scheduler.serve(report_config)
+            return
 
-        page_url = input("Пожалуйста, введите URL страницы для парсинга: ").strip()
-        if not page_url:
+        page_urls = collect_urls(args)
+        if not page_urls:
             logging.error("URL страницы не был введен. Выполнение прервано.")
             return
-        logging.info("--> main: Received URL.")
+        logging.info(f"--> main: Received {len(page_urls)} URL(s).")
+        batch_mode = len(page_urls) > 1
 
         # 3. Инициализация и запуск
+        from reporter import BrowserManager, rate_limit
         browser_manager = BrowserManager(
-            output_dir=OUTPUT_DIR, report_config=report_config
+            output_dir=OUTPUT_DIR, report_config=report_config,
+            rate_limiter=rate_limit.from_settings(report_config.get('rate_limit')),
         )
         logging.info("--> main: BrowserManager initialized.")
 
+        results = []
         try:
             logging.info("--> main: Entering main try block.")
             if not browser_manager.login():
@@ -62,28 +342,38 @@ def main():
                 return
             logging.info("--> main: Login successful.")
 
-            download_data = browser_manager.download_source_files(page_url)
-
-            if not download_data:
-                logging.error(
-                    "Не удалось скачать исходные файлы. Обработка прекращена."
-                )
+            # В пакетном режиме у каждого мероприятия своя папка, иначе отчеты с одной датой перезапишут друг друга
+            events = [
+                (page_url, os.path.join(REPORT_DIR, event_dir_name(page_url)) if batch_mode else REPORT_DIR)
+                for page_url in page_urls
+            ]
+            if (report_config.get('pipeline') or {}).get('enabled'):
+                from reporter import pipeline
+                results = pipeline.run(browser_manager, events, report_config)
                 return
-            logging.info("--> main: File download successful.")
 
-            statistic_file, chat_file, soup = download_data
-            process_and_generate_reports(
-                statistic_file_path=statistic_file,
-                chat_file_path=chat_file,
-                soup=soup,
-                report_config=report_config,
-            )
-            logging.info("--> main: Report processing finished.")
+            from reporter import process_event
+            for index, (page_url, report_dir) in enumerate(events, start=1):
+                logging.info(f"--> main: Processing event {index}/{len(page_urls)}: {page_url}")
+                started = time.monotonic()
+                with metrics.span('event', url=page_url) as event_span:
+                    ok, error = process_event(browser_manager, page_url, report_config, report_dir)
+                    event_span['status'] = 'ok' if ok else 'error'
+                results.append({
+                    "url": page_url,
+                    "status": "ok" if ok else "failed",
+                    "report_dir": report_dir,
+                    "duration_sec": round(time.monotonic() - started, 1),
+                    "error": error or "",
+                })
 
         finally:
             logging.info("--> main: Entering finally block.")
             cleanup_files(browser_manager.downloaded_files)
             browser_manager.quit_driver()
+            if batch_mode and results:
+                write_batch_summary(results, REPORT_DIR)
+            metrics.export(report_config.get('metrics'))
             logging.info("Процесс автоматизации отчетов завершен.")
 
     except SystemExit as e:
@@ -1,4 +1,3 @@
-from .browser import BrowserManager
 from .config import (
     FILTER_LIST,
     LOGIN,
@@ -8,15 +7,26 @@ from .config import (
     setup_logging,
     validate_credentials,
 )
-from .config_loader import load_config
-from .data_processor import process_and_generate_reports
-from .file_handler import cleanup_files
+from .config_loader import ReportPlan, load_config
+from .file_handler import cleanup_files, event_dir_name, find_saved_exports
+
+# Тяжелые зависимости (Selenium, requests, pandas, openpyxl) импортируются при первом обращении:
+# запуск CLI, --help и проверка конфига не платят за них, а --from-files не загружает Selenium вовсе.
+_LAZY_ATTRIBUTES = {
+    "BrowserManager": ".browser",
+    "process_and_generate_reports": ".data_processor",
+    "process_event": ".data_processor",
+}
 
 __all__ = [
     "BrowserManager",
     "load_config",
+    "ReportPlan",
     "process_and_generate_reports",
+    "process_event",
     "cleanup_files",
+    "event_dir_name",
+    "find_saved_exports",
     "setup_logging",
     "validate_credentials",
     "LOGIN",
@@ -25,3 +35,12 @@ __all__ = [
     "REPORT_DIR",
     "FILTER_LIST",
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,156 @@
+import time
+import sqlite3
+import logging
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    event_key TEXT NOT NULL UNIQUE,
+    event_date TEXT,
+    started_at TEXT,
+    topic TEXT,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_events_date ON events(event_date);
+CREATE INDEX IF NOT EXISTS idx_events_started ON events(started_at);
+
+CREATE TABLE IF NOT EXISTS attendances (
+    event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    email TEXT NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    region TEXT,
+    city TEXT,
+    attended INTEGER NOT NULL,
+    PRIMARY KEY (event_id, email)
+);
+CREATE INDEX IF NOT EXISTS idx_attendances_email ON attendances(email, attended);
+"""
+
+UPSERT_ATTENDANCE = """
+INSERT INTO attendances (event_id, email, first_name, last_name, region, city, attended)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(event_id, email) DO UPDATE SET
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    region = excluded.region,
+    city = excluded.city,
+    attended = excluded.attended
+"""
+
+def connect(db_path):
+    """Открывает базу участников и создает схему при первом подключении."""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    return conn
+
+def upsert_event(conn, df, attended):
+    """
+    Записывает участников одного мероприятия одной транзакцией.
+    :param conn: Соединение с базой.
+    :param df: Отфильтрованный DataFrame с внутренними именами столбцов.
+    :param attended: Булева Series присутствия с тем же индексом, что и df.
+    :return: id мероприятия в базе или None, если в данных нет email.
+    """
+    if 'email' not in df.columns:
+        logging.warning("В данных нет столбца email, база участников не обновлена.")
+        return None
+
+    event_date = _first_value(df, 'event_date')
+    started_at = _first_value(df, 'start_time')
+    topic = _first_value(df, 'webinar_topic')
+    event_key = f"{started_at or event_date}|{topic}"
+
+    columns = {'email': df['email'].astype(str).str.strip().str.lower(), 'attended': attended.astype(int)}
+    for name in ('first_name', 'last_name', 'region', 'city'):
+        columns[name] = df[name].astype(object) if name in df.columns else None
+    rows_df = pd.DataFrame(columns, index=df.index)
+    rows_df = rows_df[df['email'].notna() & rows_df['email'].ne('')]
+    # Один человек — одна строка на мероприятие; присутствие засчитывается по любой сессии
+    rows_df = rows_df.sort_values('attended', ascending=False).drop_duplicates('email')
+    rows_df = rows_df.astype(object).where(rows_df.notna(), None)
+
+    started = time.perf_counter()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO events (event_key, event_date, started_at, topic, updated_at)
+            VALUES (?, ?, ?, ?, datetime('now'))
+            ON CONFLICT(event_key) DO UPDATE SET updated_at = excluded.updated_at
+            """,
+            (event_key, event_date, started_at, topic),
+        )
+        event_id = conn.execute("SELECT id FROM events WHERE event_key = ?", (event_key,)).fetchone()[0]
+        conn.executemany(
+            UPSERT_ATTENDANCE,
+            ((event_id, r.email, r.first_name, r.last_name, r.region, r.city, r.attended) for r in rows_df.itertuples(index=False)),
+        )
+    logging.info(f"База участников обновлена: {len(rows_df)} записей за {time.perf_counter() - started:.2f} с.")
+    return event_id
+
+def event_attendee_stats(conn, event_id):
+    """
+    Считает новых и вернувшихся участников мероприятия.
+    Вернувшийся — присутствовал хотя бы на одном более раннем мероприятии.
+    :return: Словарь {'new': int, 'returning': int}.
+    """
+    returning, total = conn.execute(
+        """
+        SELECT
+            COUNT(DISTINCT CASE WHEN EXISTS (
+                SELECT 1 FROM attendances AS prev
+                JOIN events AS pe ON pe.id = prev.event_id
+                WHERE prev.email = a.email AND prev.attended = 1
+                  AND COALESCE(pe.started_at, pe.event_date) < COALESCE(e.started_at, e.event_date)
+            ) THEN a.email END),
+            COUNT(*)
+        FROM attendances AS a
+        JOIN events AS e ON e.id = a.event_id
+        WHERE a.event_id = ? AND a.attended = 1
+        """,
+        (event_id,),
+    ).fetchone()
+    return {'new': total - returning, 'returning': returning}
+
+def repeat_attendance(conn, min_events=2, limit=50):
+    """Возвращает участников, посетивших не менее min_events мероприятий."""
+    return conn.execute(
+        """
+        SELECT email, MAX(first_name), MAX(last_name), COUNT(*) AS events_attended
+        FROM attendances
+        WHERE attended = 1
+        GROUP BY email
+        HAVING COUNT(*) >= ?
+        ORDER BY events_attended DESC, email
+        LIMIT ?
+        """,
+        (min_events, limit),
+    ).fetchall()
+
+def region_trends(conn, since_date=None):
+    """Возвращает число присутствовавших по регионам и датам мероприятий."""
+    return conn.execute(
+        """
+        SELECT e.event_date, COALESCE(a.region, 'не указан') AS region, COUNT(*) AS attended
+        FROM events AS e
+        JOIN attendances AS a ON a.event_id = e.id
+        WHERE a.attended = 1 AND (? IS NULL OR e.event_date >= ?)
+        GROUP BY e.event_date, region
+        ORDER BY e.event_date, attended DESC
+        """,
+        (since_date, since_date),
+    ).fetchall()
+
+def _first_value(df, column):
+    """Первое непустое значение столбца в виде строки или None."""
+    if column not in df.columns:
+        return None
+    values = df[column].dropna()
+    if values.empty:
+        return None
+    value = values.iloc[0]
+    return pd.Timestamp(value).isoformat() if column in ('event_date', 'start_time') else str(value)
@@ -2,7 +2,6 @@ import os
 import time
 import logging
 import requests
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -11,82 +10,237 @@ from selenium.common.exceptions import TimeoutException
 from urllib.parse import urlparse
 from selenium.webdriver.chrome.service import Service # NEW IMPORT
 
-from . import config
-from .downloader import download_file
+from . import config, http_exporter, metrics, network_capture, scraper, session_store
+from .downloader import configure_session, download_file
 
 class BrowserManager:
     """
     Класс для управления Selenium WebDriver, включая авторизацию и скачивание файлов.
     """
-    def __init__(self, output_dir, report_config):
+    def __init__(self, output_dir, report_config, rate_limiter=None):
         """
         Инициализирует BrowserManager.
         :param output_dir: Директория для сохранения скачанных файлов.
         :param report_config: Загруженный объект конфигурации отчета.
+        :param rate_limiter: Общий rate_limit.HostRateLimiter для переходов браузера и HTTP-запросов (необязательно).
         """
         self.output_dir = output_dir
         self.config = report_config
         self.selectors = self.config['source_settings']['selectors']
         self.driver = None
-        self.session = requests.Session()
+        self.rate_limiter = rate_limiter
+        self.session = configure_session(requests.Session(), rate_limiter=rate_limiter)
         self.downloaded_files = []
+        self._cached_cookies = None
 
     def login(self):
-        """Выполняет вход на сайт, используя Selenium и селекторы из конфига."""
+        """
+        Выполняет вход на сайт.
+        Сначала пробует сохраненную сессию; Selenium и форма входа используются, только если она отклонена.
+        """
+        with metrics.span('login') as login_span:
+            ok = self._login()
+            login_span['status'] = 'ok' if ok else 'error'
+            login_span['method'] = 'cached_session' if ok and not self.driver and self._cached_cookies else 'form'
+            return ok
+
+    def _login(self):
+        """Выполняет вход (см. login)."""
         logging.info("--> Entering login method.")
-        try:
-            logging.info("Инициализация драйвера Selenium Chrome...")
-            options = webdriver.ChromeOptions()
-            
-            # Настройки для обхода обнаружения автоматизации
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option("excludeSwitches", ["enable-automation"])
-            options.add_experimental_option('useAutomationExtension', False)
-            options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36')
-            
-            # Дополнительные настройки для стабильности и отладки
-            options.add_argument('--no-sandbox') # Отключает песочницу (может помочь в некоторых окружениях)
-            options.add_argument('--disable-extensions') # Отключает расширения браузера
-            options.add_argument('--log-level=3') # Уменьшает детализацию логов Chromedriver в консоли
-
-            prefs = {"download.default_directory": os.path.abspath(self.output_dir)}
-            options.add_experimental_option("prefs", prefs)
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
+        if self._restore_cached_session():
+            logging.info("--> Exiting login method successfully (cached session).")
+            return True
 
-            # Указываем путь для логов Chromedriver
-            service = Service(log_path=os.path.join(os.path.abspath(self.output_dir), "chromedriver.log"))
-            self.driver = webdriver.Chrome(service=service, options=options)
-            
+        try:
+            self._start_driver()
             login_url = self.config['source_settings']['login_url']
             logging.info(f"Перехожу на страницу входа: {login_url}")
-            self.driver.get(login_url)
+            self._open(login_url)
 
-            wait = WebDriverWait(self.driver, 40)
-            
-            # Используем селекторы из конфига
-            login_selectors = self.selectors['login']
-            email_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, login_selectors['email_input'])))
-            email_input.send_keys(config.LOGIN)
+            if not self._login_with_form():
+                return False
+            if self.http_export_enabled():
+                # В HTTP-режиме браузер нужен только для входа
+                self.quit_driver()
+            logging.info("--> Exiting login method successfully.")
+            return True
 
-            submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, login_selectors['submit_button'])))
-            submit_button.click()
-            
-            password_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, login_selectors['password_input'])))
-            password_input.send_keys(config.PASSWORD)
+        except TimeoutException as e:
+            logging.error(f"Не удалось выполнить авторизацию: время ожидания элемента истекло. {e}")
+            return False
+        except Exception as e:
+            logging.error(f"Произошла ошибка при авторизации через Selenium: {e}")
+            return False
 
-            login_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, login_selectors['login_button'])))
-            login_button.click()
+    def _open(self, url):
+        """Открывает страницу в браузере с учетом ограничения частоты запросов."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+        self.driver.get(url)
 
-            wait.until(EC.presence_of_element_located((By.XPATH, login_selectors['success_indicator'])))
-            logging.info("Авторизация через Selenium прошла успешно.")
-            
-            selenium_cookies = self.driver.get_cookies()
-            for cookie in selenium_cookies:
-                self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'])
-            
-            logging.info("--> Exiting login method successfully.")
+    def _start_driver(self):
+        """Запускает Chrome с настройками для работы с сайтом."""
+        logging.info("Инициализация драйвера Selenium Chrome...")
+        options = webdriver.ChromeOptions()
+        
+        # Настройки для обхода обнаружения автоматизации
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        options.add_experimental_option('useAutomationExtension', False)
+        options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36')
+        
+        # Дополнительные настройки для стабильности и отладки
+        options.add_argument('--no-sandbox') # Отключает песочницу (может помочь в некоторых окружениях)
+        options.add_argument('--disable-extensions') # Отключает расширения браузера
+        options.add_argument('--log-level=3') # Уменьшает детализацию логов Chromedriver в консоли
+
+        prefs = {"download.default_directory": os.path.abspath(self.output_dir)}
+        options.add_argument('--disable-gpu')
+        profile = self._browser_profile()
+        if profile:
+            # Облегченный профиль: нужны только элементы DOM, а не картинки, шрифты и аналитика
+            if profile.get('headless'):
+                options.add_argument('--headless=new')
+            options.page_load_strategy = profile.get('page_load_strategy', 'eager')
+            options.add_argument(f"--window-size={profile.get('window_size', '1280,800')}")
+            if profile.get('disable_images'):
+                prefs["profile.managed_default_content_settings.images"] = 2
+        else:
+            options.add_argument('--window-size=1920,1080')
+        options.add_experimental_option("prefs", prefs)
+        if self._network_capture_settings():
+            network_capture.enable(options)
+
+        # Указываем путь для логов Chromedriver
+        service = Service(log_path=os.path.join(os.path.abspath(self.output_dir), "chromedriver.log"))
+        self.driver = webdriver.Chrome(service=service, options=options)
+        if profile and profile.get('blocked_url_patterns'):
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(profile['blocked_url_patterns'])})
+            logging.info(f"Заблокировано шаблонов URL: {len(profile['blocked_url_patterns'])}.")
+
+    def _browser_profile(self):
+        """Возвращает раздел source_settings.browser_profile, если облегченный профиль включен, иначе None."""
+        profile = self.config['source_settings'].get('browser_profile') or {}
+        return profile if profile.get('enabled') else None
+
+    def _record_skipped_load_wait(self, load_span):
+        """
+        Записывает в интервал page_load, сколько ожидания события load сэкономила стратегия eager:
+        от DOMContentLoaded до load (или до текущего момента, если страница еще догружается, — нижняя оценка).
+        Вызывается сразу после перехода, внутри интервала, чтобы в оценку не попало ожидание выгрузок.
+        """
+        try:
+            timing = self.driver.execute_script(
+                "const n = performance.getEntriesByType('navigation')[0];"
+                "return n ? [n.domContentLoadedEventEnd, n.loadEventEnd, performance.now()] : null;"
+            )
+        except Exception as e:
+            logging.debug(f"Не удалось прочитать Navigation Timing: {e}")
+            return
+        if not timing or not timing[0]:
+            return
+        dom_ready, load_end, now = timing
+        saved = ((load_end or now) - dom_ready) / 1000
+        load_span['load_wait_saved_sec'] = round(max(saved, 0.0), 3)
+        logging.info(f"Стратегия загрузки eager сэкономила {saved:.2f} с ожидания события load"
+                     f"{'' if load_end else ' (страница еще догружается)'}.")
+
+    def _login_with_form(self):
+        """Заполняет форму входа на уже открытой странице и сохраняет полученную сессию."""
+        wait = WebDriverWait(self.driver, 40)
+        
+        # Используем селекторы из конфига
+        login_selectors = self.selectors['login']
+        email_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, login_selectors['email_input'])))
+        email_input.send_keys(config.LOGIN)
+
+        submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, login_selectors['submit_button'])))
+        submit_button.click()
+        
+        password_input = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, login_selectors['password_input'])))
+        password_input.send_keys(config.PASSWORD)
+
+        login_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, login_selectors['login_button'])))
+        login_button.click()
+
+        wait.until(EC.presence_of_element_located((By.XPATH, login_selectors['success_indicator'])))
+        logging.info("Авторизация через Selenium прошла успешно.")
+        
+        selenium_cookies = self.driver.get_cookies()
+        for cookie in selenium_cookies:
+            self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'])
+
+        cache_settings = self._session_cache_settings()
+        if cache_settings:
+            session_store.save_session(cache_settings['path'], selenium_cookies, cache_settings.get('max_age_hours', 12))
+        return True
+
+    def _session_cache_settings(self):
+        """Возвращает настройки кэша сессии из конфига или None, если кэш выключен."""
+        cache_settings = self.config['source_settings'].get('session_cache') or {}
+        if not cache_settings.get('enabled') or not cache_settings.get('path'):
+            return None
+        return cache_settings
+
+    def _restore_cached_session(self):
+        """Восстанавливает сохраненную сессию в requests.Session, если сервер ее принимает."""
+        cache_settings = self._session_cache_settings()
+        if not cache_settings:
+            return False
+
+        cookies = session_store.load_session(cache_settings['path'])
+        if not cookies:
+            return False
+
+        session_store.apply_cookies(self.session, cookies)
+        check_url = cache_settings.get('check_url')
+        if check_url and not session_store.is_session_valid(self.session, check_url, cache_settings.get('check_marker')):
+            session_store.clear_session(cache_settings['path'])
+            self.session.cookies.clear()
+            return False
+
+        self._cached_cookies = cookies
+        logging.info("Использую сохраненную сессию, вход через форму не требуется.")
+        return True
+
+    def _ensure_driver(self):
+        """
+        Гарантирует наличие авторизованного драйвера.
+        При восстановленной сессии запускает Chrome с ее cookies; форма входа нужна, только если они не подошли.
+        """
+        if self.driver:
             return True
+        with metrics.span('browser_start') as start_span:
+            ok = self._start_driver_with_cached_session()
+            start_span['status'] = 'ok' if ok else 'error'
+            return ok
+
+    def _start_driver_with_cached_session(self):
+        """Запускает Chrome, переносит в него сохраненные cookies и при необходимости входит через форму."""
+        try:
+            self._start_driver()
+            login_url = self.config['source_settings']['login_url']
+            self._open(login_url)
+            for cookie in self._cached_cookies or []:
+                try:
+                    self.driver.add_cookie({k: v for k, v in cookie.items() if k != 'domain' or v})
+                except Exception as e:
+                    logging.debug(f"Cookie {cookie.get('name')} не перенесена в браузер: {e}")
+            self._open(login_url)
+
+            try:
+                WebDriverWait(self.driver, 15).until(
+                    EC.presence_of_element_located((By.XPATH, self.selectors['login']['success_indicator']))
+                )
+                logging.info("Сохраненная сессия принята браузером.")
+                return True
+            except TimeoutException:
+                logging.info("Сохраненная сессия не принята браузером, выполняю вход через форму.")
+                cache_settings = self._session_cache_settings()
+                if cache_settings:
+                    session_store.clear_session(cache_settings['path'])
+                return self._login_with_form()
 
         except TimeoutException as e:
             logging.error(f"Не удалось выполнить авторизацию: время ожидания элемента истекло. {e}")
@@ -95,63 +249,171 @@ class BrowserManager:
             logging.error(f"Произошла ошибка при авторизации через Selenium: {e}")
             return False
 
+    def warm_up(self):
+        """
+        Готовит менеджер к немедленной работе: выполняет вход и, если выгрузки скачиваются через браузер, запускает Chrome.
+        :return: True, если сессия готова.
+        """
+        if not self.login():
+            return False
+        return self.http_export_enabled() or self._ensure_driver()
+
+    def _network_capture_settings(self):
+        """Возвращает раздел source_settings.network_capture, если перехват ссылок включен, иначе None."""
+        capture_settings = self.config['source_settings'].get('network_capture') or {}
+        return capture_settings if capture_settings.get('enabled') else None
+
+    def http_export_enabled(self):
+        """Проверяет, включен ли режим скачивания без браузера."""
+        return bool((self.config['source_settings'].get('http_export') or {}).get('enabled'))
+
     def download_source_files(self, page_url):
         """Кликает на кнопки скачивания и скачивает файлы."""
         logging.info("--> Entering download_source_files method.")
-        if not self.driver: return None
+        if self.http_export_enabled():
+            return self._download_source_files_http(page_url)
+
+        exports = self.collect_exports(page_url)
+        if not exports:
+            return None
+        try:
+            final_stats_file_path = self.download_export(exports['stats'], "statistic_")
+            final_chat_file_path = self.download_export(exports['chat'], "chat_") if exports['chat'] else None
+            logging.info("--> Exiting download_source_files method successfully.")
+            return (final_stats_file_path, final_chat_file_path, self.scrape(exports['page_html']))
+        except Exception as e:
+            logging.error(f"Ошибка при скачивании файлов: {e}")
+            return None
+
+    def collect_exports(self, page_url):
+        """
+        Открывает страницу мероприятия в браузере и получает ссылки на обе выгрузки, не скачивая их.
+        :return: Словарь {'stats': URL, 'chat': URL или None, 'page_html': HTML страницы} или None в случае ошибки.
+        """
+        if not self._ensure_driver(): return None
 
         logging.info(f"Перехожу на страницу мероприятия: {page_url}")
-        
-        final_stats_file_path = None
-        final_chat_file_path = None
         dl_selectors = self.selectors['download']
-
         try:
-            self.driver.get(page_url)
+            with metrics.span('page_load', url=page_url, profile='lean' if self._browser_profile() else 'full') as load_span:
+                self._open(page_url)
+                if self.driver.capabilities.get('pageLoadStrategy') == 'eager':
+                    self._record_skipped_load_wait(load_span)
             wait = WebDriverWait(self.driver, 20)
             
-            # Скачиваем СТАТИСТИКУ
+            # Ссылка на СТАТИСТИКУ
             try:
                 logging.info("Ищу кнопку для скачивания статистики...")
                 stats_button = wait.until(EC.presence_of_element_located((By.XPATH, dl_selectors['stats_button'])))
+                self._discard_network_log()
                 self.driver.execute_script("arguments[0].click();", stats_button)
                 stats_url = self._handle_download_notification(wait)
-
-                if stats_url:
-                    stats_filename = "statistic_" + os.path.basename(urlparse(stats_url).path)
-                    final_stats_file_path = os.path.join(self.output_dir, stats_filename)
-                    if download_file(self.session, stats_url, final_stats_file_path):
-                        self.downloaded_files.append(final_stats_file_path)
-                else:
+                if not stats_url:
                     return None
             except TimeoutException:
                 logging.error("Не удалось найти кнопку для скачивания статистики.")
                 return None
 
-            # Скачиваем ЧАТ
+            # Ссылка на ЧАТ
+            chat_url = None
             try:
                 logging.info("Ищу кнопку для скачивания чата...")
                 chat_button = wait.until(EC.presence_of_element_located((By.XPATH, dl_selectors['chat_button'])))
+                self._discard_network_log()
                 self.driver.execute_script("arguments[0].click();", chat_button)
                 chat_url = self._handle_download_notification(wait)
-
-                if chat_url:
-                    chat_filename = "chat_" + os.path.basename(urlparse(chat_url).path)
-                    final_chat_file_path = os.path.join(self.output_dir, chat_filename)
-                    if download_file(self.session, chat_url, final_chat_file_path):
-                        self.downloaded_files.append(final_chat_file_path)
+                if chat_url == stats_url:
+                    # Уведомление о статистике могло остаться открытым после перехвата ссылки из сети
+                    logging.warning("Вместо ссылки на чат получена ссылка на статистику. Пропускаю чат.")
+                    chat_url = None
             except TimeoutException:
                 logging.warning("Не удалось найти кнопку для скачивания чата. Пропускаю.")
 
-            logging.info("--> Exiting download_source_files method successfully.")
-            return (final_stats_file_path, final_chat_file_path, BeautifulSoup(self.driver.page_source, "html.parser"))
+            return {'stats': stats_url, 'chat': chat_url, 'page_html': self.driver.page_source}
+
+        except Exception as e:
+            logging.error(f"Ошибка при получении ссылок на выгрузки: {e}")
+            return None
+
+    def _download_source_files_http(self, page_url):
+        """Скачивает файлы через эндпоинты выгрузки напрямую, без Selenium."""
+        export_settings = self.config['source_settings']['http_export']
+        try:
+            stats_url = http_exporter.request_export(self.session, page_url, export_settings, 'stats')
+            if not stats_url:
+                return None
+            final_stats_file_path = self.download_export(stats_url, "statistic_")
+
+            final_chat_file_path = None
+            chat_url = http_exporter.request_export(self.session, page_url, export_settings, 'chat')
+            if chat_url:
+                final_chat_file_path = self.download_export(chat_url, "chat_")
+            else:
+                logging.warning("Не удалось получить выгрузку чата. Пропускаю.")
+
+            with metrics.span('page_load', url=page_url):
+                page_html = http_exporter.fetch_page_html(self.session, page_url)
+            page_data = self.scrape(page_html)
+            logging.info("--> Exiting download_source_files method successfully (HTTP).")
+            return (final_stats_file_path, final_chat_file_path, page_data)
 
         except Exception as e:
             logging.error(f"Ошибка при скачивании файлов: {e}")
             return None
 
+    def scrape(self, page_html):
+        """Извлекает поля страницы мероприятия с замером времени разбора."""
+        with metrics.span('page_scrape') as scrape_span:
+            scrape_span['bytes'] = len(page_html or '')
+            return scraper.scrape_page(page_html, self.config)
+
+    def download_export(self, file_url, prefix):
+        """
+        Скачивает подготовленный файл и регистрирует его для последующей очистки.
+        Можно вызывать из нескольких потоков одновременно: драйвер не используется.
+        :return: Путь к файлу.
+        """
+        file_path = os.path.join(self.output_dir, prefix + os.path.basename(urlparse(file_url).path))
+        if download_file(self.session, file_url, file_path):
+            self.downloaded_files.append(file_path)
+        return file_path
+
+    def _discard_network_log(self):
+        """Перед кликом по кнопке выгрузки очищает журнал сетевых событий (если перехват включен)."""
+        if self._network_capture_settings():
+            network_capture.discard(self.driver)
+
     def _handle_download_notification(self, wait):
-        """Обрабатывает уведомление (Snackbar) и извлекает ссылку."""
+        """
+        Получает ссылку на подготовленный файл после клика по кнопке выгрузки.
+        Если включен network_capture, ссылка берется из сетевого ответа без ожидания уведомления;
+        иначе или при неудаче — из уведомления (Snackbar).
+        """
+        with metrics.span('snackbar_wait') as snackbar_span:
+            download_url = None
+            capture_settings = self._network_capture_settings()
+            if capture_settings:
+                download_url = network_capture.wait_for_file_url(self.driver, capture_settings)
+                if download_url:
+                    snackbar_span['method'] = 'network'
+                    self._dismiss_notification()
+                else:
+                    logging.warning("Ссылка на файл не найдена в сетевых событиях. Жду уведомление.")
+            if not download_url:
+                snackbar_span['method'] = 'snackbar'
+                download_url = self._read_download_notification(wait)
+            snackbar_span['status'] = 'ok' if download_url else 'error'
+            return download_url
+
+    def _dismiss_notification(self):
+        """Закрывает уже показанное уведомление, не дожидаясь его появления и исчезновения."""
+        dl_selectors = self.selectors['download']
+        for snackbar in self.driver.find_elements(By.XPATH, dl_selectors['snackbar_notification']):
+            for close_button in snackbar.find_elements(By.XPATH, dl_selectors['snackbar_close_button']):
+                self.driver.execute_script("arguments[0].click();", close_button)
+
+    def _read_download_notification(self, wait):
+        """Ожидает уведомление, извлекает ссылку и закрывает его."""
         dl_selectors = self.selectors['download']
         try:
             snackbar = wait.until(EC.presence_of_element_located((By.XPATH, dl_selectors['snackbar_notification'])))
@@ -0,0 +1,236 @@
+import re
+import logging
+import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+DEFAULT_SETTINGS = {
+    'sheet_name': "Сообщения чата",
+    'columns': {'time': "Время", 'name': "Имя", 'email': "Email", 'text': "Сообщение"},
+    'question_pattern': r"\?",
+    'chunk_rows': 5000,
+}
+
+def read_chat(file_path, chat_settings=None, keep_raw=False):
+    """
+    Потоково читает выгрузку чата блоками по chunk_rows строк и за один проход считает:
+    сообщения и вопросы по участникам, время первого и последнего сообщения, активность по минутам.
+    Память зависит от числа участников и минут, а не от длины чата; сам чат сохраняется, только если keep_raw.
+    :param file_path: Путь к файлу чата.
+    :param chat_settings: Раздел processing_settings.chat (необязательные sheet_name, columns, question_pattern, chunk_rows).
+    :param keep_raw: Сохранить ли исходные строки чата (для листа "chat").
+    :return: Словарь {'raw': DataFrame или None, 'participants': DataFrame, 'activity': DataFrame, 'messages': int}
+             или None в случае ошибки.
+    """
+    settings = {**DEFAULT_SETTINGS, **(chat_settings or {})}
+    columns = {**DEFAULT_SETTINGS['columns'], **(settings.get('columns') or {})}
+    question_re = re.compile(settings['question_pattern'], re.IGNORECASE)
+    participants = {}
+    activity = {}
+    raw_rows = [] if keep_raw else None
+    header = None
+    messages = 0
+    try:
+        logging.info(f"Читаю файл чата: {file_path}")
+        for header, chunk in _iter_chunks(file_path, settings['sheet_name'], settings['chunk_rows']):
+            if raw_rows is not None:
+                raw_rows.extend(chunk)
+            messages += len(chunk)
+            _aggregate_chunk(chunk, _positions(header, columns), question_re, participants, activity)
+    except Exception as e:
+        logging.error(f"Не удалось прочитать файл чата '{file_path}'. Ошибка: {e}")
+        return None
+
+    raw = None
+    if raw_rows is not None and header is not None:
+        raw = pd.DataFrame(raw_rows, columns=[name if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)])
+    logging.info(f"Чат: {messages} сообщений от {len(participants)} участников.")
+    return {
+        'raw': raw,
+        'participants': pd.DataFrame(
+            list(participants.values()),
+            columns=['key', 'name', 'email', 'messages', 'questions', 'first_message', 'last_message'],
+        ),
+        'activity': pd.DataFrame(
+            [(minute, counts[0], counts[1]) for minute, counts in sorted(activity.items())],
+            columns=['minute', 'messages', 'questions'],
+        ),
+        'messages': messages,
+    }
+
+def participants_sheet(chat, geography_df, final_names, attendance_column=None):
+    """
+    Формирует лист "активность в чате": участники с числом сообщений и вопросов,
+    дополненные регионом, городом и присутствием из листа "география" (по email, иначе по имени и фамилии).
+    :param chat: Результат read_chat.
+    :param geography_df: DataFrame листа "география" (финальные имена столбцов).
+    :param final_names: Карта "внутреннее имя -> финальное имя" из скомпилированного конфига.
+    :param attendance_column: Имя столбца присутствия в geography_df.
+    :return: DataFrame, отсортированный по числу сообщений.
+    """
+    participants = chat['participants']
+    extra_columns = [name for name in (final_names.get('region'), final_names.get('city'), attendance_column)
+                     if name and name in geography_df.columns]
+
+    # Позиция строки "географии" для каждого ключа участника: сначала по email, затем по "имя фамилия"
+    key_series = _geography_keys(geography_df, final_names)
+    positions = pd.Series(dtype='float64')
+    if key_series:
+        keys = pd.concat([pd.Series(range(len(geography_df)), index=key.to_numpy()) for key in key_series])
+        positions = keys[keys.index.notna()]
+        positions = positions[~positions.index.duplicated()]
+    matched = participants['key'].map(positions).fillna(_name_keys(participants).map(positions))
+
+    result = {"Участник": participants['name'], "Почта": participants['email']}
+    for column in extra_columns:
+        values = geography_df[column].astype(object).to_numpy()
+        result[column] = [values[int(pos)] if pd.notna(pos) else None for pos in matched]
+    result.update({
+        "Сообщений": participants['messages'],
+        "Вопросов": participants['questions'],
+        "Первое сообщение": participants['first_message'],
+        "Последнее сообщение": participants['last_message'],
+    })
+    return (pd.DataFrame(result)
+            .sort_values(["Сообщений", "Вопросов"], ascending=False, kind='stable')
+            .reset_index(drop=True))
+
+def geography_matches(chat, geography_df, final_names):
+    """
+    Отмечает строки "географии", которые могут совпасть с участниками чата. Позволяет хранить при обработке
+    по частям только эти строки и затем передать их в participants_sheet.
+    :return: Булев массив длины len(geography_df).
+    """
+    participants = chat['participants']
+    keys = set(participants['key'].dropna()) | set(_name_keys(participants).dropna())
+    matches = np.zeros(len(geography_df), dtype=bool)
+    for key in _geography_keys(geography_df, final_names):
+        matches |= key.isin(keys).fillna(False).to_numpy(dtype=bool)
+    return matches
+
+def activity_sheet(chat):
+    """Формирует лист "сообщения по минутам"."""
+    return chat['activity'].rename(columns={'minute': "Минута", 'messages': "Сообщений", 'questions': "Вопросов"})
+
+def _geography_keys(geography_df, final_names):
+    """Возвращает ключи строк "географии" для сопоставления с чатом: email, затем "name:имя фамилия"."""
+    key_series = []
+    email_col, first_col, last_col = (final_names.get(n) for n in ('email', 'first_name', 'last_name'))
+    if email_col in geography_df.columns:
+        key_series.append(geography_df[email_col].astype('string').str.strip().str.lower())
+    if first_col in geography_df.columns and last_col in geography_df.columns:
+        full_name = geography_df[first_col].astype('string').str.strip() + " " + geography_df[last_col].astype('string').str.strip()
+        key_series.append("name:" + full_name.str.lower())
+    return key_series
+
+def _name_keys(participants):
+    """Ключи участников чата по имени."""
+    return "name:" + participants['name'].astype('string').fillna('').str.lower()
+
+def _iter_chunks(file_path, sheet_name, chunk_rows):
+    """
+    Возвращает пары (заголовок, блок строк) листа чата. XLSX читается потоково (openpyxl read-only),
+    старые XLS — через pandas целиком и затем делятся на блоки.
+    """
+    try:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+    except InvalidFileException:
+        logging.info(f"Файл {file_path} не является XLSX, читаю через pandas.")
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        header = tuple(df.columns)
+        rows = list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+        for start in range(0, len(rows), chunk_rows):
+            yield header, rows[start:start + chunk_rows]
+        return
+
+    try:
+        ws = wb[sheet_name]
+        # Выгрузки иногда содержат неверный размер листа, из-за которого read-only режим обрезает строки
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        header = tuple(next(rows, None) or ())
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+    finally:
+        wb.close()
+
+def _positions(header, columns):
+    """Возвращает номера столбцов чата по ролям (time, name, email, text); отсутствующие — None."""
+    index = {name.strip() if isinstance(name, str) else name: i for i, name in enumerate(header)}
+    return {role: index.get(name) for role, name in columns.items()}
+
+def _aggregate_chunk(chunk, positions, question_re, participants, activity):
+    """Добавляет блок строк чата к накопленным показателям участников и минут."""
+    def getter(role):
+        idx = positions.get(role)
+        return (lambda row: None) if idx is None else (lambda row: row[idx] if idx < len(row) else None)
+
+    get_time, get_name, get_email, get_text = (getter(role) for role in ('time', 'name', 'email', 'text'))
+    for row in chunk:
+        name, email, text = _text(get_name(row)), _text(get_email(row)), _text(get_text(row))
+        email = email.lower() if email else None
+        clock = _clock(get_time(row))
+        question = 1 if text and question_re.search(text) else 0
+        key = email or "name:" + (name or '').lower()
+
+        entry = participants.get(key)
+        if entry is None:
+            participants[key] = [key, name, email, 1, question, clock, clock]
+        else:
+            entry[1] = entry[1] or name
+            entry[3] += 1
+            entry[4] += question
+            if clock:
+                entry[5] = min(entry[5], clock) if entry[5] else clock
+                entry[6] = max(entry[6], clock) if entry[6] else clock
+
+        if clock:
+            minute = _minute(get_time(row), clock)
+            counts = activity.get(minute)
+            if counts is None:
+                activity[minute] = [1, question]
+            else:
+                counts[0] += 1
+                counts[1] += question
+
+def _minute(value, clock):
+    """
+    Ключ активности по минутам: "ГГГГ-ММ-ДД ЧЧ:ММ", если у времени сообщения есть дата, иначе "ЧЧ:ММ".
+    С датой сообщения мероприятий через полночь и многодневных не сливаются в одну минуту.
+    """
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, str):
+        match = re.search(r'(\d{4})-(\d{2})-(\d{2})|(\d{1,2})\.(\d{1,2})\.(\d{4})', value)
+        if match:
+            year, month, day = match.group(1, 2, 3) if match.group(1) else match.group(6, 5, 4)
+            return f"{year}-{int(month):02d}-{int(day):02d} {clock[:5]}"
+    return clock[:5]
+
+def _text(value):
+    """Приводит значение ячейки к строке без пробелов по краям; пустое — None."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+def _clock(value):
+    """Приводит время сообщения (datetime, time или строку) к виду "ЧЧ:ММ:СС"; нераспознанное — None."""
+    if isinstance(value, (datetime.datetime, datetime.time)):
+        return value.strftime('%H:%M:%S')
+    if isinstance(value, str):
+        match = re.search(r'(\d{1,2}):(\d{2})(?::(\d{2}))?', value)
+        if match:
+            return f"{int(match.group(1)):02d}:{match.group(2)}:{match.group(3) or '00'}"
+    return None
@@ -0,0 +1,271 @@
+import os
+import logging
+from contextlib import closing, nullcontext
+
+import pandas as pd
+
+from . import attendee_db, chat_analytics, config_loader, data_processor, excel_reader, metrics, report_writer, sessions
+
+# Обработка по частям для очень больших выгрузок статистики. Файл читается дважды блоками по batch_rows строк:
+#   1-й проход: фильтры, присутствие и сводка сеансов каждого блока сливаются в компактную таблицу участников,
+#               индексированную 64-битным хэшем ключа, и в объединенные интервалы просмотра участников
+#               (память — на участника и его непересекающиеся интервалы, а не на все сеансы);
+#   2-й проход: из каждого блока берутся первые сеансы участников, к ним добавляются итоговые показатели,
+#               и строки сразу дописываются в листы "география" всех выходных файлов.
+# Пиковая память определяется размером блока и числом участников, а не числом сеансов в файле.
+
+
+def use_chunked(statistic_file_path, report_config):
+    """Проверяет, нужно ли обрабатывать файл статистики по частям (processing_settings.chunked)."""
+    settings = report_config['processing_settings'].get('chunked') or {}
+    if not settings.get('enabled'):
+        return False
+    return os.path.getsize(statistic_file_path) >= (settings.get('min_file_mb') or 0) * 1024 * 1024
+
+
+def generate_reports(statistic_file_path, chat, page_data, report_config, report_dir):
+    """
+    Формирует все выходные файлы, не загружая статистику в память целиком.
+    :param chat: Результат data_processor.load_chat или None.
+    :return: True, если отчеты сгенерированы, иначе False.
+    """
+    settings = report_config['processing_settings'].get('chunked') or {}
+    batch_rows = settings.get('batch_rows') or 50000
+    logging.info(f"Обрабатываю статистику по частям (по {batch_rows} строк): {statistic_file_path}")
+    try:
+        with metrics.span('sessions', mode='chunked') as sessions_span:
+            attendees, event_info, sessions_span['rows_in'] = _aggregate(statistic_file_path, report_config, batch_rows)
+            sessions_span['rows'] = len(attendees)
+    except Exception as e:
+        logging.error(f"Не удалось прочитать статистику '{statistic_file_path}'. Ошибка: {e}")
+        return False
+    logging.info(f"Участников: {len(attendees)}.")
+
+    os.makedirs(report_dir, exist_ok=True)
+    date_str = data_processor._get_webinar_date_str(event_info)
+    outputs = _open_outputs(report_config, report_dir, date_str, chat)
+    try:
+        attendee_stats, chat_geography = _write_attendees(statistic_file_path, report_config, batch_rows, attendees, outputs, chat)
+        _write_other_sheets(outputs, attendees, event_info, chat, chat_geography, page_data, report_config, attendee_stats)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке по частям: {e}", exc_info=True)
+        for stream in _streams(outputs):
+            stream.abort()
+        return False
+
+    for output in outputs:
+        if output['plan'].type == 'attended_emails_only' and output['stream'] is None:
+            logging.warning(f"Нет данных для создания файла {os.path.basename(output['filepath'])}: никто не присутствовал.")
+    streams = _streams(outputs)
+    written = report_writer.close_streams(streams)
+    if not report_writer.check_written([stream.filepath for stream in streams], written):
+        return False
+    logging.info("Генерация всех отчетов завершена.")
+    return True
+
+
+def _chunks(statistic_file_path, report_config, batch_rows):
+    """
+    Читает и фильтрует блоки сеансов.
+    :return: Генератор кортежей (блок, присутствие по сеансам, хэши участников, номера строк в файле).
+    """
+    proc_settings = report_config['processing_settings']
+    identity_key = (proc_settings.get('sessions') or {}).get('identity_key') or sessions.DEFAULT_SETTINGS['identity_key']
+    offset = 0
+    for chunk in excel_reader.iter_sheet_chunks(statistic_file_path, proc_settings['sheet_name'],
+                                                proc_settings['column_map'], proc_settings.get('dtypes'), batch_rows):
+        size = len(chunk)
+        chunk = data_processor._filter_data(chunk, report_config)
+        rows = offset + chunk.index.to_numpy()
+        offset += size
+        chunk = chunk.reset_index(drop=True)
+        held = (data_processor._attendance_mask(chunk['entry_time'], list(report_config.not_attended_values))
+                if 'entry_time' in chunk.columns else pd.Series(True, index=chunk.index))
+        hashes = sessions.identity_hashes(chunk, identity_key)
+        # Сеансы без ключа — отдельные участники: хэш по номеру строки
+        no_key = hashes == 0
+        hashes[no_key] = pd.util.hash_array(rows[no_key].astype('int64'))
+        yield chunk, held, hashes, rows
+
+
+def _aggregate(statistic_file_path, report_config, batch_rows):
+    """
+    Первый проход: сливает сводки сеансов блоков в таблицу участников.
+    Время просмотра считается по интервалам, объединенным по всему файлу, поэтому пересечения сеансов
+    из разных блоков не суммируются дважды.
+    :return: Тройка (DataFrame участников, индексированный хэшем ключа, в порядке первого сеанса;
+             строка со сведениями о мероприятии; число прочитанных сеансов после фильтров).
+    """
+    attendees = None
+    intervals = pd.DataFrame({'code': pd.Series(dtype='uint64'), 'entry': pd.Series(dtype='datetime64[ns]'),
+                              'exit': pd.Series(dtype='datetime64[ns]')})
+    event_info = {}
+    total = 0
+    for chunk, held, hashes, rows in _chunks(statistic_file_path, report_config, batch_rows):
+        total += len(chunk)
+        for column in ('start_time', 'end_time', 'webinar_topic', 'event_date'):
+            if column not in event_info and column in chunk.columns and chunk[column].notna().any():
+                event_info[column] = chunk[column].dropna().iloc[0]
+        if chunk.empty:
+            continue
+        codes, uniques = pd.factorize(hashes)
+        summary = sessions.summarize(chunk, codes, held).drop(columns='watch')
+        summary['row'] = rows[summary['row'].to_numpy()]
+        summary.index = pd.Index(uniques[summary.index.to_numpy()], name='hash')
+        attendees = summary if attendees is None else _merge(attendees, summary)
+        intervals = _merge_intervals(intervals, chunk, held, hashes)
+
+    if attendees is None:
+        attendees = pd.DataFrame({'row': pd.Series(dtype='int64'), 'held': pd.Series(dtype='bool'),
+                                  'sessions': pd.Series(dtype='int64'), 'first_entry': pd.Series(dtype='datetime64[ns]'),
+                                  'last_exit': pd.Series(dtype='datetime64[ns]')})
+    watch = (intervals['exit'] - intervals['entry']).dt.total_seconds().groupby(intervals['code'].to_numpy()).sum()
+    attendees['watch'] = watch.reindex(attendees.index).to_numpy()
+    return attendees.sort_values('row'), pd.DataFrame([event_info]), total
+
+
+def _merge(attendees, summary):
+    """Сливает сводку очередного блока с накопленной таблицей участников."""
+    grouped = pd.concat([attendees, summary]).groupby(level=0, sort=False)
+    return pd.DataFrame({
+        'row': grouped['row'].min(),
+        'held': grouped['held'].any(),
+        'sessions': grouped['sessions'].sum(),
+        'first_entry': grouped['first_entry'].min(),
+        'last_exit': grouped['last_exit'].max(),
+    })
+
+
+def _merge_intervals(intervals, chunk, held, hashes):
+    """Добавляет сеансы блока к объединенным интервалам просмотра; пересобираются только интервалы участников блока."""
+    entry, exit_ = sessions.session_times(chunk, held)
+    new = pd.DataFrame({'code': hashes, 'entry': entry.to_numpy(), 'exit': exit_.to_numpy()})
+    touched = intervals['code'].isin(hashes)
+    return pd.concat([intervals[~touched], sessions.merge_intervals(pd.concat([intervals[touched], new]))],
+                     ignore_index=True)
+
+
+def _open_outputs(report_config, report_dir, date_str, chat):
+    """
+    Открывает потоковые выходные файлы. Файл присутствовавших открывается при первой строке,
+    чтобы пустой файл не появлялся, если никто не присутствовал.
+    """
+    outputs = []
+    for plan in report_config.outputs:
+        filepath = os.path.join(report_dir, plan.filename_template.format(date=date_str))
+        output = {'plan': plan, 'filepath': filepath, 'stream': None}
+        if plan.type is None:
+            # Листы без данных (например, чат без выгрузки чата) не создаются, как и при обычной обработке
+            sheet_names = [sheet.name for sheet in plan.sheets if _has_data(sheet.type, chat)]
+            output['stream'] = report_writer.open_stream(filepath, plan.format, sheet_names)
+            for sheet_name in sheet_names:
+                logging.info(f"Лист '{sheet_name}' добавлен в отчет {os.path.basename(filepath)}.")
+        outputs.append(output)
+    return outputs
+
+
+def _has_data(sheet_type, chat):
+    """Проверяет, будут ли у листа данные."""
+    if sheet_type == 'chat':
+        return chat is not None and chat['raw'] is not None
+    if sheet_type in config_loader.CHAT_SHEET_TYPES:
+        return chat is not None
+    return True
+
+
+def _streams(outputs):
+    return [output['stream'] for output in outputs if output['stream'] is not None]
+
+
+def _write_attendees(statistic_file_path, report_config, batch_rows, attendees, outputs, chat):
+    """
+    Второй проход: дописывает строки участников в листы "география" и файлы присутствовавших,
+    обновляет базу участников блоками.
+    :return: Пара (показатели базы участников {'new', 'returning'} или None;
+             строки "географии", совпадающие с участниками чата, или None без чата).
+    """
+    db_settings = report_config['processing_settings'].get('attendee_db') or {}
+    conn = attendee_db.connect(db_settings.get('path', 'attendees.sqlite3')) if db_settings.get('enabled') else None
+    event_id = None
+    chat_rows = []
+    with closing(conn) if conn is not None else nullcontext():
+        for chunk, _, hashes, rows in _chunks(statistic_file_path, report_config, batch_rows):
+            # Строка участника — его первый сеанс в файле
+            first = attendees['row'].reindex(hashes).to_numpy() == rows
+            totals = attendees.loc[hashes[first]]
+            block = chunk[first].reset_index(drop=True)
+            block['sessions'] = totals['sessions'].to_numpy()
+            block['first_entry'] = totals['first_entry'].to_numpy()
+            block['last_exit'] = totals['last_exit'].to_numpy()
+            block['watch_minutes'] = sessions.watch_minutes(totals['watch'])
+            block['attended'] = totals['held'].to_numpy()
+
+            with metrics.span('geography', mode='chunked') as geography_span:
+                geography_df = data_processor._create_geography_df(block, report_config)
+                geography_span['rows'] = len(geography_df)
+            _append_geography(outputs, geography_df, report_config)
+            if chat is not None:
+                chat_rows.append(geography_df[chat_analytics.geography_matches(chat, geography_df, report_config.final_names)])
+            if conn is not None and not block.empty:
+                event_id = _update_attendee_db(conn, block) or event_id
+
+        attendee_stats = attendee_db.event_attendee_stats(conn, event_id) if conn is not None and event_id is not None else None
+    chat_geography = pd.concat(chat_rows, ignore_index=True) if chat_rows else None
+    return attendee_stats, chat_geography
+
+
+def _append_geography(outputs, geography_df, report_config):
+    """Дописывает блок "географии" во все выходные файлы."""
+    attended_mask = geography_df[config_loader.ATTENDANCE_COLUMN] == 'да' if config_loader.ATTENDANCE_COLUMN in geography_df.columns else None
+    for output in outputs:
+        plan = output['plan']
+        if plan.type == 'attended_emails_only':
+            if attended_mask is None or not attended_mask.any():
+                continue
+            attended_df = data_processor._create_attended_emails_df(geography_df, output['filepath'], report_config)
+            if attended_df is None:
+                continue
+            if output['stream'] is None:
+                output['stream'] = report_writer.open_stream(output['filepath'], plan.format, ['Sheet1'])
+            output['stream'].append('Sheet1', report_writer.dataframe_rows(attended_df, header=False))
+            continue
+        for sheet in plan.sheets:
+            if sheet.type == 'geography':
+                kept_columns = [c for c in geography_df.columns if c not in sheet.drop_columns]
+                output['stream'].append(sheet.name, report_writer.dataframe_rows(geography_df[kept_columns]))
+
+
+def _write_other_sheets(outputs, attendees, event_info, chat, chat_geography, page_data, report_config, attendee_stats):
+    """Дописывает листы, которым нужны итоги первого прохода: сводку и листы чата."""
+    held = attendees['held'].to_numpy()
+    watched = pd.Series(sessions.watch_minutes(attendees['watch'])[held]).dropna()
+    average_watch = round(float(watched.mean()), 1) if not watched.empty else None
+    summary_df = data_processor._summary_df(event_info, len(attendees), int(held.sum()), average_watch,
+                                            page_data, report_config, attendee_stats)
+    sheet_cache = {}
+    for output in outputs:
+        for sheet in output['plan'].sheets:
+            if sheet.type == 'geography' or not _has_data(sheet.type, chat):
+                continue
+            if sheet.type not in sheet_cache:
+                if sheet.type == 'summary':
+                    sheet_cache[sheet.type] = report_writer.dataframe_rows(summary_df, header=False)
+                elif sheet.type == 'chat':
+                    sheet_cache[sheet.type] = report_writer.dataframe_rows(chat['raw'])
+                elif sheet.type == 'chat_analytics':
+                    sheet_cache[sheet.type] = report_writer.dataframe_rows(chat_analytics.participants_sheet(
+                        chat, chat_geography if chat_geography is not None else pd.DataFrame(),
+                        report_config.final_names, config_loader.ATTENDANCE_COLUMN))
+                elif sheet.type == 'chat_activity':
+                    sheet_cache[sheet.type] = report_writer.dataframe_rows(chat_analytics.activity_sheet(chat))
+            output['stream'].append(sheet.name, sheet_cache[sheet.type])
+
+
+def _update_attendee_db(conn, block):
+    """Записывает блок участников в базу; ошибки базы не прерывают формирование отчетов."""
+    try:
+        return attendee_db.upsert_event(conn, block, block['attended'])
+    except Exception as e:
+        logging.error(f"Не удалось обновить базу участников: {e}")
+        return None
+
@@ -1,32 +1,345 @@
-import yaml
+import os
+import re
+import copy
+import string
+import hashlib
 import logging
 from collections import namedtuple
 
-def load_config(config_path):
+import yaml
+
+from . import output_formats
+
+ATTENDANCE_COLUMN = 'Присутствие на вебинаре'
+# Показатели участника, посчитанные по его сеансам: внутреннее имя -> столбец листа "география"
+SESSION_COLUMNS = {
+    'sessions': 'Сеансов',
+    'first_entry': 'Первый вход',
+    'last_exit': 'Последний выход',
+    'watch_minutes': 'Время просмотра, мин',
+}
+# Составляющие ключа участника (processing_settings.sessions.identity_key), кроме внутренних имен столбцов
+IDENTITY_NAME = 'name'
+SHEET_TYPES = ('geography', 'summary', 'chat', 'chat_analytics', 'chat_activity')
+# Листы, которым нужна выгрузка чата; 'chat' — исходный чат целиком, остальные — агрегаты
+CHAT_SHEET_TYPES = ('chat', 'chat_analytics', 'chat_activity')
+OUTPUT_TYPES = ('attended_emails_only',)
+# Внутренние имена, без которых обработка невозможна (запасной ключ участника — имя и фамилия)
+REQUIRED_INTERNAL_NAMES = ('first_name', 'last_name')
+
+OutputPlan = namedtuple('OutputPlan', ['key', 'filename_template', 'type', 'sheets', 'format'])
+SheetPlan = namedtuple('SheetPlan', ['type', 'name', 'drop_columns'])
+
+_PLAN_CACHE = {}
+
+
+class ConfigError(ValueError):
+    """Ошибка в файле конфигурации отчета."""
+
+
+class FrozenDict(dict):
+    """Неизменяемый словарь: конфиг нельзя случайно поменять на середине прогона."""
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Конфигурация отчета неизменяема")
+
+    __setitem__ = __delitem__ = _readonly
+    update = setdefault = pop = popitem = clear = _readonly
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class ReportPlan(FrozenDict):
+    """
+    Проверенный и скомпилированный конфиг отчета.
+    Доступ к исходным разделам остается словарным (plan['processing_settings']...),
+    а производные данные — карты имен, порядок столбцов, листы, скомпилированные селекторы —
+    вычисляются один раз при загрузке и доступны как атрибуты.
+    """
+    def __init__(self, raw_config, path=None, digest=None):
+        super().__init__(_freeze(raw_config))
+        fields = _compile(self)
+        fields['path'] = path
+        fields['digest'] = digest
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise TypeError("Конфигурация отчета неизменяема")
+
+    def __reduce__(self):
+        return (type(self), (_thaw(self), self.path, self.digest))
+
+
+def load_config(config_path, overrides=None):
     """
-    Загружает и парсит YAML файл конфигурации.
+    Загружает, проверяет и компилирует YAML файл конфигурации.
+    Результат кэшируется: при неизменном файле (mtime/размер или SHA-256) повторная загрузка ничего не стоит.
     :param config_path: Путь к YAML файлу.
-    :return: Объект с конфигурацией или None в случае ошибки.
+    :param overrides: Необязательный словарь, который накладывается на конфиг (например, из аргументов CLI).
+    :return: Объект ReportPlan или None в случае ошибки.
     """
     try:
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
-        
-        # Преобразуем вложенные словари в объекты для удобного доступа
-        # config_obj = json.loads(json.dumps(config_data), object_hook=lambda d: namedtuple('X', d.keys())(*d.values()))
-        
-        logging.info(f"Конфигурация '{config_data.get('report_name')}' успешно загружена из {config_path}")
-        return config_data
+        plan = _load_plan(config_path, overrides)
+        logging.info(f"Конфигурация '{plan.get('report_name')}' успешно загружена из {config_path}")
+        return plan
     except FileNotFoundError:
         logging.error(f"Файл конфигурации не найден по пути: {config_path}")
         return None
     except yaml.YAMLError as e:
         logging.error(f"Ошибка парсинга YAML файла {config_path}: {e}")
         return None
+    except ConfigError as e:
+        logging.error(f"Ошибка в конфигурации {config_path}: {e}")
+        return None
     except Exception as e:
         logging.error(f"Неожиданная ошибка при загрузке конфигурации: {e}")
         return None
 
+
+def as_plan(report_config):
+    """Возвращает ReportPlan, компилируя обычный словарь конфигурации при необходимости."""
+    if isinstance(report_config, ReportPlan):
+        return report_config
+    return ReportPlan(report_config)
+
+
+def _load_plan(config_path, overrides):
+    """Читает конфиг с учетом кэша по mtime/размеру и содержимому файла."""
+    stat = os.stat(config_path)
+    cache_key = (os.path.abspath(config_path), repr(overrides))
+    cached = _PLAN_CACHE.get(cache_key)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(config_path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if cached and cached[1] == digest:
+        plan = cached[2]
+    else:
+        config_data = yaml.safe_load(content.decode('utf-8'))
+        if not isinstance(config_data, dict):
+            raise ConfigError("корень файла должен быть словарем")
+        if overrides:
+            config_data = _merge(config_data, overrides)
+        plan = ReportPlan(config_data, path=config_path, digest=digest)
+    _PLAN_CACHE[cache_key] = ((stat.st_mtime_ns, stat.st_size), digest, plan)
+    return plan
+
+
+def _compile(config):
+    """Проверяет конфиг и вычисляет производные данные для ReportPlan."""
+    source_settings = _require(config, 'source_settings', dict)
+    _require(source_settings, 'login_url', str, 'source_settings')
+    selectors = _require(source_settings, 'selectors', dict, 'source_settings')
+    for section, keys in (('login', ('email_input', 'submit_button', 'password_input', 'login_button', 'success_indicator')),
+                          ('download', ('stats_button', 'chat_button', 'snackbar_notification', 'snackbar_link', 'snackbar_close_button'))):
+        section_settings = _require(selectors, section, dict, 'source_settings.selectors')
+        for key in keys:
+            _require(section_settings, key, str, f'source_settings.selectors.{section}')
+
+    capture_settings = source_settings.get('network_capture') or {}
+    if capture_settings.get('enabled'):
+        _require(capture_settings, 'response_url_pattern', str, 'source_settings.network_capture')
+        try:
+            re.compile(capture_settings['response_url_pattern'])
+        except re.error as e:
+            raise ConfigError(f"source_settings.network_capture.response_url_pattern: {e}") from e
+
+    profile = source_settings.get('browser_profile') or {}
+    if profile.get('enabled'):
+        if profile.get('page_load_strategy', 'eager') not in ('normal', 'eager', 'none'):
+            raise ConfigError("source_settings.browser_profile.page_load_strategy: допустимы 'normal', 'eager', 'none'")
+        patterns = profile.get('blocked_url_patterns') or []
+        if not isinstance(patterns, (list, tuple)) or not all(isinstance(p, str) for p in patterns):
+            raise ConfigError("source_settings.browser_profile.blocked_url_patterns должен быть списком строк")
+
+    proc_settings = _require(config, 'processing_settings', dict)
+    _require(proc_settings, 'sheet_name', str, 'processing_settings')
+    column_map = _require(proc_settings, 'column_map', dict, 'processing_settings')
+    if not column_map:
+        raise ConfigError("processing_settings.column_map пуст")
+
+    inverted_map = {}
+    for source_name, internal_name in column_map.items():
+        if internal_name in inverted_map:
+            raise ConfigError(f"внутреннее имя '{internal_name}' указано в column_map дважды")
+        inverted_map[internal_name] = source_name
+    missing = [name for name in REQUIRED_INTERNAL_NAMES if name not in inverted_map]
+    if missing:
+        raise ConfigError(f"в column_map нет обязательных внутренних имен: {missing}")
+
+    rename_map = proc_settings.get('rename_map') or {}
+    unknown = [name for name in rename_map if name not in column_map]
+    if unknown:
+        raise ConfigError(f"rename_map ссылается на столбцы, которых нет в column_map: {unknown}")
+
+    # Цепочка переименований: внутреннее имя -> имя в файле -> финальное имя (rename_map)
+    final_names = {internal: rename_map.get(source, source) for internal, source in inverted_map.items()}
+    internal_by_final = {final: internal for internal, final in final_names.items()}
+    if len(internal_by_final) != len(final_names):
+        raise ConfigError("после rename_map несколько столбцов получают одинаковое имя")
+
+    geography_order = proc_settings.get('geography_column_order')
+    if geography_order:
+        computed = [ATTENDANCE_COLUMN, *SESSION_COLUMNS.values()]
+        unknown = [name for name in geography_order if name not in internal_by_final and name not in computed]
+        if unknown:
+            raise ConfigError(f"geography_column_order содержит столбцы, которых не будет в отчете: {unknown}. "
+                              f"Доступны: {list(internal_by_final) + computed}")
+
+    dtypes = proc_settings.get('dtypes') or {}
+    unknown = [name for name in dtypes if name not in inverted_map]
+    if unknown:
+        raise ConfigError(f"dtypes ссылается на неизвестные внутренние имена: {unknown}")
+
+    identity_key = (proc_settings.get('sessions') or {}).get('identity_key') or ()
+    unknown = [part for part in identity_key if part != IDENTITY_NAME and part not in inverted_map]
+    if unknown:
+        raise ConfigError(f"processing_settings.sessions.identity_key: неизвестные составляющие {unknown}, "
+                          f"допустимы '{IDENTITY_NAME}' и внутренние имена из column_map")
+
+    chunked_settings = proc_settings.get('chunked') or {}
+    batch_rows = chunked_settings.get('batch_rows')
+    if batch_rows is not None and (not isinstance(batch_rows, int) or batch_rows < 1):
+        raise ConfigError(f"processing_settings.chunked.batch_rows должен быть положительным целым числом, получено: {batch_rows!r}")
+
+    chat_settings = proc_settings.get('chat') or {}
+    try:
+        re.compile(chat_settings.get('question_pattern') or '')
+    except re.error as e:
+        raise ConfigError(f"processing_settings.chat.question_pattern: {e}") from e
+
+    outputs = []
+    for key, details in (config.get('output_files') or {}).items():
+        if not details.get('enabled'):
+            continue
+        outputs.append(_compile_output(key, details, final_names, internal_by_final))
+
+    # Описания полей страницы проверяются сразу; CSS-селекторы компилируются перед запуском браузера
+    # (main) или при первом разборе, чтобы загрузка конфига не импортировала bs4
+    from . import scraper
+    try:
+        scraper_engine = scraper.get_engine(config)
+    except Exception as e:
+        raise ConfigError(f"ошибка в source_settings.selectors.scraper: {e}") from e
+
+    for path in (proc_settings.get('filter') or {}).get('exclusion_lists') or []:
+        if not os.path.exists(path):
+            logging.warning(f"Список исключений не найден: {path}")
+
+    return {
+        'column_map': FrozenDict(column_map),
+        'inverted_map': FrozenDict(inverted_map),
+        'final_names': FrozenDict(final_names),
+        'internal_by_final': FrozenDict(internal_by_final),
+        'geography_order': tuple(geography_order) if geography_order else None,
+        'dtypes': FrozenDict(dtypes),
+        'not_attended_values': tuple(proc_settings.get('not_attended_values') or ()),
+        'roles_to_exclude': tuple((proc_settings.get('filter') or {}).get('roles_to_exclude') or ()),
+        'outputs': tuple(outputs),
+        # Исходный чат читается в память, только если он выводится хотя бы в одном файле
+        'needs_raw_chat': any(sheet.type == 'chat' for output in outputs for sheet in output.sheets),
+        'scraper_engine': scraper_engine,
+    }
+
+
+def _compile_output(key, details, final_names, internal_by_final):
+    """Проверяет описание одного выходного файла и разрешает имена удаляемых столбцов."""
+    where = f"output_files.{key}"
+    template = _require(details, 'filename_template', str, where)
+    try:
+        fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+    except ValueError as e:
+        raise ConfigError(f"{where}.filename_template: {e}") from e
+    if fields - {'date'}:
+        raise ConfigError(f"{where}.filename_template: допустим только шаблон {{date}}, найдено {sorted(fields)}")
+
+    # Формат записи (xlsx, csv, jsonl, parquet или зарегистрированный через report_writer.register_writer)
+    try:
+        output_format, multi_sheet = output_formats.resolve_format(template, details.get('format'))
+    except ValueError as e:
+        raise ConfigError(f"{where}.format: {e}") from e
+
+    output_type = details.get('type')
+    if output_type is not None:
+        if output_type not in OUTPUT_TYPES:
+            raise ConfigError(f"{where}.type: неизвестный тип '{output_type}', допустимы {list(OUTPUT_TYPES)}")
+        return OutputPlan(key, template, output_type, (), output_format)
+
+    sheets = []
+    seen_names = set()
+    for sheet in details.get('sheets') or []:
+        sheet_type, sheet_name = sheet.get('type'), sheet.get('name')
+        if sheet_type not in SHEET_TYPES:
+            raise ConfigError(f"{where}: неизвестный тип листа '{sheet_type}', допустимы {list(SHEET_TYPES)}")
+        if not sheet_name or len(sheet_name) > 31:
+            raise ConfigError(f"{where}: имя листа должно быть непустым и не длиннее 31 символа: '{sheet_name}'")
+        if sheet_name in seen_names:
+            raise ConfigError(f"{where}: имя листа '{sheet_name}' повторяется")
+        seen_names.add(sheet_name)
+
+        drop_columns = []
+        for name in sheet.get('drop_columns') or []:
+            # В drop_columns допустимы и внутренние, и финальные имена; в отчете столбцы уже с финальными именами
+            if name in final_names:
+                drop_columns.append(final_names[name])
+            elif name in internal_by_final or name == ATTENDANCE_COLUMN or name in SESSION_COLUMNS.values():
+                drop_columns.append(name)
+            else:
+                raise ConfigError(f"{where}: drop_columns содержит неизвестный столбец '{name}'")
+        sheets.append(SheetPlan(sheet_type, sheet_name, tuple(drop_columns)))
+    if not sheets:
+        raise ConfigError(f"{where}: не описано ни одного листа")
+    if len(sheets) > 1 and not multi_sheet:
+        raise ConfigError(f"{where}: формат '{output_format}' вмещает только один лист, описано {len(sheets)}")
+    return OutputPlan(key, template, None, tuple(sheets), output_format)
+
+
+def _require(section, key, expected_type, where=None):
+    """Возвращает обязательный параметр раздела, проверяя его тип."""
+    value = section.get(key)
+    path = f"{where}.{key}" if where else key
+    if value is None:
+        raise ConfigError(f"не задан обязательный параметр {path}")
+    if not isinstance(value, expected_type):
+        raise ConfigError(f"параметр {path} должен быть типа {expected_type.__name__}")
+    return value
+
+
+def _merge(base, overrides):
+    """Рекурсивно накладывает overrides на копию base."""
+    result = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = _merge(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def _freeze(value):
+    """Рекурсивно превращает словари в FrozenDict, а списки — в кортежи."""
+    if isinstance(value, dict):
+        return FrozenDict({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """Обратное к _freeze: обычные словари и списки."""
+    if isinstance(value, dict):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
 def get_column_name(config, internal_name):
     """
     Находит реальное имя столбца по его внутреннему имени из карты столбцов.
@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config, metrics, rate_limit
+from .browser import BrowserManager
+from .data_processor import process_event
+from .file_handler import event_dir_name
+
+# Долгоживущий сервис отчетов: держит пул заранее запущенных и авторизованных сессий браузера
+# и принимает задания по локальному HTTP API (TCP или Unix-сокет):
+#   POST /jobs          {"url": "<страница мероприятия>"} -> 202 {"id": ..., "status": "queued"}
+#   GET  /jobs/<id>     состояние задания (queued, running, ok, failed), папка отчетов, ошибка
+#   GET  /jobs          последние задания
+#   GET  /health        состояние пула
+# Пример: curl -X POST --unix-socket /tmp/reporter.sock http://localhost/jobs -d '{"url": "https://..."}'
+
+DEFAULT_SETTINGS = {
+    'listen': "127.0.0.1:8787",
+    'pool_size': 2,
+    'max_jobs_per_session': 20,
+    'lease_timeout_sec': 600,
+    'job_history': 200,
+}
+
+
+class BrowserPool:
+    """
+    Пул авторизованных BrowserManager. Каждое задание арендует одну сессию;
+    после max_jobs_per_session заданий или ошибки сессия закрывается и заменяется новой в фоне.
+    """
+    def __init__(self, report_config, size, max_jobs_per_session, rate_limiter=None):
+        self.report_config = report_config
+        self.size = size
+        self.max_jobs_per_session = max_jobs_per_session
+        self.rate_limiter = rate_limiter
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._sessions = {}  # номер сессии -> число выполненных заданий
+        self._next_id = 0
+        self.recycled = 0
+
+    def start(self):
+        """Запускает все сессии параллельно и ждет их готовности. :return: Число готовых сессий."""
+        threads = [threading.Thread(target=self._add_session, daemon=True) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self._idle.qsize()
+
+    @contextmanager
+    def lease(self, timeout):
+        """
+        Арендует сессию на время задания.
+        :param timeout: Сколько секунд ждать свободную сессию.
+        :return: Контекстный менеджер, отдающий пару (BrowserManager, запись об аренде); запись['failed'] = True
+                 помечает сессию для замены.
+        """
+        try:
+            session_id, manager = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Нет свободной сессии браузера за {timeout} с") from None
+        lease = {'failed': False}
+        try:
+            yield manager, lease
+        except BaseException:
+            lease['failed'] = True
+            raise
+        finally:
+            self._release(session_id, manager, lease['failed'])
+
+    def stats(self):
+        """Возвращает состояние пула для /health."""
+        with self._lock:
+            return {'size': self.size, 'alive': len(self._sessions), 'idle': self._idle.qsize(),
+                    'recycled': self.recycled, 'jobs_per_session': dict(self._sessions)}
+
+    def close(self):
+        """Закрывает все свободные сессии."""
+        while True:
+            try:
+                _, manager = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            manager.quit_driver()
+
+    def _release(self, session_id, manager, failed):
+        """Возвращает сессию в пул или заменяет ее новой."""
+        with self._lock:
+            self._sessions[session_id] += 1
+            exhausted = self._sessions[session_id] >= self.max_jobs_per_session
+        if not failed and not exhausted:
+            self._idle.put((session_id, manager))
+            return
+        reason = "ошибка задания" if failed else f"выполнено {self.max_jobs_per_session} заданий"
+        logging.info(f"Сессия браузера {session_id} заменяется: {reason}.")
+        with self._lock:
+            del self._sessions[session_id]
+            self.recycled += 1
+        threading.Thread(target=self._replace, args=(manager,), daemon=True).start()
+
+    def _replace(self, manager):
+        """Закрывает старую сессию и запускает новую."""
+        try:
+            manager.quit_driver()
+        except Exception as e:
+            logging.warning(f"Не удалось закрыть сессию браузера: {e}")
+        self._add_session()
+
+    def _add_session(self):
+        """Запускает и авторизует новую сессию; при ошибке повторяет попытку с паузой."""
+        with self._lock:
+            session_id = self._next_id
+            self._next_id += 1
+        # У каждой сессии своя папка загрузок: одновременные задания не перезапишут файлы друг друга
+        output_dir = os.path.join(config.OUTPUT_DIR, f"session_{session_id}")
+        os.makedirs(output_dir, exist_ok=True)
+        for attempt in range(1, 4):
+            manager = BrowserManager(output_dir=output_dir, report_config=self.report_config, rate_limiter=self.rate_limiter)
+            if manager.warm_up():
+                with self._lock:
+                    self._sessions[session_id] = 0
+                self._idle.put((session_id, manager))
+                logging.info(f"Сессия браузера {session_id} готова.")
+                return
+            manager.quit_driver()
+            logging.warning(f"Не удалось подготовить сессию браузера {session_id} (попытка {attempt}).")
+            time.sleep(5 * attempt)
+        logging.error(f"Сессия браузера {session_id} не запущена: пул работает в уменьшенном составе.")
+
+
+class ReportService:
+    """Очередь заданий: принимает URL, выполняет задания на сессиях пула, хранит историю."""
+    def __init__(self, report_config, settings):
+        self.report_config = report_config
+        self.settings = settings
+        self.pool = BrowserPool(report_config, settings['pool_size'], settings['max_jobs_per_session'],
+                                rate_limit.from_settings(report_config.get('rate_limit')))
+        self._executor = ThreadPoolExecutor(max_workers=settings['pool_size'], thread_name_prefix="report-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def submit(self, page_url, report_dir=None):
+        """
+        Ставит задание в очередь.
+        :return: Словарь с описанием задания.
+        """
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'url': page_url,
+            'status': 'queued',
+            'report_dir': report_dir or os.path.join(config.REPORT_DIR, event_dir_name(page_url)),
+            'submitted': time.time(),
+            'duration_sec': None,
+            'error': None,
+        }
+        with self._lock:
+            self._jobs[job['id']] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        return dict(job)
+
+    def job(self, job_id):
+        """Возвращает копию задания или None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def jobs(self):
+        """Возвращает последние задания, новые первыми."""
+        with self._lock:
+            return [dict(job) for job in reversed(self._jobs.values())]
+
+    def shutdown(self):
+        """Дожидается текущих заданий и закрывает сессии."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.pool.close()
+        metrics.export(self.report_config.get('metrics'))
+
+    def _run(self, job):
+        """Выполняет задание на арендованной сессии."""
+        started = time.monotonic()
+        with self._lock:
+            self._active += 1
+        try:
+            with self.pool.lease(self.settings['lease_timeout_sec']) as (manager, lease):
+                job['status'] = 'running'
+                logging.info(f"Задание {job['id']}: {job['url']}")
+                with metrics.span('event', url=job['url'], job=job['id']) as event_span:
+                    ok, error = process_event(manager, job['url'], self.report_config, job['report_dir'])
+                    event_span['status'] = 'ok' if ok else 'error'
+                lease['failed'] = not ok
+            job['status'], job['error'] = ('ok', None) if ok else ('failed', error)
+        except Exception as e:
+            logging.error(f"Задание {job['id']} не выполнено: {e}")
+            job['status'], job['error'] = 'failed', str(e)
+        finally:
+            job['duration_sec'] = round(time.monotonic() - started, 1)
+            with self._lock:
+                self._active -= 1
+                idle = self._active == 0
+                self._trim_history()
+            if idle:
+                # В простое трасса сбрасывается на диск, чтобы список замеров не рос бесконечно
+                metrics.export(self.report_config.get('metrics'), reset=True)
+
+    def _trim_history(self):
+        """Удаляет самые старые завершенные задания сверх job_history."""
+        excess = len(self._jobs) - self.settings['job_history']
+        for job_id in [job_id for job_id, job in self._jobs.items() if job['status'] in ('ok', 'failed')][:max(0, excess)]:
+            del self._jobs[job_id]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP API сервиса отчетов (JSON)."""
+    service = None
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self._reply(200, {'status': 'ok', 'pool': self.service.pool.stats()})
+        if self.path == '/jobs':
+            return self._reply(200, {'jobs': self.service.jobs()})
+        if self.path.startswith('/jobs/'):
+            job = self.service.job(self.path[len('/jobs/'):])
+            return self._reply(200, job) if job else self._reply(404, {'error': 'Задание не найдено'})
+        return self._reply(404, {'error': 'Неизвестный путь'})
+
+    def do_POST(self):
+        if self.path != '/jobs':
+            return self._reply(404, {'error': 'Неизвестный путь'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            return self._reply(400, {'error': 'Тело запроса должно быть JSON'})
+        page_url = payload.get('url') if isinstance(payload, dict) else None
+        if not page_url or not isinstance(page_url, str):
+            return self._reply(400, {'error': "Не указан 'url'"})
+        return self._reply(202, self.service.submit(page_url.strip()))
+
+    def _reply(self, status, body):
+        data = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # У Unix-сокета нет адреса клиента
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logging.info(f"[daemon] {self.address_string()} {format % args}")
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(listen, handler):
+    """
+    Создает HTTP-сервер по адресу из конфига: "host:port" или "unix:/путь/к/сокету".
+    """
+    if listen.startswith('unix:'):
+        path = listen[len('unix:'):]
+        if os.path.exists(path):
+            os.remove(path)
+        server = _UnixHTTPServer(path, handler)
+        # Доступ к сокету — владельцу и группе (члены команды на той же машине)
+        os.chmod(path, 0o660)
+        return server
+    host, _, port = listen.rpartition(':')
+    return ThreadingHTTPServer((host or '127.0.0.1', int(port)), handler)
+
+
+def serve(report_config):
+    """
+    Запускает сервис отчетов и обслуживает запросы до Ctrl+C.
+    :param report_config: Загруженный конфиг; раздел daemon задает адрес, размер пула и ротацию сессий.
+    """
+    settings = {**DEFAULT_SETTINGS, **(report_config.get('daemon') or {})}
+    service = ReportService(report_config, settings)
+    logging.info(f"Запускаю пул из {settings['pool_size']} сессий браузера...")
+    started = time.monotonic()
+    ready = service.pool.start()
+    if not ready:
+        logging.error("Не удалось подготовить ни одной сессии браузера. Сервис не запущен.")
+        service.shutdown()
+        return
+    logging.info(f"Готово сессий: {ready} за {time.monotonic() - started:.1f} с.")
+
+    handler = type('Handler', (_Handler,), {'service': service})
+    server = make_server(settings['listen'], handler)
+    logging.info(f"Сервис отчетов слушает {settings['listen']}.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Получен сигнал остановки.")
+    finally:
+        server.server_close()
+        if settings['listen'].startswith('unix:'):
+            try:
+                os.remove(settings['listen'][len('unix:'):])
+            except OSError:
+                pass
+        service.shutdown()
+        logging.info("Сервис отчетов остановлен.")
@@ -1,138 +1,293 @@
 import os
 import pandas as pd
 import logging
+from contextlib import closing
 
-from . import config, scraper, config_loader
+from . import attendee_db, chat_analytics, config, file_handler, scraper, config_loader, excel_reader, exclusion_filter, metrics, parse_cache, report_writer, sessions
 
-def process_and_generate_reports(statistic_file_path, chat_file_path, soup, report_config):
+def process_and_generate_reports(statistic_file_path, chat_file_path, page_data, report_config, report_dir=None):
     """
     Главная функция обработки данных, управляемая конфигурационным файлом.
+    :param page_data: Поля страницы мероприятия из scraper.scrape_page (или None).
+    :param report_dir: Директория для отчетов. По умолчанию config.REPORT_DIR.
+    :return: True, если отчеты сгенерированы, иначе False.
     """
-    proc_settings = report_config['processing_settings']
+    report_config = config_loader.as_plan(report_config)
+    report_dir = report_dir or config.REPORT_DIR
     
     if not statistic_file_path or not os.path.exists(statistic_file_path):
         logging.error("Файл статистики не найден. Обработка невозможна.")
-        return
+        return False
 
     logging.info(f"Начинаю обработку файла статистики: {statistic_file_path}")
-    
+
+    # Импорт здесь: chunked использует функции этого модуля
+    from . import chunked
+    if chunked.use_chunked(statistic_file_path, report_config):
+        chat = load_chat(chat_file_path, report_config)
+        return chunked.generate_reports(statistic_file_path, chat, page_data, report_config, report_dir)
+
+    df = load_statistics(statistic_file_path, report_config)
+    if df is None:
+        return False
+    chat = load_chat(chat_file_path, report_config)
+
+    report_data = prepare_report_data(df, page_data, report_config)
+    jobs = build_report_jobs(report_data, chat, report_config, report_dir)
+    written = report_writer.write_workbooks(jobs, max_workers=report_config['processing_settings'].get('report_workers'))
+    if not report_writer.check_written([job[0] for job in jobs], written):
+        return False
+
+    logging.info("Генерация всех отчетов завершена.")
+    return True
+
+
+def process_event(browser_manager, page_url, report_config, report_dir):
+    """
+    Скачивает исходные файлы и генерирует отчеты для одного мероприятия.
+    Использует уже авторизованный browser_manager.
+    :return: Кортеж (успех, сообщение об ошибке или None).
+    """
     try:
-        source_df = pd.read_excel(statistic_file_path, sheet_name=proc_settings['sheet_name'])
+        download_data = browser_manager.download_source_files(page_url)
+        if not download_data:
+            return False, "Не удалось скачать исходные файлы"
+        logging.info("--> process_event: File download successful.")
+
+        statistic_file, chat_file, page_data = download_data
+        if not process_and_generate_reports(
+            statistic_file_path=statistic_file,
+            chat_file_path=chat_file,
+            page_data=page_data,
+            report_config=report_config,
+            report_dir=report_dir,
+        ):
+            return False, "Не удалось сгенерировать отчеты"
+        logging.info("--> process_event: Report processing finished.")
+        return True, None
     except Exception as e:
-        logging.error(f"Не удалось прочитать лист '{proc_settings['sheet_name']}' из '{statistic_file_path}'. Ошибка: {e}")
-        return
+        logging.error(f"Ошибка при обработке {page_url}: {e}", exc_info=True)
+        return False, str(e)
+    finally:
+        # Временные файлы удаляем сразу, чтобы они не копились в пакетном режиме
+        file_handler.cleanup_files(browser_manager.downloaded_files)
+        browser_manager.downloaded_files.clear()
 
-    # Переименовываем столбцы в соответствии с картой для внутреннего использования
-    inverted_map = {v: k for k, v in proc_settings['column_map'].items()}
-    df = source_df.rename(columns=proc_settings['column_map'])
 
-    # Базовая обработка
-    df.drop_duplicates(subset=['first_name', 'last_name'], inplace=True, keep='first')
-    df.reset_index(drop=True, inplace=True)
+def load_statistics(statistic_file_path, report_config):
+    """
+    Читает и фильтрует статистику и сводит сеансы к участникам, используя кэш разбора, если он включен.
+    :return: DataFrame участников с внутренними именами столбцов или None в случае ошибки.
+    """
+    return _cached('stats', statistic_file_path, report_config, _load_statistics)
 
-    # Фильтрация
-    df = _filter_data(df, report_config)
 
-    webinar_date_str = _get_webinar_date_str(df)
-    os.makedirs(config.REPORT_DIR, exist_ok=True)
-    
-    # Создание основных DF для отчетов
-    geography_df = _create_geography_df(df, report_config)
-    webinar_df = _create_webinar_df(df, geography_df, soup, report_config)
-    chat_df = _create_chat_df(chat_file_path) if chat_file_path and os.path.exists(chat_file_path) else None
-
-    # Генерация выходных файлов на основе конфига
-    for report_key, report_details in report_config.get('output_files', {}).items():
-        if report_details.get('enabled'):
-            logging.info(f"Генерирую отчет '{report_key}'...")
-            
-            filename = report_details['filename_template'].format(date=webinar_date_str)
-            filepath = os.path.join(config.REPORT_DIR, filename)
+def load_chat(chat_file_path, report_config):
+    """
+    Потоково читает выгрузку чата и считает аналитику, используя кэш разбора, если он включен.
+    Исходные сообщения сохраняются, только если в отчетах есть лист 'chat'.
+    :return: Результат chat_analytics.read_chat или None, если файла нет или его не удалось прочитать.
+    """
+    if not chat_file_path or not os.path.exists(chat_file_path):
+        return None
+    kind = 'chat_raw' if report_config.needs_raw_chat else 'chat'
+    return _cached(kind, chat_file_path, report_config, _load_chat)
+
+
+def prepare_report_data(df, page_data, report_config):
+    """
+    Готовит общие для всех выходных файлов данные: листы "география" и "вебинар", дату мероприятия.
+    Чат здесь не нужен, поэтому этот шаг может выполняться, пока чат еще читается.
+    :return: Словарь {'geography', 'webinar', 'date', 'sheet_cache'}.
+    """
+    with metrics.span('geography') as geography_span:
+        geography_df = _create_geography_df(df, report_config)
+        geography_span['rows'] = len(geography_df)
+    attendee_stats = _update_attendee_db(df, geography_df, report_config)
+    return {
+        'geography': geography_df,
+        'webinar': _create_webinar_df(df, geography_df, page_data, report_config, attendee_stats),
+        'date': _get_webinar_date_str(df),
+        # Каждый уникальный лист сериализуется один раз и переиспользуется во всех книгах
+        'sheet_cache': {},
+    }
+
+
+def build_report_jobs(report_data, chat, report_config, report_dir, outputs=None):
+    """
+    Сериализует листы выходных файлов для report_writer.write_workbooks.
+    :param report_data: Результат prepare_report_data.
+    :param chat: Результат load_chat или None.
+    :param outputs: Выходные файлы (OutputPlan); по умолчанию — все включенные в конфиге.
+    :return: Список кортежей (путь к файлу, листы, формат).
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    jobs = []
+    for output in report_config.outputs if outputs is None else outputs:
+        logging.info(f"Генерирую отчет '{output.key}'...")
+
+        filename = output.filename_template.format(date=report_data['date'])
+        filepath = os.path.join(report_dir, filename)
+
+        if output.type == 'attended_emails_only':
+            attended_df = _create_attended_emails_df(report_data['geography'], filepath, report_config)
+            if attended_df is not None:
+                jobs.append((filepath, [('Sheet1', report_writer.dataframe_rows(attended_df, header=False))], output.format))
+        else:
+            jobs.append((filepath, _build_standard_sheets(
+                filepath, output, report_data['geography'], report_data['webinar'], chat, report_data['sheet_cache'], report_config
+            ), output.format))
+    return jobs
 
-            if report_details.get('type') == 'attended_emails_only':
-                _create_attended_emails_file(geography_df, filepath, report_config)
-            else:
-                _save_standard_report(filepath, report_details, geography_df, webinar_df, chat_df)
-    
-    logging.info("Генерация всех отчетов завершена.")
 
+def needs_chat(output):
+    """Проверяет, есть ли в выходном файле лист, построенный по чату."""
+    return any(sheet.type in config_loader.CHAT_SHEET_TYPES for sheet in output.sheets)
+
+
+def _cached(kind, file_path, report_config, loader):
+    """Возвращает результат loader(file_path, report_config) из кэша разбора или вычисляет и сохраняет его."""
+    proc_settings = report_config['processing_settings']
+    cache_settings = proc_settings.get('parse_cache') or {}
+    if not cache_settings.get('enabled'):
+        return loader(file_path, report_config)
+
+    cache_dir = cache_settings.get('dir', '.cache/parsed')
+    key = parse_cache.cache_key(kind, file_path, proc_settings)
+    frame = parse_cache.load(cache_dir, key)
+    if frame is None:
+        frame = loader(file_path, report_config)
+        if frame is not None:
+            parse_cache.store(cache_dir, key, frame, cache_settings.get('max_size_mb', 500))
+    return frame
+
+
+def _load_statistics(statistic_file_path, report_config):
+    """Читает и фильтрует сеансы входов, затем сводит их к строке на участника."""
+    proc_settings = report_config['processing_settings']
+    try:
+        with metrics.span('xlsx_parse', file=os.path.basename(statistic_file_path)) as parse_span:
+            parse_span['bytes'] = os.path.getsize(statistic_file_path)
+            # Читаются только столбцы из карты, сразу с внутренними именами
+            df = excel_reader.read_sheet_columns(
+                statistic_file_path, proc_settings['sheet_name'], proc_settings['column_map'], proc_settings.get('dtypes')
+            )
+            parse_span['rows'] = len(df)
+    except Exception as e:
+        logging.error(f"Не удалось прочитать лист '{proc_settings['sheet_name']}' из '{statistic_file_path}'. Ошибка: {e}")
+        return None
+
+    with metrics.span('filter') as filter_span:
+        filter_span['rows_in'] = len(df)
+        df = _filter_data(df, report_config)
+        filter_span['rows'] = len(df)
+
+    # Сеансы одного человека (переподключения) объединяются, присутствие решается по всем его сеансам
+    with metrics.span('sessions') as sessions_span:
+        sessions_span['rows_in'] = len(df)
+        attended = _attendance_mask(df['entry_time'], list(report_config.not_attended_values)) if 'entry_time' in df.columns else None
+        df = sessions.aggregate(df, attended, proc_settings.get('sessions'))
+        sessions_span['rows'] = len(df)
+    return df
 
-def _save_standard_report(filepath, report_details, base_geography_df, webinar_df, chat_df):
-    """Сохраняет стандартный отчет с несколькими листами, как описано в конфиге."""
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        for sheet_info in report_details.get('sheets', []):
-            sheet_type = sheet_info['type']
-            sheet_name = sheet_info['name']
 
+def _load_chat(chat_file_path, report_config):
+    """Читает чат с замером времени разбора."""
+    with metrics.span('chat_parse', file=os.path.basename(chat_file_path)) as chat_span:
+        chat_span['bytes'] = os.path.getsize(chat_file_path)
+        chat = chat_analytics.read_chat(
+            chat_file_path, report_config['processing_settings'].get('chat'), keep_raw=report_config.needs_raw_chat
+        )
+        chat_span['rows'] = chat['messages'] if chat is not None else 0
+    return chat
+
+
+def _build_standard_sheets(filepath, output, base_geography_df, webinar_df, chat, sheet_cache, report_config):
+    """
+    Готовит листы стандартного отчета, как описано в конфиге.
+    :param output: OutputPlan из скомпилированного конфига.
+    :param chat: Результат load_chat или None.
+    :param sheet_cache: Общий для всех отчетов кэш уже сериализованных листов.
+    :return: Список пар (имя листа, строки листа) для report_writer.
+    """
+    sheets = []
+    for sheet_type, sheet_name, cols_to_drop in output.sheets:
+        cache_key = (sheet_type, cols_to_drop)
+
+        if cache_key not in sheet_cache:
             if sheet_type == 'geography':
-                geo_df = base_geography_df.copy()
-                if 'drop_columns' in sheet_info:
-                    # Напрямую используем имена из конфига, т.к. в geo_df они уже финальные
-                    cols_to_drop = sheet_info['drop_columns']
-                    geo_df.drop(columns=cols_to_drop, inplace=True, errors='ignore')
-                    logging.info(f"Столбцы {cols_to_drop} удалены для отчета {os.path.basename(filepath)}.")
-                
-                # Возвращаем оригинальные имена столбцов для записи в Excel
-                geo_df.rename(columns=geo_df.attrs['inverted_map']).to_excel(writer, sheet_name=sheet_name, index=False)
+                # drop_columns уже разрешены в финальные имена при загрузке конфига
+                kept_columns = [c for c in base_geography_df.columns if c not in cols_to_drop]
+                geo_df = base_geography_df[kept_columns]
+                if cols_to_drop:
+                    logging.info(f"Столбцы {list(cols_to_drop)} удалены для отчета {os.path.basename(filepath)}.")
+                sheet_cache[cache_key] = report_writer.dataframe_rows(geo_df)
             
             elif sheet_type == 'summary':
-                webinar_df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+                sheet_cache[cache_key] = report_writer.dataframe_rows(webinar_df, header=False)
             
-            elif sheet_type == 'chat' and chat_df is not None:
-                chat_df.to_excel(writer, sheet_name=sheet_name, index=False)
-    logging.info(f"Лист '{sheet_info['name']}' добавлен в отчет {os.path.basename(filepath)}.")
+            elif sheet_type == 'chat' and chat is not None and chat['raw'] is not None:
+                sheet_cache[cache_key] = report_writer.dataframe_rows(chat['raw'])
 
+            elif sheet_type == 'chat_analytics' and chat is not None:
+                analytics_df = chat_analytics.participants_sheet(
+                    chat, base_geography_df, report_config.final_names, config_loader.ATTENDANCE_COLUMN
+                )
+                sheet_cache[cache_key] = report_writer.dataframe_rows(analytics_df)
 
-def _create_attended_emails_file(geography_df, filepath, report_config):
-    """Создает и сохраняет файл только с email-адресами присутствовавших."""
-    attended_df = geography_df[geography_df['Присутствие на вебинаре'] == 'да'].copy()
+            elif sheet_type == 'chat_activity' and chat is not None:
+                sheet_cache[cache_key] = report_writer.dataframe_rows(chat_analytics.activity_sheet(chat))
 
-    # Динамически находим финальные имена нужных столбцов
-    proc_settings = report_config.get('processing_settings', {})
-    inverted_map = geography_df.attrs.get('inverted_map', {})
-    rename_map = proc_settings.get('rename_map', {})
+            else:
+                sheet_cache[cache_key] = None
+
+        if sheet_cache[cache_key] is not None:
+            sheets.append((sheet_name, sheet_cache[cache_key]))
+            logging.info(f"Лист '{sheet_name}' добавлен в отчет {os.path.basename(filepath)}.")
+    return sheets
 
-    def get_final_name(internal_name):
-        source_name = inverted_map.get(internal_name)
-        if source_name:
-            return rename_map.get(source_name, source_name)
-        return None
-    
-    first_name_col = get_final_name('first_name')
-    last_name_col = get_final_name('last_name')
-    email_col = get_final_name('email')
+
+def _create_attended_emails_df(geography_df, filepath, report_config):
+    """Создает DataFrame с именами (name) и email-адресами (email) присутствовавших или None, если данных нет."""
+    attended_df = geography_df[geography_df[config_loader.ATTENDANCE_COLUMN] == 'да']
+
+    first_name_col = report_config.final_names.get('first_name')
+    last_name_col = report_config.final_names.get('last_name')
+    email_col = report_config.final_names.get('email')
 
     required_cols = [c for c in [first_name_col, last_name_col, email_col] if c]
     
     if not attended_df.empty and all(k in attended_df.columns for k in required_cols):
-        report_df = pd.DataFrame()
-        report_df[0] = attended_df[first_name_col] + ' ' + attended_df[last_name_col]
-        report_df[1] = attended_df[email_col]
-        report_df.to_excel(filepath, index=False, header=False)
-        logging.info(f"Файл с email адресами успешно сохранен: {filepath}")
+        # Имена столбцов нужны форматам с именованными полями (jsonl, parquet); в xlsx и csv заголовок не пишется
+        return pd.DataFrame({
+            'name': attended_df[first_name_col] + ' ' + attended_df[last_name_col],
+            'email': attended_df[email_col],
+        })
     else:
         missing_cols = [col for col in required_cols if col not in attended_df.columns]
         logging.warning(f"Нет данных для создания файла {os.path.basename(filepath)}. "
                         f"Причина: DataFrame пуст или отсутствуют необходимые столбцы: {missing_cols}")
+        return None
 
 
 def _filter_data(df, report_config):
     """Применяет фильтры к DataFrame на основе глобального .env и конфига отчета."""
     proc_settings = report_config['processing_settings']
     
-    # 1. Фильтрация по глобальному FILTER_LIST из .env
-    if 'email' in df.columns and config.FILTER_LIST:
-        initial_rows = len(df)
-        # Email уже в нижнем регистре от config.py
-        df = df[~df['email'].str.lower().isin(config.FILTER_LIST)]
-        if (initial_rows - len(df)) > 0:
-            logging.info(f"Отфильтровано {initial_rows - len(df)} строк по глобальному FILTER_LIST.")
+    # 1. Фильтрация по глобальному FILTER_LIST из .env и спискам исключений из конфига
+    exclusion_index = exclusion_filter.get_exclusion_index(proc_settings.get('filter', {}))
+    if 'email' in df.columns and exclusion_index:
+        excluded, hits = exclusion_index.match(df['email'])
+        if excluded.any():
+            df = df[~excluded]
+            rule_stats = ", ".join(f"{rule}: {count}" for rule, count in hits.items() if count)
+            logging.info(f"Отфильтровано {int(excluded.sum())} строк по спискам исключений ({rule_stats}).")
     
     # 2. Фильтрация по ролям из конфига отчета
-    roles_to_exclude = proc_settings.get('filter', {}).get('roles_to_exclude', [])
+    roles_to_exclude = report_config.roles_to_exclude
     if 'role' in df.columns and roles_to_exclude:
         initial_rows = len(df)
-        df = df[~df['role'].isin(roles_to_exclude)]
+        df = df[~df['role'].isin(list(roles_to_exclude))]
         if (initial_rows - len(df)) > 0:
             logging.info(f"Отфильтровано {initial_rows - len(df)} строк по ролям из конфига.")
             
@@ -141,62 +296,108 @@ def _filter_data(df, report_config):
 
 def _create_geography_df(df, report_config):
     """Создает DataFrame для вкладки 'география участников'."""
-    proc_settings = report_config['processing_settings']
-    column_map = proc_settings['column_map']
-    inverted_map = {v: k for k, v in column_map.items()}
-
-    # Создаем DataFrame, используя только те столбцы, что есть в карте
-    internal_names_present = [name for name in inverted_map.keys() if name in df.columns]
-    report_df = df[internal_names_present].copy()
-    
-    # Шаг 1: Переименовываем столбцы в их "настоящие" имена для вывода
-    report_df.rename(columns=inverted_map, inplace=True)
-
-    # Шаг 2: Применяем дополнительное, финальное переименование из конфига
-    if 'rename_map' in proc_settings:
-        report_df.rename(columns=proc_settings['rename_map'], inplace=True)
-        logging.info("Применено дополнительное переименование столбцов.")
-
-    # Шаг 3: Добавляем столбец присутствия
-    if 'entry_time' in df.columns:
-        not_attended_values = proc_settings.get('not_attended_values', [])
-        report_df['Присутствие на вебинаре'] = df['entry_time'].apply(
-            lambda x: 'нет' if pd.isna(x) or str(x).strip() in not_attended_values else 'да'
+    attendance_col = config_loader.ATTENDANCE_COLUMN
+
+    # Шаги 1-2: Финальные имена столбцов ("настоящее" имя из карты, затем rename_map) вычислены при загрузке конфига.
+    # Данные не переименовываются и не копируются, меняются только заголовки.
+    final_to_internal = {final: internal for internal, final in report_config.final_names.items() if internal in df.columns}
+
+    # Шаг 3: Столбец присутствия — по сводке сеансов участника (или векторно по времени входа)
+    columns = {name: df[internal_name] for name, internal_name in final_to_internal.items()}
+    if 'attended' in df.columns or 'entry_time' in df.columns:
+        attended = df['attended'] if 'attended' in df.columns else _attendance_mask(df['entry_time'], list(report_config.not_attended_values))
+        columns[attendance_col] = pd.Series(
+            pd.Categorical.from_codes((~attended).astype('int8'), categories=['да', 'нет']), index=df.index
         )
+    for internal_name, name in config_loader.SESSION_COLUMNS.items():
+        if internal_name in df.columns:
+            columns[name] = df[internal_name]
 
     # Шаг 4: Применяем порядок столбцов из конфига, если он задан, и отфильтровываем лишние
-    defined_order = proc_settings.get('geography_column_order')
+    defined_order = report_config.geography_order
     if defined_order:
-        # Отфильтровываем report_df, чтобы он содержал только столбцы из defined_order,
-        # которые фактически присутствуют в DataFrame, в указанном порядке.
-        final_column_order = [col for col in defined_order if col in report_df.columns]
-        report_df = report_df[final_column_order]
+        # Берем только столбцы из defined_order, которые фактически присутствуют, в указанном порядке.
+        final_column_order = [col for col in defined_order if col in columns]
         logging.info("Порядок столбцов для 'географии' применен из конфигурации и нежелательные столбцы отфильтрованы.")
     else:
+        final_column_order = list(columns)
         logging.warning("geography_column_order не определен в конфиге. Отчет 'география' может содержать непредсказуемый порядок столбцов.")
+    return pd.DataFrame({col: columns[col] for col in final_column_order}, copy=False)
 
-    # Сохраняем карты для последующего использования
-    report_df.attrs['column_map'] = column_map
-    report_df.attrs['inverted_map'] = inverted_map
 
-    return report_df
+def _attendance_mask(entry_time, not_attended_values):
+    """
+    Векторно определяет присутствие по времени входа.
+    :return: Булева Series: True — участник присутствовал.
+    """
+    not_attended = entry_time.isna().to_numpy(copy=True)
+    if not_attended_values:
+        try:
+            # Нестроковые значения (даты входа) дают NaN и не совпадают ни с одним значением
+            stripped = entry_time.str.strip()
+            not_attended |= stripped.isin(not_attended_values).to_numpy()
+        except AttributeError:
+            # Столбец целиком из дат/чисел: "не посетил" только пустые значения
+            pass
+    return pd.Series(~not_attended, index=entry_time.index)
+
+
+def _update_attendee_db(df, geography_df, report_config):
+    """
+    Добавляет участников мероприятия в локальную базу и считает новых и вернувшихся.
+    :return: Словарь {'new', 'returning'} или None, если база выключена или недоступна.
+    """
+    db_settings = report_config['processing_settings'].get('attendee_db') or {}
+    if not db_settings.get('enabled'):
+        return None
+    try:
+        with closing(attendee_db.connect(db_settings.get('path', 'attendees.sqlite3'))) as conn:
+            event_id = attendee_db.upsert_event(conn, df, geography_df[config_loader.ATTENDANCE_COLUMN] == 'да')
+            if event_id is None:
+                return None
+            return attendee_db.event_attendee_stats(conn, event_id)
+    except Exception as e:
+        logging.error(f"Не удалось обновить базу участников: {e}")
+        return None
 
 
-def _create_webinar_df(df, geography_df, soup, report_config):
+def _create_webinar_df(df, geography_df, page_data, report_config, attendee_stats=None):
     """Создает DataFrame для сводной вкладки 'вебинар'."""
+    attended_count = int((geography_df[config_loader.ATTENDANCE_COLUMN] == 'да').sum())
+    return _summary_df(df, len(geography_df), attended_count, sessions.average_watch_minutes(df),
+                       page_data, report_config, attendee_stats)
+
+
+def _summary_df(df, registered, attended_count, average_watch, page_data, report_config, attendee_stats=None):
+    """
+    Формирует сводную вкладку 'вебинар' по уже посчитанным показателям.
+    :param df: Данные участников (достаточно строк, где заполнены время, тема и дата мероприятия).
+    :param registered: Число зарегистрированных участников.
+    :param attended_count: Число присутствовавших.
+    :param average_watch: Среднее время просмотра в минутах или None.
+    """
     start_time = pd.to_datetime(df['start_time'].dropna().iloc[0]) if 'start_time' in df.columns and not df['start_time'].dropna().empty else None
     end_time = pd.to_datetime(df['end_time'].dropna().iloc[0]) if 'end_time' in df.columns and not df['end_time'].dropna().empty else None
     
     date_str = start_time.strftime('%d.%m.%y %H:%M по Мск') if start_time else "Нет данных"
     duration_str = _calculate_duration(start_time, end_time)
     topic = df['webinar_topic'].dropna().iloc[0] if 'webinar_topic' in df.columns and not df['webinar_topic'].dropna().empty else "Нет данных"
-    presenter = scraper.scrape_presenter(soup, report_config)
+    presenter = scraper.field_value(page_data, 'presenter')
     
-    registered = len(geography_df)
-    attended_count = len(geography_df[geography_df['Присутствие на вебинаре'] == 'да'])
     not_attended = registered - attended_count
     attendance_percentage = f"{round((attended_count / registered * 100), 1)}%" if registered > 0 else "0.0%"
-    new_emails = scraper.scrape_new_emails(soup, report_config)
+    new_emails = scraper.field_value(page_data, 'new_emails')
+    # Дополнительные поля страницы, описанные в конфиге с summary_label
+    extra_rows = [
+        [label, scraper.field_value(page_data, name), None, None]
+        for label, name in scraper.get_engine(report_config).summary_fields()
+    ]
+    if attendee_stats:
+        # Показатели, посчитанные по локальной базе участников
+        extra_rows += [
+            ["новые участники (по базе)", attendee_stats['new'], None, None],
+            ["повторные участники (по базе)", attendee_stats['returning'], None, None],
+        ]
 
     report_data = [
         ["дата проведения", date_str, None, None],
@@ -206,23 +407,15 @@ def _create_webinar_df(df, geography_df, soup, report_config):
         ["зарегистрировались на вебинар (C)", registered, None, None],
         ["приняли участие (A)", attended_count, attendance_percentage, "явка"],
         ["не посетили вебинар (B)", not_attended, None, None],
+        ["среднее время просмотра", f"{average_watch} мин" if average_watch is not None else "Нет данных", None, None],
         ["новые e-mail адреса в базу подписчиков", new_emails, None, None],
+        *extra_rows,
         ["регионы продвижения", "", None, None],
         ["организаторы и ответственные лица", "", None, None]
     ]
     return pd.DataFrame(report_data, columns=["Параметр", "Значение", "Посещаемость %", "Статус"])
 
 
-def _create_chat_df(chat_file_path):
-    """Создает DataFrame для вкладки 'чат'."""
-    try:
-        logging.info(f"Читаю файл чата: {chat_file_path}")
-        return pd.read_excel(chat_file_path, sheet_name='Сообщения чата')
-    except Exception as e:
-        logging.error(f"Не удалось прочитать файл чата '{chat_file_path}'. Ошибка: {e}")
-        return None
-
-
 def _get_webinar_date_str(df):
     """Извлекает и форматирует дату вебинара."""
     if 'event_date' in df.columns and not df['event_date'].dropna().empty:
@@ -1,29 +1,140 @@
+import os
+import time
+import random
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
-def download_file(session, url, file_path):
+from . import metrics
+
+# Сигнатуры файлов Excel: XLSX — zip-архив, XLS — OLE2-контейнер
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 256 * 1024
+
+def configure_session(session, pool_connections=4, pool_maxsize=8, rate_limiter=None):
+    """
+    Подключает к сессии пул соединений, чтобы запросы к одному хосту переиспользовали TCP/TLS.
+    :param session: Объект requests.Session.
+    :param rate_limiter: rate_limit.HostRateLimiter; если задан, каждый запрос сессии ждет своей очереди к хосту.
+    :return: Та же сессия.
+    """
+    if rate_limiter is not None:
+        adapter = _RateLimitedAdapter(rate_limiter, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+class _RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter, соблюдающий ограничение частоты запросов к хосту."""
+    def __init__(self, rate_limiter, **kwargs):
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        self.rate_limiter.acquire(request.url)
+        return super().send(request, **kwargs)
+
+def download_file(session, url, file_path, timeout=(10, 60), max_retries=5, backoff_base=1.0, backoff_max=30.0):
     """
     Скачивает один файл по URL, используя аутентифицированную сессию requests.
+    Файл пишется потоково во временный .part-файл и атомарно переименовывается после проверки.
+    При обрыве соединения загрузка повторяется с экспоненциальной задержкой и докачкой через Range.
     :param session: Объект requests.Session с cookies после авторизации.
     :param url: URL для скачивания файла.
     :param file_path: Локальный путь для сохранения файла.
+    :param timeout: Таймауты (подключение, чтение) в секундах.
+    :param max_retries: Максимальное число повторных попыток.
     :return: True, если скачивание успешно, иначе False.
     """
+    with metrics.span('download', file=os.path.basename(file_path)) as download_span:
+        ok = _download_with_retries(session, url, file_path, timeout, max_retries, backoff_base, backoff_max)
+        download_span['status'] = 'ok' if ok else 'error'
+        if ok:
+            download_span['bytes'] = os.path.getsize(file_path)
+        return ok
+
+def _download_with_retries(session, url, file_path, timeout, max_retries, backoff_base, backoff_max):
+    """Скачивает файл с повторами (см. download_file)."""
     logging.info(f"Скачиваю {url} -> {file_path}")
-    try:
-        resp = session.get(url)
-        resp.raise_for_status()
+    part_path = f"{file_path}.part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+    for attempt in range(max_retries + 1):
+        try:
+            _fetch_to_part(session, url, part_path, timeout)
+            break
+        except _RetryableError as e:
+            error = e
+        except requests.RequestException as e:
+            if isinstance(e, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)):
+                error = e
+            else:
+                logging.error(f"Ошибка при скачивании {url}: {e}")
+                _remove(part_path)
+                return False
 
-        content_type = resp.headers.get("Content-Type", "")
-        # Проверяем, что контент похож на Excel или бинарный файл
-        if "excel" in content_type or "vnd.ms-excel" in content_type or "application/octet-stream" in content_type:
-            with open(file_path, "wb") as f:
-                f.write(resp.content)
-            logging.info(f"Файл успешно сохранен: {file_path}")
-            return True
-        else:
-            logging.warning(f"Пропущено скачивание (неверный Content-Type): {url}. Content-Type: {content_type}")
+        if attempt == max_retries:
+            logging.error(f"Ошибка при скачивании {url}: {error}. Попытки исчерпаны.")
+            _remove(part_path)
             return False
-    except requests.RequestException as e:
-        logging.error(f"Ошибка при скачивании {url}: {e}")
+        # Экспоненциальная задержка с полным джиттером
+        delay = random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt))
+        logging.warning(f"Сбой при скачивании {url}: {error}. Повтор {attempt + 1}/{max_retries} через {delay:.1f} с.")
+        time.sleep(delay)
+
+    if not _is_excel_file(part_path):
+        logging.warning(f"Пропущено скачивание (файл не является Excel): {url}")
+        _remove(part_path)
+        return False
+
+    os.replace(part_path, file_path)
+    logging.info(f"Файл успешно сохранен: {file_path} ({os.path.getsize(file_path)} байт)")
+    return True
+
+class _RetryableError(Exception):
+    """Временная ошибка сервера, после которой имеет смысл повторить запрос."""
+
+def _fetch_to_part(session, url, part_path, timeout):
+    """Выполняет одну попытку скачивания, продолжая с уже полученного размера .part-файла."""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as resp:
+        if resp.status_code == 416:
+            # Сервер не может отдать запрошенный диапазон — начинаем заново
+            _remove(part_path)
+            raise _RetryableError("HTTP 416 при докачке")
+        if resp.status_code in RETRY_STATUS_CODES:
+            raise _RetryableError(f"HTTP {resp.status_code}")
+        resp.raise_for_status()
+
+        # 206 — сервер поддержал докачку, 200 — отдал файл целиком
+        mode = "ab" if offset and resp.status_code == 206 else "wb"
+        if offset and mode == "wb":
+            logging.info("Сервер не поддерживает докачку, скачиваю файл заново.")
+        with open(part_path, mode) as f:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+
+def _is_excel_file(file_path):
+    """Проверяет сигнатуру файла (XLSX или XLS)."""
+    try:
+        with open(file_path, "rb") as f:
+            header = f.read(len(XLS_MAGIC))
+    except OSError:
         return False
+    return header.startswith(XLSX_MAGIC) or header.startswith(XLS_MAGIC)
+
+def _remove(path):
+    """Удаляет файл, если он существует."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
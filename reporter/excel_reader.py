@@ -0,0 +1,114 @@
+import time
+import logging
+from zipfile import BadZipFile
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+def read_sheet_columns(file_path, sheet_name, column_map, dtypes=None):
+    """
+    Читает из листа только столбцы, перечисленные в column_map, и сразу переименовывает их во внутренние имена.
+    XLSX читается потоково (openpyxl read-only), поэтому память не зависит от числа неиспользуемых столбцов.
+    Старые XLS читаются через pandas с проекцией столбцов.
+    :param file_path: Путь к файлу Excel.
+    :param sheet_name: Имя листа.
+    :param column_map: Карта "имя столбца в файле -> внутреннее имя".
+    :param dtypes: Необязательные типы столбцов по внутренним именам (например, 'category').
+    :return: DataFrame с внутренними именами столбцов.
+    """
+    started = time.perf_counter()
+    try:
+        df = _read_xlsx_streaming(file_path, sheet_name, column_map, dtypes or {})
+    except (InvalidFileException, BadZipFile, KeyError) as e:
+        if isinstance(e, KeyError):
+            raise ValueError(f"Лист '{sheet_name}' не найден") from e
+        logging.info(f"Файл {file_path} не является XLSX, читаю через pandas.")
+        df = pd.read_excel(file_path, sheet_name=sheet_name, usecols=lambda c: c in column_map)
+        df = df.rename(columns=column_map)
+        if dtypes:
+            df = df.astype({name: dtype for name, dtype in dtypes.items() if name in df.columns})
+
+    elapsed = time.perf_counter() - started
+    rows_per_sec = len(df) / elapsed if elapsed > 0 else 0
+    logging.info(f"Прочитано {len(df)} строк, {len(df.columns)} столбцов из '{sheet_name}' "
+                 f"за {elapsed:.2f} с ({rows_per_sec:,.0f} строк/с).")
+    return df
+
+def iter_sheet_chunks(file_path, sheet_name, column_map, dtypes=None, chunk_rows=50000):
+    """
+    Потоково читает лист блоками по chunk_rows строк: память ограничена размером блока, а не файла.
+    :return: Генератор DataFrame с внутренними именами столбцов (как у read_sheet_columns).
+    """
+    dtypes = dtypes or {}
+    try:
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile):
+        logging.info(f"Файл {file_path} не является XLSX, читаю через pandas.")
+        df = pd.read_excel(file_path, sheet_name=sheet_name, usecols=lambda c: c in column_map).rename(columns=column_map)
+        df = df.astype({name: dtype for name, dtype in dtypes.items() if name in df.columns})
+        for start in range(0, max(len(df), 1), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+        return
+
+    try:
+        for columns in _iter_xlsx_columns(wb, sheet_name, column_map, chunk_rows):
+            yield _frame(columns, dtypes)
+    except KeyError as e:
+        raise ValueError(f"Лист '{sheet_name}' не найден") from e
+    finally:
+        wb.close()
+
+def _read_xlsx_streaming(file_path, sheet_name, column_map, dtypes):
+    """Потоково читает нужные столбцы XLSX-листа без построения полного DOM."""
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        columns = next(_iter_xlsx_columns(wb, sheet_name, column_map, None))
+    finally:
+        wb.close()
+    return _frame(columns, dtypes)
+
+def _iter_xlsx_columns(wb, sheet_name, column_map, chunk_rows):
+    """
+    Читает нужные столбцы листа и отдает их блоками: словари {внутреннее имя: список значений}.
+    Строки, в которых все нужные ячейки пусты, пропускаются, как в pd.read_excel.
+    chunk_rows=None — весь лист одним блоком. Всегда отдает хотя бы один (возможно, пустой) блок.
+    """
+    ws = wb[sheet_name]
+    # Выгрузки иногда содержат неверный размер листа, из-за которого read-only режим обрезает строки
+    ws.reset_dimensions()
+    rows = ws.iter_rows(values_only=True)
+
+    header = next(rows, None) or ()
+    positions = {}
+    for idx, name in enumerate(header):
+        key = name.strip() if isinstance(name, str) else name
+        if key in column_map and column_map[key] not in positions.values():
+            positions[idx] = column_map[key]
+
+    missing = [name for name, internal in column_map.items() if internal not in positions.values()]
+    if missing:
+        logging.warning(f"В листе '{sheet_name}' отсутствуют столбцы: {missing}")
+
+    indices = list(positions)
+    while True:
+        columns = {internal: [] for internal in positions.values()}
+        appends = [columns[positions[idx]].append for idx in indices]
+        count = 0
+        for row in rows:
+            row_len = len(row)
+            values = [row[idx] if idx < row_len else None for idx in indices]
+            # Выгрузки бывают с отформатированными, но пустыми строками в конце листа
+            if all(value is None for value in values):
+                continue
+            for append, value in zip(appends, values):
+                append(value)
+            count += 1
+            if count == chunk_rows:
+                break
+        yield columns
+        if chunk_rows is None or count < chunk_rows:
+            return
+
+def _frame(columns, dtypes):
+    """Строит DataFrame из списков значений, сразу применяя типы — без промежуточного object-фрейма."""
+    return pd.DataFrame({name: pd.Series(values, dtype=dtypes.get(name)) for name, values in columns.items()})
@@ -0,0 +1,156 @@
+import os
+import re
+import csv
+import pickle
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from . import config
+
+CACHE_VERSION = 2
+
+class ExclusionIndex:
+    """
+    Индекс правил исключения адресов: точные адреса, целые домены и регулярные выражения.
+    Строится один раз из списков и применяется к столбцу email векторно.
+    """
+    def __init__(self, addresses=(), domains=(), patterns=()):
+        self.addresses = set(addresses)
+        self.domains = set(domains)
+        self.patterns = [re.compile(p, re.IGNORECASE) for p in dict.fromkeys(patterns)]
+
+    def __bool__(self):
+        return bool(self.addresses or self.domains or self.patterns)
+
+    def __len__(self):
+        return len(self.addresses) + len(self.domains) + len(self.patterns)
+
+    def add_rule(self, value):
+        """
+        Добавляет одно правило по его записи в списке:
+        're:<шаблон>' — регулярное выражение, '@domain' / '*@domain' — весь домен, иначе — точный адрес
+        (как и в прежнем FILTER_LIST, где каждая запись была адресом).
+        """
+        value = value.strip()
+        if not value or value.startswith('#'):
+            return
+        if value.startswith('re:'):
+            self.patterns.append(re.compile(value[3:].strip(), re.IGNORECASE))
+        elif value.startswith(('@', '*@')):
+            self.domains.add(value.lstrip('*@').lower())
+        else:
+            self.addresses.add(value.lower())
+
+    def match(self, emails):
+        """
+        Находит адреса, попадающие под правила исключения.
+        Нормализуются и проверяются только уникальные значения, результат раскладывается обратно по строкам.
+        :param emails: Series с адресами.
+        :return: Кортеж (булева маска исключаемых строк, словарь с числом совпадений по правилам).
+        """
+        codes, uniques = pd.factorize(emails)
+        normalized = pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+        unique_mask = pd.Series(False, index=normalized.index)
+        unique_hits = {}
+
+        if self.addresses:
+            unique_hits['точные адреса'] = normalized.isin(self.addresses)
+        if self.domains:
+            unique_hits['домены'] = normalized.str.rsplit('@', n=1).str[-1].isin(self.domains)
+        for pattern in self.patterns:
+            unique_hits[f"re:{pattern.pattern}"] = normalized.str.contains(pattern, regex=True)
+
+        for rule_mask in unique_hits.values():
+            unique_mask |= rule_mask
+
+        # Код -1 у пустых значений: последний элемент False, поэтому они не исключаются
+        row_mask = pd.Series(np.append(unique_mask.to_numpy(), False)[codes], index=emails.index)
+        counts = pd.Series(codes[codes >= 0]).value_counts()
+        hits = {}
+        for rule, rule_mask in unique_hits.items():
+            matched_codes = rule_mask[rule_mask].index
+            hits[rule] = int(counts.reindex(matched_codes, fill_value=0).sum())
+        return row_mask, hits
+
+def load_list_file(index, path):
+    """
+    Загружает правила из текстового файла (одно правило на строку) или CSV
+    (столбец 'email', если он есть, иначе первый столбец).
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.csv'):
+            rows = list(csv.reader(f))
+            if not rows:
+                return
+            header = [h.strip().lower() for h in rows[0]]
+            column = header.index('email') if 'email' in header else 0
+            if 'email' in header:
+                rows = rows[1:]
+            for row in rows:
+                if len(row) > column:
+                    index.add_rule(row[column])
+        else:
+            for line in f:
+                index.add_rule(line)
+
+def get_exclusion_index(filter_settings):
+    """
+    Возвращает индекс исключений из глобального FILTER_LIST (.env) и файлов filter.exclusion_lists.
+    Индекс кэшируется на диске и пересобирается только при изменении файлов.
+    :param filter_settings: Раздел processing_settings.filter из конфига.
+    :return: Объект ExclusionIndex.
+    """
+    list_paths = filter_settings.get('exclusion_lists') or []
+    cache_dir = filter_settings.get('exclusion_cache_dir')
+    cache_path = None
+
+    if cache_dir and list_paths:
+        cache_path = os.path.join(cache_dir, f"exclusions_{sources_fingerprint(list_paths)}.pickle")
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'rb') as f:
+                    version, index = pickle.load(f)
+                if version == CACHE_VERSION:
+                    logging.info(f"Индекс исключений загружен из кэша: {len(index)} правил.")
+                    return index
+            except Exception as e:
+                logging.warning(f"Не удалось прочитать кэш исключений {cache_path}: {e}")
+
+    index = ExclusionIndex()
+    for rule in config.FILTER_LIST:
+        index.add_rule(rule)
+    for path in list_paths:
+        try:
+            load_list_file(index, path)
+        except OSError as e:
+            logging.error(f"Не удалось прочитать список исключений {path}: {e}")
+            # Без полного списка индекс не кэшируется
+            cache_path = None
+
+    logging.info(f"Индекс исключений построен: {len(index.addresses)} адресов, "
+                 f"{len(index.domains)} доменов, {len(index.patterns)} регулярных выражений.")
+
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((CACHE_VERSION, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить кэш исключений: {e}")
+    return index
+
+def sources_fingerprint(list_paths):
+    """Хэш источников правил: пути, размеры и время изменения файлов, а также FILTER_LIST."""
+    digest = hashlib.sha256()
+    digest.update(",".join(config.FILTER_LIST).encode('utf-8'))
+    for path in list_paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f"|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+        except OSError:
+            digest.update(f"|{path}|missing".encode('utf-8'))
+    return digest.hexdigest()[:16]
@@ -1,5 +1,12 @@
 import os
+import re
 import logging
+from urllib.parse import urlparse
+
+from . import metrics
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+HTML_EXTENSIONS = ('.html', '.htm')
 
 def cleanup_files(files):
     """
@@ -7,10 +14,66 @@ def cleanup_files(files):
     :param files: Список путей к файлам для удаления.
     """
     logging.info("Удаляю временные скачанные файлы...")
-    for file_path in files:
-        try:
-            if file_path and os.path.exists(file_path):
-                os.remove(file_path)
-                logging.info(f"Удален файл: {file_path}")
-        except Exception as e:
-            logging.warning(f"Не удалось удалить файл {file_path}: {e}")
+    with metrics.span('cleanup') as cleanup_span:
+        cleanup_span['files'] = 0
+        for file_path in files:
+            try:
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+                    cleanup_span['files'] += 1
+                    logging.info(f"Удален файл: {file_path}")
+            except Exception as e:
+                logging.warning(f"Не удалось удалить файл {file_path}: {e}")
+
+
+def event_dir_name(page_url):
+    """
+    Формирует безопасное имя директории для мероприятия по его URL.
+    :param page_url: URL страницы мероприятия.
+    :return: Имя директории из пути (и фрагмента) URL.
+    """
+    parsed = urlparse(page_url)
+    name = re.sub(r'[^\w.-]+', '_', f"{parsed.path}/{parsed.fragment}").strip('._')
+    return name[-100:] or "event"
+
+
+def find_saved_exports(paths):
+    """
+    Собирает сохраненные выгрузки для повторной обработки без браузера.
+    Директория — одно мероприятие: statistic_*.xls(x), необязательные chat_*.xls(x) и *.html страницы
+    (имена как у скачанных файлов). Отдельные файлы — одно мероприятие: первый Excel — статистика,
+    второй — чат, .html — сохраненная страница.
+    :param paths: Список путей к директориям и/или файлам.
+    :return: Список словарей с ключами name, stats, chat, page_html (отсутствующие — None).
+    """
+    events = []
+    loose = {'name': None, 'stats': None, 'chat': None, 'page_html': None}
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            events.append({
+                'name': os.path.basename(os.path.normpath(path)),
+                'stats': _first_match(path, names, 'statistic_', EXCEL_EXTENSIONS),
+                'chat': _first_match(path, names, 'chat_', EXCEL_EXTENSIONS),
+                'page_html': _first_match(path, names, '', HTML_EXTENSIONS),
+            })
+        elif path.lower().endswith(HTML_EXTENSIONS):
+            loose['page_html'] = path
+        elif loose['stats'] is None:
+            loose['stats'] = path
+            loose['name'] = os.path.splitext(os.path.basename(path))[0]
+        else:
+            loose['chat'] = path
+    if loose['stats'] or loose['page_html']:
+        # Без статистики мероприятие называется по сохраненной странице
+        loose['name'] = loose['name'] or os.path.splitext(os.path.basename(loose['page_html']))[0]
+        events.append(loose)
+    return events
+
+
+def _first_match(directory, names, prefix, extensions):
+    """Возвращает путь к первому файлу директории с заданным префиксом и расширением или None."""
+    for name in names:
+        if name.startswith(prefix) and name.lower().endswith(extensions):
+            return os.path.join(directory, name)
+    return None
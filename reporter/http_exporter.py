@@ -0,0 +1,73 @@
+import time
+import logging
+import requests
+
+from . import metrics
+
+def fetch_page_html(session, page_url, timeout=30):
+    """
+    Загружает HTML страницы мероприятия без браузера.
+    :param session: Авторизованная requests.Session.
+    :param page_url: URL страницы мероприятия.
+    :return: Текст страницы или None в случае ошибки.
+    """
+    try:
+        resp = session.get(page_url, timeout=timeout)
+        resp.raise_for_status()
+        return resp.text
+    except requests.RequestException as e:
+        logging.error(f"Не удалось загрузить страницу мероприятия {page_url}: {e}")
+        return None
+
+def request_export(session, page_url, export_settings, export_name):
+    """
+    Запрашивает подготовку файла выгрузки и опрашивает сервер, пока ссылка на файл не будет готова.
+    Повторяет вызов, который на странице выполняет кнопка с data-bind "'xls', '<kind>'".
+    :param session: Авторизованная requests.Session.
+    :param page_url: URL страницы мероприятия.
+    :param export_settings: Раздел source_settings.http_export из конфига.
+    :param export_name: Имя выгрузки из export_settings['exports'] (например, 'stats' или 'chat').
+    :return: URL подготовленного файла или None.
+    """
+    export_params = export_settings['exports'][export_name]
+    request_url = export_settings['request_url_template'].format(
+        page_url=page_url.rstrip('/'), format=export_params['format'], kind=export_params['kind']
+    )
+    method = export_settings.get('request_method', 'GET')
+    poll_interval = export_settings.get('poll_interval_sec', 2)
+    deadline = time.monotonic() + export_settings.get('timeout_sec', 120)
+
+    logging.info(f"Запрашиваю выгрузку '{export_name}': {request_url}")
+    with metrics.span('export_wait', export=export_name) as export_span:
+        file_url = _poll_export(session, request_url, method, export_settings.get('file_url_field', 'url'),
+                                export_name, poll_interval, deadline)
+        export_span['status'] = 'ok' if file_url else 'error'
+        return file_url
+
+def _poll_export(session, request_url, method, file_url_field, export_name, poll_interval, deadline):
+    """Опрашивает эндпоинт выгрузки до появления ссылки на файл или истечения времени."""
+    while True:
+        try:
+            resp = session.request(method, request_url, timeout=30)
+            resp.raise_for_status()
+            file_url = get_field(resp.json(), file_url_field)
+            if file_url:
+                logging.info(f"Файл '{export_name}' подготовлен: {file_url}")
+                return file_url
+        except requests.RequestException as e:
+            logging.warning(f"Ошибка запроса выгрузки '{export_name}': {e}")
+        except ValueError:
+            logging.warning(f"Ответ на запрос выгрузки '{export_name}' не является JSON.")
+
+        if time.monotonic() >= deadline:
+            logging.error(f"Файл '{export_name}' не был подготовлен за отведенное время.")
+            return None
+        time.sleep(poll_interval)
+
+def get_field(data, dotted_path):
+    """Извлекает значение по пути вида 'data.url' из JSON-ответа."""
+    for key in dotted_path.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import logging
+import itertools
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_lock = threading.Lock()
+_local = threading.local()
+_spans = []
+_run_started = time.time()
+_trace_numbers = itertools.count(1)
+
+def _rss_bytes():
+    """
+    Возвращает пиковый RSS процесса (resource); в Windows — текущий RSS через psutil, если он установлен.
+    Разница значений до и после этапа показывает, насколько этап поднял пик памяти.
+    """
+    if resource is not None:
+        # ru_maxrss в Linux — в килобайтах, в macOS — в байтах
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == 'darwin' else maxrss * 1024
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+def reset():
+    """Начинает новый прогон: очищает накопленные интервалы."""
+    global _run_started
+    with _lock:
+        _spans.clear()
+        _run_started = time.time()
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Замеряет этап: время (wall/CPU), прирост пикового RSS и объем данных.
+    Объем задается через возвращаемый словарь: s['rows'] = ..., s['bytes'] = ...
+    :param name: Имя этапа (например, 'login', 'download', 'xlsx_parse').
+    :param attrs: Дополнительные атрибуты (url, file, sheet...).
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    record = {'name': name, 'parent': stack[-1] if stack else None, **attrs}
+    rss_before = _rss_bytes()
+    wall, cpu = time.perf_counter(), time.process_time()
+    record['start'] = time.time()
+    stack.append(name)
+    try:
+        yield record
+        record.setdefault('status', 'ok')
+    except BaseException:
+        record['status'] = 'error'
+        raise
+    finally:
+        stack.pop()
+        record['wall_sec'] = round(time.perf_counter() - wall, 6)
+        record['cpu_sec'] = round(time.process_time() - cpu, 6)
+        rss_after = _rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            record['peak_rss_delta_bytes'] = rss_after - rss_before
+        add_span(record)
+
+def add_span(record):
+    """Добавляет готовую запись об этапе (например, замеренную в дочернем процессе)."""
+    record.setdefault('parent', None)
+    record.setdefault('status', 'ok')
+    with _lock:
+        _spans.append(record)
+    logging.debug(f"[metrics] {record['name']}: {record.get('wall_sec', 0):.3f} с")
+
+def spans():
+    """Возвращает копию списка замеренных этапов."""
+    with _lock:
+        return list(_spans)
+
+def drain():
+    """
+    Забирает замеренные этапы и начинает новый прогон одним шагом: этапы, записанные другими потоками
+    между выгрузкой и очисткой, не теряются.
+    :return: Пара (время начала прогона, список этапов).
+    """
+    global _run_started
+    with _lock:
+        started, records = _run_started, list(_spans)
+        _spans.clear()
+        _run_started = time.time()
+    return started, records
+
+def export_json(path, records=None, run_started=None):
+    """Сохраняет трассу прогона в JSON. По умолчанию — текущие этапы; records и run_started — результат drain()."""
+    if records is None:
+        records, run_started = spans(), _run_started
+    data = {'run_started': run_started, 'run_finished': time.time(), 'spans': records}
+    _atomic_write(path, json.dumps(data, ensure_ascii=False, indent=2, default=str))
+    logging.info(f"Трасса выполнения сохранена: {path}")
+
+def export_prometheus(path, prefix="reporter", records=None):
+    """
+    Сохраняет метрики этапов в формате textfile для node_exporter.
+    Значения этапов с одинаковым именем суммируются.
+    :param records: Этапы (результат drain()); по умолчанию — текущие.
+    """
+    totals = {}
+    for record in spans() if records is None else records:
+        total = totals.setdefault(record['name'], {'count': 0, 'wall_sec': 0.0, 'cpu_sec': 0.0, 'rows': 0, 'bytes': 0, 'errors': 0})
+        total['count'] += 1
+        total['wall_sec'] += record.get('wall_sec', 0)
+        total['cpu_sec'] += record.get('cpu_sec', 0)
+        total['rows'] += record.get('rows') or 0
+        total['bytes'] += record.get('bytes') or 0
+        total['errors'] += record.get('status') == 'error'
+
+    metrics = [
+        ('stage_duration_seconds', 'wall_sec', 'Суммарное время этапа за последний прогон'),
+        ('stage_cpu_seconds', 'cpu_sec', 'Суммарное процессорное время этапа за последний прогон'),
+        ('stage_runs', 'count', 'Число выполнений этапа за последний прогон'),
+        ('stage_errors', 'errors', 'Число ошибок этапа за последний прогон'),
+        ('stage_rows', 'rows', 'Число обработанных строк'),
+        ('stage_bytes', 'bytes', 'Число обработанных байт'),
+    ]
+    lines = []
+    for metric, key, help_text in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {help_text}")
+        lines.append(f"# TYPE {prefix}_{metric} gauge")
+        for name, total in sorted(totals.items()):
+            lines.append(f'{prefix}_{metric}{{stage="{name}"}} {total[key]}')
+    lines.append(f"# HELP {prefix}_last_run_timestamp_seconds Время завершения последнего прогона")
+    lines.append(f"# TYPE {prefix}_last_run_timestamp_seconds gauge")
+    lines.append(f"{prefix}_last_run_timestamp_seconds {time.time():.0f}")
+    _atomic_write(path, "\n".join(lines) + "\n")
+    logging.info(f"Метрики Prometheus сохранены: {path}")
+
+def export(metrics_settings, reset=False):
+    """
+    Экспортирует трассу и метрики согласно разделу metrics конфига.
+    :param reset: Забрать этапы и начать новый прогон (drain) — для сервисов, которые сбрасывают трассу периодически.
+    """
+    run_started, records = drain() if reset else (_run_started, spans())
+    if not metrics_settings or not metrics_settings.get('enabled', True):
+        return
+    try:
+        trace_dir = metrics_settings.get('trace_dir')
+        if trace_dir:
+            os.makedirs(trace_dir, exist_ok=True)
+            # Номер в имени: сервис может сбросить несколько трасс за секунду
+            stamp = time.strftime('%Y%m%d_%H%M%S', time.localtime(run_started))
+            export_json(os.path.join(trace_dir, f"trace_{stamp}_{next(_trace_numbers)}.json"), records, run_started)
+        if metrics_settings.get('prometheus_textfile'):
+            export_prometheus(metrics_settings['prometheus_textfile'], records=records)
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить метрики: {e}")
+
+def _atomic_write(path, text):
+    """Записывает файл целиком через временный файл, чтобы читатели не видели его частично."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Уникальное имя: потоки сервиса и планировщика могут выгружать трассу одновременно
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,77 @@
+import re
+import json
+import time
+import base64
+import logging
+from urllib.parse import urljoin
+
+from selenium.common.exceptions import WebDriverException
+
+from .http_exporter import get_field
+
+# Ссылка на подготовленный файл приходит странице в JSON-ответе эндпоинта выгрузки, а уведомление
+# (Snackbar) лишь показывает ее после анимации. Журнал производительности Chrome (DevTools, домен Network)
+# сообщает об ответе сразу, поэтому ссылку можно взять из тела ответа, не дожидаясь интерфейса.
+
+def enable(options):
+    """
+    Включает журнал сетевых событий DevTools в настройках Chrome.
+    :param options: webdriver.ChromeOptions до запуска драйвера.
+    """
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+def discard(driver):
+    """Очищает накопленный журнал, чтобы учитывались только ответы после следующего клика."""
+    try:
+        driver.get_log('performance')
+    except WebDriverException as e:
+        logging.warning(f"Журнал сетевых событий недоступен: {e}")
+
+def wait_for_file_url(driver, capture_settings):
+    """
+    Ждет ответ эндпоинта выгрузки в журнале сетевых событий и извлекает из него ссылку на файл.
+    :param driver: Драйвер, запущенный с enable().
+    :param capture_settings: Раздел source_settings.network_capture из конфига.
+    :return: URL подготовленного файла или None, если ответ не найден за timeout_sec.
+    """
+    pattern = re.compile(capture_settings['response_url_pattern'])
+    file_url_field = capture_settings.get('file_url_field', 'url')
+    poll_interval = capture_settings.get('poll_interval_sec', 0.1)
+    deadline = time.monotonic() + capture_settings.get('timeout_sec', 20)
+    pending = {}  # requestId -> URL ответа, тело которого еще загружается
+    try:
+        while True:
+            for entry in driver.get_log('performance'):
+                message = json.loads(entry['message']).get('message') or {}
+                method, params = message.get('method'), message.get('params') or {}
+                if method == 'Network.responseReceived':
+                    response_url = params.get('response', {}).get('url', '')
+                    if pattern.search(response_url):
+                        pending[params.get('requestId')] = response_url
+                elif method == 'Network.loadingFinished' and params.get('requestId') in pending:
+                    response_url = pending.pop(params['requestId'])
+                    file_url = _read_file_url(driver, params['requestId'], file_url_field)
+                    if file_url:
+                        file_url = urljoin(response_url, file_url)
+                        logging.info(f"Ссылка на файл получена из сетевого ответа: {file_url}")
+                        return file_url
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+    except WebDriverException as e:
+        logging.warning(f"Не удалось прочитать журнал сетевых событий: {e}")
+        return None
+
+def _read_file_url(driver, request_id, file_url_field):
+    """Читает тело ответа через DevTools и извлекает ссылку; ответ без ссылки (файл еще готовится) — None."""
+    try:
+        body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        text = body.get('body') or ''
+        if body.get('base64Encoded'):
+            text = base64.b64decode(text).decode('utf-8')
+        file_url = get_field(json.loads(text), file_url_field)
+    except (WebDriverException, ValueError) as e:
+        logging.debug(f"Тело ответа {request_id} не содержит ссылку: {e}")
+        return None
+    return file_url if isinstance(file_url, str) and file_url else None
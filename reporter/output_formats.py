@@ -0,0 +1,33 @@
+import os
+
+# Форматы выходных файлов: имя -> расширения, по которым формат выбирается, и поддержка нескольких листов.
+# Модуль без зависимостей: формат проверяется при загрузке конфига, а функции записи (report_writer,
+# openpyxl) импортируются только при записи отчетов.
+FORMATS = {}
+
+def register_format(name, extensions=(), multi_sheet=False):
+    """
+    Регистрирует имя формата для проверки конфига. Функцию записи формата регистрирует report_writer.register_writer.
+    :param name: Имя формата.
+    :param extensions: Расширения файлов, по которым формат выбирается, если он не указан явно.
+    :param multi_sheet: Может ли файл содержать несколько листов.
+    """
+    FORMATS[name] = {'extensions': tuple(ext.lower() for ext in extensions), 'multi_sheet': multi_sheet}
+
+def resolve_format(filename_template, output_format=None):
+    """
+    Определяет формат выходного файла: явно указанный или по расширению имени; по умолчанию — xlsx.
+    :return: Пара (имя формата, поддерживает ли он несколько листов).
+    :raises ValueError: Если формат не зарегистрирован.
+    """
+    if output_format is None:
+        extension = os.path.splitext(filename_template)[1].lower()
+        output_format = next((name for name, entry in FORMATS.items() if extension in entry['extensions']), 'xlsx')
+    if output_format not in FORMATS:
+        raise ValueError(f"неизвестный формат '{output_format}', допустимы {list(FORMATS)}")
+    return output_format, FORMATS[output_format]['multi_sheet']
+
+register_format('xlsx', ('.xlsx',), multi_sheet=True)
+register_format('csv', ('.csv',))
+register_format('jsonl', ('.jsonl', '.ndjson'))
+register_format('parquet', ('.parquet',))
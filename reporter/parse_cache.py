@@ -0,0 +1,108 @@
+import os
+import json
+import pickle
+import hashlib
+import logging
+
+from . import exclusion_filter
+
+CACHE_VERSION = 4
+# Разделы processing_settings, от которых зависят прочитанные данные каждого вида выгрузки.
+# Остальные настройки (rename_map, порядок столбцов, output_files) применяются после кэша.
+KEY_SETTINGS = {
+    'stats': ('sheet_name', 'column_map', 'dtypes', 'filter', 'sessions', 'not_attended_values'),
+    'chat': ('chat',),
+    'chat_raw': ('chat',),
+}
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Считает SHA-256 содержимого файла, читая его блоками."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_key(kind, file_path, proc_settings):
+    """
+    Формирует ключ кэша по содержимому выгрузки и влияющим на разбор настройкам.
+    Статистика и чат кэшируются раздельно, чтобы их можно было читать параллельно.
+    :param kind: Вид выгрузки — ключ KEY_SETTINGS ('stats', 'chat' или 'chat_raw' — чат вместе с исходными сообщениями).
+    :param proc_settings: Раздел processing_settings.
+    :return: Шестнадцатеричная строка SHA-256.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}:{kind}".encode('utf-8'))
+    digest.update(file_sha256(file_path).encode('utf-8'))
+    relevant = {k: proc_settings.get(k) for k in KEY_SETTINGS[kind]}
+    digest.update(json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str).encode('utf-8'))
+    if 'filter' not in relevant:
+        return digest.hexdigest()
+    # Списки исключений хранятся вне конфига, поэтому учитывается их отпечаток
+    filter_settings = proc_settings.get('filter') or {}
+    digest.update(exclusion_filter.sources_fingerprint(filter_settings.get('exclusion_lists') or []).encode('utf-8'))
+    return digest.hexdigest()
+
+def load(cache_dir, key):
+    """
+    Загружает сохраненный DataFrame по ключу и отмечает запись как недавно использованную.
+    :return: DataFrame или None.
+    """
+    path = _entry_path(cache_dir, key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            frame = pickle.load(f)
+        os.utime(path)
+        logging.info(f"Данные загружены из кэша разбора ({key[:12]}), чтение XLSX пропущено.")
+        return frame
+    except Exception as e:
+        logging.warning(f"Не удалось прочитать запись кэша {path}: {e}")
+        _remove(path)
+        return None
+
+def store(cache_dir, key, frame, max_size_mb):
+    """
+    Сохраняет DataFrame в кэш и вытесняет самые давно использованные записи сверх лимита размера.
+    :param frame: Сериализуемый DataFrame.
+    :param max_size_mb: Максимальный суммарный размер кэша в мегабайтах.
+    """
+    path = _entry_path(cache_dir, key)
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logging.warning(f"Не удалось сохранить данные в кэш разбора: {e}")
+        _remove(tmp_path)
+        return
+    _evict(cache_dir, max_size_mb * 1024 * 1024)
+
+def _evict(cache_dir, max_bytes):
+    """Удаляет записи по LRU (время последнего использования — mtime), пока кэш не уложится в лимит."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith('.pickle'):
+            stat = os.stat(os.path.join(cache_dir, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(os.path.join(cache_dir, name))
+        total -= size
+        logging.info(f"Из кэша разбора вытеснена запись {name}.")
+
+def _entry_path(cache_dir, key):
+    """Путь к файлу записи кэша."""
+    return os.path.join(cache_dir, f"{key}.pickle")
+
+def _remove(path):
+    """Удаляет файл, если он существует."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
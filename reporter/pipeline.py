@@ -0,0 +1,209 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from . import chunked, data_processor, http_exporter, metrics, report_writer
+from .file_handler import cleanup_files
+
+# Этапы одного мероприятия перекрываются так:
+#   запрос выгрузок статистики и чата (+ загрузка страницы) — одновременно;
+#   скачивание статистики -> разбор статистики -> листы без чата -> запись файлов без чата
+#   скачивание чата       -> разбор чата ---------------------------> запись файлов с чатом
+# Разбор и запись крупных книг выполняются в общем пуле процессов, сеть и подготовка листов — в потоках. Несколько мероприятий
+# обрабатываются одновременно (max_concurrent_events), а браузер в каждый момент занят одной страницей.
+
+
+def run(browser_manager, events, report_config):
+    """
+    Обрабатывает мероприятия асинхронным конвейером.
+    :param browser_manager: Авторизованный BrowserManager.
+    :param events: Список пар (URL страницы мероприятия, директория для отчетов).
+    :return: Список словарей с ключами url, status, report_dir, duration_sec, error (в порядке events).
+    """
+    settings = report_config.get('pipeline') or {}
+    with ProcessPoolExecutor(max_workers=settings.get('parse_workers') or 2) as parse_pool:
+        # Процессы создаются до запуска потоков конвейера: fork при работающих потоках
+        # может унаследовать захваченные ими блокировки (например, logging)
+        parse_pool.submit(os.getpid).result()
+        return asyncio.run(_run(browser_manager, events, report_config, parse_pool, settings))
+
+
+async def _run(browser_manager, events, report_config, parse_pool, settings):
+    semaphore = asyncio.Semaphore(max(1, settings.get('max_concurrent_events') or 2))
+    driver_lock = asyncio.Lock()
+    context = {
+        'browser': browser_manager,
+        'config': report_config,
+        'parse_pool': parse_pool,
+        'driver_lock': driver_lock,
+    }
+
+    async def limited(index, page_url, report_dir):
+        async with semaphore:
+            return await _run_event(context, index, page_url, report_dir)
+
+    return await asyncio.gather(*(limited(index, url, report_dir) for index, (url, report_dir) in enumerate(events, start=1)))
+
+
+async def _run_event(context, index, page_url, report_dir):
+    """Обрабатывает одно мероприятие; ошибки не прерывают остальные мероприятия пакета."""
+    logging.info(f"--> pipeline: Processing event {index}: {page_url}")
+    started_wall, started = time.time(), time.perf_counter()
+    downloaded = []
+    try:
+        ok, error = await _process_event(context, index, page_url, report_dir, downloaded)
+    except Exception as e:
+        logging.error(f"Ошибка при обработке {page_url}: {e}", exc_info=True)
+        ok, error = False, str(e)
+    finally:
+        # Временные файлы удаляем сразу, чтобы они не копились в пакетном режиме
+        await asyncio.to_thread(cleanup_files, downloaded)
+    duration = time.perf_counter() - started
+    # span() опирается на стек текущего потока, а корутины мероприятий чередуются в одном потоке,
+    # поэтому интервал мероприятия записывается целиком по завершении
+    metrics.add_span({'name': 'event', 'url': page_url, 'start': started_wall,
+                      'wall_sec': round(duration, 6), 'status': 'ok' if ok else 'error'})
+    return {
+        "url": page_url,
+        "status": "ok" if ok else "failed",
+        "report_dir": report_dir,
+        "duration_sec": round(duration, 1),
+        "error": error or "",
+    }
+
+
+async def _process_event(context, index, page_url, report_dir, downloaded):
+    """Скачивание, разбор и запись отчетов одного мероприятия с перекрытием этапов."""
+    browser_manager, report_config = context['browser'], context['config']
+    exports = await _request_exports(context, page_url)
+    if not exports or not exports['stats']:
+        return False, "Не удалось получить ссылку на выгрузку статистики"
+
+    # Уникальный префикс: выгрузки разных мероприятий могут называться одинаково
+    stats_task = asyncio.create_task(_fetch_and_parse(
+        context, exports['stats'], f"statistic_{index}_", data_processor.load_statistics, downloaded))
+    chat_task = asyncio.create_task(_fetch_and_parse(
+        context, exports['chat'], f"chat_{index}_", data_processor.load_chat, downloaded))
+    page_data = await asyncio.to_thread(browser_manager.scrape, exports['page_html'])
+
+    try:
+        df = await stats_task
+    except BaseException:
+        await _drain(chat_task)
+        raise
+    if df is None:
+        await _drain(chat_task)
+        return False, "Не удалось прочитать статистику"
+    if isinstance(df, str):
+        return await _process_chunked(context, index, df, chat_task, page_data, report_dir)
+
+    early_write = None
+    try:
+        report_data = await asyncio.to_thread(data_processor.prepare_report_data, df, page_data, report_config)
+        report_workers = report_config['processing_settings'].get('report_workers')
+
+        # Файлы без листа чата записываются, пока чат еще скачивается и разбирается
+        early_outputs = [output for output in report_config.outputs if not data_processor.needs_chat(output)]
+        late_outputs = [output for output in report_config.outputs if data_processor.needs_chat(output)]
+        early_jobs = await asyncio.to_thread(data_processor.build_report_jobs, report_data, None, report_config, report_dir, early_outputs)
+        # Запись использует тот же заранее запущенный пул процессов, что и разбор
+        early_write = asyncio.create_task(asyncio.to_thread(
+            report_writer.write_workbooks, early_jobs, report_workers, context['parse_pool']))
+
+        chat = await chat_task
+        late_jobs = await asyncio.to_thread(data_processor.build_report_jobs, report_data, chat, report_config, report_dir, late_outputs)
+        written = await asyncio.to_thread(report_writer.write_workbooks, late_jobs, report_workers, context['parse_pool'])
+        written += await early_write
+    finally:
+        # При ошибке мероприятие завершается только после фоновых задач: скачанный чат удаляется,
+        # а запись файлов без чата не продолжает занимать пул после того, как мероприятие объявлено неудачным
+        await _drain(chat_task)
+        if early_write is not None:
+            await _drain(early_write)
+
+    if not report_writer.check_written([job[0] for job in early_jobs + late_jobs], written):
+        return False, "Не удалось сохранить отчеты"
+    logging.info(f"--> pipeline: Reports for event {index} written to {report_dir}.")
+    return True, None
+
+
+async def _process_chunked(context, index, statistic_file_path, chat_task, page_data, report_dir):
+    """Обрабатывает очень большую выгрузку по частям (chunked.generate_reports) в пуле процессов после чтения чата."""
+    chat = await chat_task
+    loop = asyncio.get_running_loop()
+    ok, spans = await loop.run_in_executor(
+        context['parse_pool'], _run_in_worker,
+        chunked.generate_reports, statistic_file_path, chat, page_data, context['config'], report_dir)
+    for record in spans:
+        metrics.add_span(record)
+    if not ok:
+        return False, "Не удалось сгенерировать отчеты"
+    logging.info(f"--> pipeline: Reports for event {index} written to {report_dir}.")
+    return True, None
+
+
+async def _drain(task):
+    """
+    Дожидается фоновой задачи, не пробрасывая ее ошибки. Отмена не останавливает поток to_thread:
+    скачанный позже файл не попал бы в downloaded и не был бы удален, а запись продолжала бы занимать пул.
+    """
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def _request_exports(context, page_url):
+    """
+    Получает ссылки на выгрузки и HTML страницы.
+    Через HTTP обе выгрузки запрашиваются одновременно; через браузер — последовательно под общей блокировкой драйвера.
+    :return: Словарь {'stats', 'chat', 'page_html'} или None.
+    """
+    browser_manager = context['browser']
+    if not browser_manager.http_export_enabled():
+        async with context['driver_lock']:
+            return await asyncio.to_thread(browser_manager.collect_exports, page_url)
+
+    export_settings = context['config']['source_settings']['http_export']
+    stats_url, chat_url, page_html = await asyncio.gather(
+        asyncio.to_thread(http_exporter.request_export, browser_manager.session, page_url, export_settings, 'stats'),
+        asyncio.to_thread(http_exporter.request_export, browser_manager.session, page_url, export_settings, 'chat'),
+        asyncio.to_thread(_fetch_page, browser_manager.session, page_url),
+    )
+    if not chat_url:
+        logging.warning("Не удалось получить выгрузку чата. Пропускаю.")
+    return {'stats': stats_url, 'chat': chat_url, 'page_html': page_html}
+
+
+def _fetch_page(session, page_url):
+    """Загружает HTML страницы мероприятия с замером времени."""
+    with metrics.span('page_load', url=page_url):
+        return http_exporter.fetch_page_html(session, page_url)
+
+
+async def _fetch_and_parse(context, file_url, prefix, loader, downloaded):
+    """
+    Скачивает выгрузку и сразу передает ее на разбор в пул процессов.
+    :param loader: data_processor.load_statistics или data_processor.load_chat.
+    :return: DataFrame, None или путь к файлу статистики, который обрабатывается по частям.
+    """
+    if not file_url:
+        return None
+    file_path = await asyncio.to_thread(context['browser'].download_export, file_url, prefix)
+    downloaded.append(file_path)
+    if not os.path.exists(file_path):
+        return None
+    if loader is data_processor.load_statistics and chunked.use_chunked(file_path, context['config']):
+        # Очень большая выгрузка не разбирается целиком: ее путь передается в _process_chunked
+        return file_path
+    loop = asyncio.get_running_loop()
+    frame, spans = await loop.run_in_executor(context['parse_pool'], _run_in_worker, loader, file_path, context['config'])
+    for record in spans:
+        metrics.add_span(record)
+    return frame
+
+
+def _run_in_worker(function, *args):
+    """Выполняет разбор или обработку в дочернем процессе и возвращает результат вместе с замерами этапов."""
+    metrics.reset()
+    result = function(*args)
+    return result, metrics.spans()
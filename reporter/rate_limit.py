@@ -0,0 +1,53 @@
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+from . import metrics
+
+class HostRateLimiter:
+    """
+    Ограничивает частоту запросов к каждому хосту (token bucket): в среднем не больше requests_per_sec,
+    кратковременно — до burst запросов подряд. Один объект разделяется всеми потоками и сессиями процесса.
+    """
+    def __init__(self, requests_per_sec, burst=1):
+        """
+        :param requests_per_sec: Средняя допустимая частота запросов к одному хосту.
+        :param burst: Сколько запросов можно выполнить подряд без ожидания.
+        """
+        self.requests_per_sec = float(requests_per_sec)
+        self.burst = max(1, int(burst))
+        self._lock = threading.Lock()
+        self._buckets = {}  # хост -> [доступные токены, время последнего пополнения]
+        self.waited_sec = 0.0
+
+    def acquire(self, url):
+        """
+        Ждет, пока к хосту url можно будет отправить запрос, и резервирует его.
+        :return: Сколько секунд пришлось ждать.
+        """
+        host = urlparse(url).hostname or ''
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(host, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.requests_per_sec)
+            # Токен резервируется сразу (баланс может уйти в минус), поэтому одновременные запросы
+            # встают в очередь друг за другом, а не просыпаются все разом
+            tokens -= 1
+            self._buckets[host] = (tokens, now)
+            delay = -tokens / self.requests_per_sec if tokens < 0 else 0.0
+            self.waited_sec += delay
+        if delay > 0:
+            logging.debug(f"Ограничение частоты запросов к {host}: жду {delay:.2f} с.")
+            with metrics.span('rate_limit_wait', host=host):
+                time.sleep(delay)
+        return delay
+
+def from_settings(settings):
+    """
+    Создает ограничитель по разделу конфига (requests_per_sec, burst).
+    :return: HostRateLimiter или None, если ограничение выключено.
+    """
+    if not settings or not settings.get('requests_per_sec'):
+        return None
+    return HostRateLimiter(settings['requests_per_sec'], settings.get('burst') or 1)
@@ -0,0 +1,400 @@
+import os
+import csv
+import json
+import time
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from . import metrics, output_formats
+
+# openpyxl (и numpy через него) импортируется в функциях записи xlsx: модуль нужен и для csv/jsonl/parquet
+
+# Ниже этого числа строк запуск пула процессов дороже самой записи
+PARALLEL_MIN_ROWS = 5000
+
+_header_style = None
+
+def dataframe_rows(df, header=True):
+    """
+    Однократно сериализует DataFrame в список строк для записи в Excel.
+    Результат можно переиспользовать в нескольких книгах и передавать в другие процессы.
+    :param df: Исходный DataFrame.
+    :param header: Добавлять ли строку заголовков первой.
+    :return: Словарь {'header': tuple или None, 'columns': tuple, 'rows': list[tuple]};
+             columns — имена столбцов для форматов с именованными полями, даже если заголовок не пишется.
+    """
+    values = df.astype(object).where(df.notna(), None)
+    columns = tuple(str(c) for c in df.columns)
+    return {
+        'header': columns if header else None,
+        'columns': columns,
+        'rows': list(values.itertuples(index=False, name=None)),
+    }
+
+def write_workbook(filepath, sheets):
+    """
+    Записывает книгу в потоковом (write-only) режиме openpyxl: память не зависит от размера листов.
+    :param filepath: Путь к выходному файлу.
+    :param sheets: Список пар (имя листа, результат dataframe_rows).
+    :return: Замеры записи листов и сохранения книги (список словарей для metrics.add_span).
+    """
+    from openpyxl import Workbook
+    timings = []
+    wb = Workbook(write_only=True)
+    for sheet_name, data in sheets:
+        wall, cpu = time.perf_counter(), time.process_time()
+        ws = wb.create_sheet(title=sheet_name)
+        if data['header'] is not None:
+            ws.append([_header_cell(ws, value) for value in data['header']])
+        for row in data['rows']:
+            ws.append(row)
+        timings.append(_timing('sheet_write', wall, cpu, file=os.path.basename(filepath), sheet=sheet_name, rows=len(data['rows'])))
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    tmp_path = f"{filepath}.tmp"
+    wb.save(tmp_path)
+    os.replace(tmp_path, filepath)
+    timings.append(_timing('workbook_save', wall, cpu, file=os.path.basename(filepath), bytes=os.path.getsize(filepath)))
+    return timings
+
+def write_csv(filepath, sheets):
+    """Потоково записывает единственный лист в CSV (UTF-8); заголовок — только если он есть в листе."""
+    (_, data), = sheets
+    wall, cpu = time.perf_counter(), time.process_time()
+    with _replacing(filepath) as tmp_path, open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if data['header'] is not None:
+            writer.writerow(data['header'])
+        writer.writerows(data['rows'])
+    return [_file_timing('csv', filepath, len(data['rows']), wall, cpu)]
+
+def write_jsonl(filepath, sheets):
+    """Потоково записывает единственный лист в JSON Lines: по объекту {столбец: значение} на строку."""
+    (_, data), = sheets
+    wall, cpu = time.perf_counter(), time.process_time()
+    columns = data['columns']
+    with _replacing(filepath) as tmp_path, open(tmp_path, 'w', encoding='utf-8') as f:
+        for row in data['rows']:
+            f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+            f.write("\n")
+    return [_file_timing('jsonl', filepath, len(data['rows']), wall, cpu)]
+
+def write_parquet(filepath, sheets):
+    """Записывает единственный лист в Parquet (нужен пакет pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("для формата parquet нужен пакет pyarrow (pip install pyarrow)") from None
+    (_, data), = sheets
+    wall, cpu = time.perf_counter(), time.process_time()
+    arrays = []
+    for i in range(len(data['columns'])):
+        values = [row[i] for row in data['rows']]
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Столбец со значениями разных типов сохраняется строками
+            arrays.append(pa.array([None if value is None else str(value) for value in values], type=pa.string()))
+    with _replacing(filepath) as tmp_path:
+        pq.write_table(pa.Table.from_arrays(arrays, names=list(data['columns'])), tmp_path)
+    return [_file_timing('parquet', filepath, len(data['rows']), wall, cpu)]
+
+class _XlsxStream:
+    """Книга в write-only режиме; листы создаются сразу в заданном порядке и дописываются блоками в любом порядке."""
+    def __init__(self, filepath, sheet_names):
+        from openpyxl import Workbook
+        self.filepath = filepath
+        self._wb = Workbook(write_only=True)
+        self._sheets = {name: self._wb.create_sheet(title=name) for name in sheet_names}
+        self._rows = dict.fromkeys(sheet_names, None)
+
+    def append(self, sheet_name, data):
+        ws = self._sheets[sheet_name]
+        if self._rows[sheet_name] is None:
+            self._rows[sheet_name] = 0
+            if data['header'] is not None:
+                ws.append([_header_cell(ws, value) for value in data['header']])
+        for row in data['rows']:
+            ws.append(row)
+        self._rows[sheet_name] += len(data['rows'])
+
+    def close(self):
+        wall, cpu = time.perf_counter(), time.process_time()
+        with _replacing(self.filepath) as tmp_path:
+            self._wb.save(tmp_path)
+        return [_timing('workbook_save', wall, cpu, file=os.path.basename(self.filepath),
+                        rows=sum(count or 0 for count in self._rows.values()),
+                        bytes=os.path.getsize(self.filepath))]
+
+    def abort(self):
+        # Незакрытые листы write-only книги при сборке мусора засоряют stderr ошибками lxml
+        for ws in self._sheets.values():
+            try:
+                ws.close()
+            except Exception:
+                pass
+        self._wb = None
+
+
+class _TextStream:
+    """Однолистовой текстовый файл (CSV или JSON Lines), дописываемый блоками во временный файл."""
+    def __init__(self, filepath, sheet_names, output_format):
+        self.filepath = filepath
+        self.format = output_format
+        self._tmp_path = f"{filepath}.tmp"
+        self._file = open(self._tmp_path, 'w', newline='' if output_format == 'csv' else None, encoding='utf-8')
+        self._csv = csv.writer(self._file) if output_format == 'csv' else None
+        self._rows = None
+        self._started = time.perf_counter(), time.process_time()
+
+    def append(self, sheet_name, data):
+        if self._csv is not None:
+            if self._rows is None and data['header'] is not None:
+                self._csv.writerow(data['header'])
+            self._csv.writerows(data['rows'])
+        else:
+            columns = data['columns']
+            for row in data['rows']:
+                self._file.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str))
+                self._file.write("\n")
+        self._rows = (self._rows or 0) + len(data['rows'])
+
+    def close(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.filepath)
+        return [_file_timing(self.format, self.filepath, self._rows or 0, *self._started)]
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class _ParquetStream:
+    """Parquet-файл, дописываемый группами строк; схема определяется по первому блоку."""
+    def __init__(self, filepath, sheet_names):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("для формата parquet нужен пакет pyarrow (pip install pyarrow)") from None
+        self._pa, self._pq = pa, pq
+        self.filepath = filepath
+        self._tmp_path = f"{filepath}.tmp"
+        self._writer = None
+        self._rows = 0
+        self._started = time.perf_counter(), time.process_time()
+
+    def append(self, sheet_name, data):
+        pa = self._pa
+        arrays = []
+        for i in range(len(data['columns'])):
+            values = [row[i] for row in data['rows']]
+            field_type = self._writer.schema.field(i).type if self._writer else None
+            try:
+                array = pa.array(values, type=field_type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                array = None
+            if array is None or (field_type is None and pa.types.is_null(array.type)):
+                # Неоднородный или пока пустой столбец сохраняется строками
+                array = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+            arrays.append(array)
+        table = pa.Table.from_arrays(arrays, names=list(data['columns']))
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._tmp_path, table.schema)
+        self._writer.write_table(table)
+        self._rows += len(data['rows'])
+
+    def close(self):
+        if self._writer is None:
+            raise RuntimeError("нет данных для записи")
+        self._writer.close()
+        os.replace(self._tmp_path, self.filepath)
+        return [_file_timing('parquet', self.filepath, self._rows, *self._started)]
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class _BufferedStream:
+    """Потоковая запись для форматов без нее: блоки копятся в памяти и пишутся функцией формата при закрытии."""
+    def __init__(self, filepath, sheet_names, writer):
+        self.filepath = filepath
+        self._writer = writer
+        self._sheets = {name: None for name in sheet_names}
+
+    def append(self, sheet_name, data):
+        if self._sheets[sheet_name] is None:
+            self._sheets[sheet_name] = {'header': data['header'], 'columns': data['columns'], 'rows': []}
+        self._sheets[sheet_name]['rows'].extend(data['rows'])
+
+    def close(self):
+        return self._writer(self.filepath, [(name, data) for name, data in self._sheets.items() if data is not None])
+
+    def abort(self):
+        self._sheets = {}
+
+
+# Функции записи форматов: имя -> функция записи и потоковая запись (имена, расширения и число листов — в output_formats).
+# Функция записи принимает (путь, список листов) и возвращает замеры; для записи в пуле процессов она должна быть
+# функцией уровня модуля.
+WRITERS = {}
+
+def register_writer(name, writer, extensions=(), multi_sheet=False, stream=None):
+    """
+    Регистрирует формат выходного файла (output_files.*.format).
+    Регистрировать собственные форматы нужно до загрузки конфига: формат проверяется при его разборе.
+    :param name: Имя формата.
+    :param writer: Функция writer(filepath, sheets) -> список замеров (может быть пустым).
+    :param extensions: Расширения файлов, по которым формат выбирается, если он не указан явно.
+    :param multi_sheet: Может ли файл содержать несколько листов.
+    :param stream: Необязательная фабрика stream(filepath, sheet_names) для построчной записи (см. open_stream);
+                   без нее потоковая запись копит строки в памяти.
+    """
+    output_formats.register_format(name, extensions, multi_sheet)
+    WRITERS[name] = {'writer': writer, 'stream': stream}
+
+def open_stream(filepath, output_format, sheet_names):
+    """
+    Открывает выходной файл для записи блоками (режим обработки по частям).
+    :param sheet_names: Имена листов в порядке следования в файле.
+    :return: Объект с методами append(sheet_name, data) (data — результат dataframe_rows; заголовок пишется
+             из первого блока листа), close() -> список замеров и abort().
+    """
+    entry = WRITERS[output_format]
+    if entry['stream'] is None:
+        return _BufferedStream(filepath, sheet_names, entry['writer'])
+    return entry['stream'](filepath, sheet_names)
+
+def close_streams(streams):
+    """
+    Закрывает потоковые файлы, логирует результат и передает замеры в metrics.
+    :return: Список успешно записанных файлов.
+    """
+    written = []
+    for stream in streams:
+        timings, error = None, None
+        try:
+            timings = stream.close()
+        except Exception as e:
+            error = e
+            stream.abort()
+        if _collect(stream.filepath, error, timings):
+            written.append(stream.filepath)
+    return written
+
+register_writer('xlsx', write_workbook, ('.xlsx',), multi_sheet=True, stream=_XlsxStream)
+register_writer('csv', write_csv, ('.csv',), stream=lambda filepath, sheet_names: _TextStream(filepath, sheet_names, 'csv'))
+register_writer('jsonl', write_jsonl, ('.jsonl', '.ndjson'), stream=lambda filepath, sheet_names: _TextStream(filepath, sheet_names, 'jsonl'))
+register_writer('parquet', write_parquet, ('.parquet',), stream=_ParquetStream)
+
+def write_workbooks(jobs, max_workers=None, executor=None):
+    """
+    Записывает несколько независимых выходных файлов, при необходимости параллельно в пуле процессов.
+    :param jobs: Список кортежей (путь к файлу, список листов[, формат]); без формата файл пишется в xlsx.
+    :param max_workers: Максимальное число процессов; 1 — последовательная запись.
+    :param executor: Уже запущенный пул процессов; если задан, новый пул не создается.
+    :return: Список успешно записанных файлов.
+    """
+    if not jobs:
+        return []
+    started = time.perf_counter()
+    jobs = [(job[0], job[1], WRITERS[job[2] if len(job) > 2 else 'xlsx']['writer']) for job in jobs]
+    total_rows = sum(len(data['rows']) for _, sheets, _ in jobs for _, data in sheets)
+    workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+
+    written = []
+    if workers > 1 and total_rows >= PARALLEL_MIN_ROWS:
+        if executor is not None:
+            written = _write_in_executor(executor, jobs)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                written = _write_in_executor(executor, jobs)
+    else:
+        workers = 1
+        for filepath, sheets, writer in jobs:
+            timings = None
+            try:
+                timings = writer(filepath, sheets)
+                error = None
+            except Exception as e:
+                error = e
+            if _collect(filepath, error, timings):
+                written.append(filepath)
+
+    logging.info(f"Записано {len(written)} из {len(jobs)} файлов ({total_rows} строк) "
+                 f"за {time.perf_counter() - started:.2f} с, процессов: {workers}.")
+    return written
+
+def check_written(filepaths, written):
+    """
+    Сверяет список записанных файлов с ожидаемым и логирует несохраненные.
+    :param filepaths: Пути файлов, которые должны были быть записаны.
+    :param written: Результат write_workbooks или close_streams.
+    :return: True, если записаны все файлы.
+    """
+    failed = [os.path.basename(path) for path in filepaths if path not in written]
+    if failed:
+        logging.error(f"Не сохранены отчеты: {', '.join(failed)}")
+        return False
+    return True
+
+def _write_in_executor(executor, jobs):
+    """Записывает файлы в пуле процессов и собирает результаты."""
+    written = []
+    futures = [(filepath, executor.submit(writer, filepath, sheets)) for filepath, sheets, writer in jobs]
+    for filepath, future in futures:
+        error = future.exception()
+        if _collect(filepath, error, None if error else future.result()):
+            written.append(filepath)
+    return written
+
+def _collect(filepath, error, timings):
+    """Логирует результат записи одного файла и передает замеры (в т.ч. из дочерних процессов) в metrics."""
+    for timing in timings or []:
+        metrics.add_span(timing)
+    if error:
+        metrics.add_span({'name': 'workbook_save', 'file': os.path.basename(filepath), 'status': 'error'})
+        logging.error(f"Не удалось сохранить отчет {os.path.basename(filepath)}: {error}")
+        return False
+    logging.info(f"Отчет сохранен: {filepath}")
+    return True
+
+@contextmanager
+def _replacing(filepath):
+    """Отдает путь временного файла и по успешном завершении атомарно заменяет им filepath."""
+    tmp_path = f"{filepath}.tmp"
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, filepath)
+
+def _file_timing(output_format, filepath, rows, wall, cpu):
+    """Замер записи однолистового файла."""
+    return _timing('file_write', wall, cpu, file=os.path.basename(filepath), format=output_format,
+                   rows=rows, bytes=os.path.getsize(filepath))
+
+def _timing(name, wall, cpu, **attrs):
+    """Формирует запись об этапе в формате metrics.span."""
+    return {'name': name, 'wall_sec': round(time.perf_counter() - wall, 6), 'cpu_sec': round(time.process_time() - cpu, 6), **attrs}
+
+def _header_cell(ws, value):
+    """Создает ячейку заголовка в стиле pandas.to_excel."""
+    global _header_style
+    from openpyxl.cell import WriteOnlyCell
+    if _header_style is None:
+        from openpyxl.styles import Alignment, Border, Font, Side
+        thin = Side(style='thin')
+        _header_style = (Font(bold=True), Border(left=thin, right=thin, top=thin, bottom=thin),
+                         Alignment(horizontal='center', vertical='top'))
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font, cell.border, cell.alignment = _header_style
+    return cell
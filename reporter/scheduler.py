@@ -0,0 +1,316 @@
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from contextlib import closing, contextmanager
+
+from . import config, metrics, rate_limit
+from .daemon import BrowserPool
+from .data_processor import process_event
+from .file_handler import event_dir_name
+
+# Планировщик отчетов: очередь мероприятий в SQLite (задания переживают перезапуск), несколько исполнителей
+# на пуле авторизованных сессий браузера, общее ограничение частоты запросов к каждому хосту MTS Link
+# и повтор неудачных заданий с экспоненциальной задержкой.
+#   python main.py --schedule <URL> [--at "2026-10-20 18:30"]   поставить мероприятия в очередь
+#   python main.py --scheduler                                   обрабатывать очередь до Ctrl+C
+#   python main.py --queue-status                                глубина очереди и задержки заданий
+
+DEFAULT_SETTINGS = {
+    'db_path': "jobs.sqlite3",
+    'workers': 2,
+    'max_jobs_per_session': 20,
+    'lease_timeout_sec': 600,
+    'stale_job_sec': 3600,
+    'poll_interval_sec': 5,
+    'max_attempts': 4,
+    'retry_backoff_sec': 60,
+    'retry_backoff_max_sec': 3600,
+    'stats_interval_sec': 300,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    report_dir TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    worker TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, run_at);
+"""
+
+def connect(db_path):
+    """Открывает очередь заданий и создает схему при первом подключении."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def enqueue(conn, page_url, run_at=None, report_dir=None, max_attempts=DEFAULT_SETTINGS['max_attempts']):
+    """
+    Ставит мероприятие в очередь. Повторная постановка мероприятия, которое еще ждет или выполняется, не создает дубль.
+    :param run_at: Время запуска (Unix time); None — как можно скорее.
+    :return: id задания.
+    """
+    with _transaction(conn):
+        row = conn.execute("SELECT id FROM jobs WHERE url = ? AND status IN ('queued', 'running')", (page_url,)).fetchone()
+        if row:
+            logging.info(f"Мероприятие уже в очереди (задание {row[0]}): {page_url}")
+            return row[0]
+        now = time.time()
+        cursor = conn.execute(
+            "INSERT INTO jobs (url, report_dir, run_at, created_at, max_attempts) VALUES (?, ?, ?, ?, ?)",
+            (page_url, report_dir or os.path.join(config.REPORT_DIR, event_dir_name(page_url)), run_at or now, now, max_attempts),
+        )
+        return cursor.lastrowid
+
+def claim(conn, worker):
+    """
+    Забирает самое раннее задание, время которого наступило, и помечает его выполняемым.
+    :return: Словарь задания или None, если готовых заданий нет.
+    """
+    now = time.time()
+    # SELECT и UPDATE вместо UPDATE ... RETURNING (SQLite >= 3.35): BEGIN IMMEDIATE уже держит блокировку записи,
+    # поэтому между ними задание не заберет другой исполнитель
+    with _transaction(conn):
+        row = conn.execute(
+            """
+            SELECT id, url, report_dir, run_at, attempts, max_attempts FROM jobs
+            WHERE status = 'queued' AND run_at <= ? ORDER BY run_at, id LIMIT 1
+            """,
+            (now,),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = ?, worker = ?, attempts = attempts + 1 WHERE id = ?",
+            (now, worker, row[0]),
+        )
+    job = dict(zip(('id', 'url', 'report_dir', 'run_at', 'attempts', 'max_attempts'), row), started_at=now)
+    job['attempts'] += 1
+    return job
+
+def complete(conn, job, ok, error=None, backoff_sec=DEFAULT_SETTINGS['retry_backoff_sec'],
+             backoff_max_sec=DEFAULT_SETTINGS['retry_backoff_max_sec']):
+    """
+    Записывает результат задания. Неудачное задание возвращается в очередь с экспоненциальной задержкой,
+    пока не исчерпаны попытки.
+    :return: Новый статус задания ('ok', 'queued' или 'failed').
+    """
+    now = time.time()
+    if ok:
+        status, run_at = 'ok', job['run_at']
+    elif job['attempts'] < job['max_attempts']:
+        # Задержка удваивается с каждой попыткой; джиттер разводит задания, упавшие одновременно
+        delay = min(backoff_max_sec, backoff_sec * 2 ** (job['attempts'] - 1)) * random.uniform(0.8, 1.2)
+        status, run_at = 'queued', now + delay
+        logging.warning(f"Задание {job['id']} не выполнено ({error}). Попытка {job['attempts'] + 1}/{job['max_attempts']} "
+                        f"через {delay:.0f} с.")
+    else:
+        status, run_at = 'failed', job['run_at']
+        logging.error(f"Задание {job['id']} не выполнено после {job['attempts']} попыток: {error}")
+    with _transaction(conn):
+        conn.execute(
+            "UPDATE jobs SET status = ?, run_at = ?, finished_at = ?, last_error = ? WHERE id = ?",
+            (status, run_at, now, error, job['id']),
+        )
+    return status
+
+def recover(conn, stale_after_sec=DEFAULT_SETTINGS['stale_job_sec']):
+    """
+    Возвращает в очередь задания, которые остались выполняемыми после аварийной остановки.
+    Задание считается брошенным, только если выполняется дольше stale_after_sec: очередь могут разбирать
+    несколько планировщиков, и свежие задания другого процесса перезапускать нельзя.
+    Брошенное задание, исчерпавшее попытки, помечается неудачным: иначе задание, которое роняет процесс,
+    перезапускалось бы бесконечно.
+    :return: Число возвращенных заданий.
+    """
+    now = time.time()
+    with _transaction(conn):
+        failed = conn.execute(
+            "UPDATE jobs SET status = 'failed', worker = NULL, finished_at = ?, "
+            "last_error = 'прервано после последней попытки' "
+            "WHERE status = 'running' AND started_at < ? AND attempts >= max_attempts",
+            (now, now - stale_after_sec),
+        ).rowcount
+        count = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND started_at < ?",
+            (now - stale_after_sec,),
+        ).rowcount
+    if failed:
+        logging.error(f"Прерванных заданий с исчерпанными попытками: {failed}. Помечены неудачными.")
+    if count:
+        logging.warning(f"Возвращено в очередь прерванных заданий: {count}.")
+    return count
+
+def queue_stats(conn, window_hours=24):
+    """
+    Считает глубину очереди и задержки заданий.
+    :param window_hours: За какой период учитывать завершенные задания.
+    :return: Словарь: число заданий по статусам, готовых к запуску, возраст самого старого готового задания,
+             медиана и 95-й перцентиль ожидания в очереди (от планового времени до старта) и длительности, в секундах.
+    """
+    now = time.time()
+    stats = {'queued': 0, 'running': 0, 'ok': 0, 'failed': 0}
+    stats.update(dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")))
+    ready, oldest = conn.execute(
+        "SELECT COUNT(*), MIN(run_at) FROM jobs WHERE status = 'queued' AND run_at <= ?", (now,)
+    ).fetchone()
+    stats['ready'] = ready
+    stats['oldest_ready_sec'] = round(now - oldest, 1) if oldest else None
+
+    finished = conn.execute(
+        "SELECT started_at - run_at, finished_at - started_at FROM jobs WHERE status = 'ok' AND finished_at >= ?",
+        (now - window_hours * 3600,),
+    ).fetchall()
+    waits = sorted(max(0.0, wait) for wait, _ in finished)
+    durations = sorted(duration for _, duration in finished)
+    stats['finished_window'] = len(finished)
+    stats['wait_p50_sec'], stats['wait_p95_sec'] = _percentile(waits, 50), _percentile(waits, 95)
+    stats['duration_p50_sec'], stats['duration_p95_sec'] = _percentile(durations, 50), _percentile(durations, 95)
+    return stats
+
+def format_stats(stats):
+    """Форматирует queue_stats для лога и консоли."""
+    def seconds(value):
+        return "-" if value is None else f"{value:.0f} с"
+    return (f"в очереди {stats['queued']} (готово к запуску {stats['ready']}, старейшее ждет {seconds(stats['oldest_ready_sec'])}), "
+            f"выполняется {stats['running']}, успешно {stats['ok']}, с ошибкой {stats['failed']}; "
+            f"за период: {stats['finished_window']} заданий, ожидание p50/p95 {seconds(stats['wait_p50_sec'])}/{seconds(stats['wait_p95_sec'])}, "
+            f"длительность p50/p95 {seconds(stats['duration_p50_sec'])}/{seconds(stats['duration_p95_sec'])}")
+
+
+class Scheduler:
+    """Исполнители очереди: каждый забирает готовое задание и выполняет его на арендованной сессии браузера."""
+    def __init__(self, report_config, settings):
+        self.report_config = report_config
+        self.settings = settings
+        self.rate_limiter = rate_limit.from_settings(report_config.get('rate_limit'))
+        self.pool = BrowserPool(report_config, settings['workers'], settings['max_jobs_per_session'], self.rate_limiter)
+        self._stop = threading.Event()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """Запускает пул и исполнителей и работает до stop() или Ctrl+C."""
+        with closing(connect(self.settings['db_path'])) as conn:
+            recover(conn, self.settings['stale_job_sec'])
+            logging.info(f"Очередь: {format_stats(queue_stats(conn))}")
+        logging.info(f"Запускаю пул из {self.settings['workers']} сессий браузера...")
+        if not self.pool.start():
+            logging.error("Не удалось подготовить ни одной сессии браузера. Планировщик не запущен.")
+            return
+        workers = [threading.Thread(target=self._worker, args=(f"worker-{i}",), name=f"scheduler-{i}")
+                   for i in range(self.settings['workers'])]
+        for worker in workers:
+            worker.start()
+        try:
+            while not self._stop.wait(self.settings['stats_interval_sec']):
+                self._log_stats()
+        except KeyboardInterrupt:
+            logging.info("Получен сигнал остановки. Жду завершения текущих заданий...")
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join()
+            self.pool.close()
+            metrics.export(self.report_config.get('metrics'))
+            logging.info("Планировщик остановлен.")
+
+    def stop(self):
+        """Просит исполнителей завершиться после текущих заданий."""
+        self._stop.set()
+
+    def _worker(self, name):
+        """Цикл исполнителя: забрать задание, выполнить, записать результат."""
+        with closing(connect(self.settings['db_path'])) as conn:
+            while not self._stop.is_set():
+                try:
+                    job = claim(conn, name)
+                except sqlite3.OperationalError as e:
+                    # Например, база дольше таймаута заблокирована другим процессом: исполнитель не должен завершаться
+                    logging.error(f"{name}: не удалось забрать задание из очереди: {e}")
+                    job = None
+                if job is None:
+                    self._stop.wait(self.settings['poll_interval_sec'])
+                    continue
+                ok, error = self._run_job(job)
+                try:
+                    complete(conn, job, ok, error, self.settings['retry_backoff_sec'], self.settings['retry_backoff_max_sec'])
+                except sqlite3.OperationalError as e:
+                    logging.error(f"{name}: не удалось записать результат задания {job['id']}: {e}. "
+                                  f"Задание вернется в очередь через {self.settings['stale_job_sec']} с.")
+
+    def _run_job(self, job):
+        """Выполняет задание на арендованной сессии. :return: Кортеж (успех, сообщение об ошибке или None)."""
+        with self._lock:
+            self._active += 1
+        queue_wait = max(0.0, job['started_at'] - job['run_at'])
+        logging.info(f"Задание {job['id']} (попытка {job['attempts']}/{job['max_attempts']}, "
+                     f"ждало {queue_wait:.0f} с): {job['url']}")
+        try:
+            with self.pool.lease(self.settings['lease_timeout_sec']) as (manager, lease):
+                with metrics.span('event', url=job['url'], job=job['id'], attempt=job['attempts'],
+                                  queue_wait_sec=round(queue_wait, 3)) as event_span:
+                    ok, error = process_event(manager, job['url'], self.report_config, job['report_dir'])
+                    event_span['status'] = 'ok' if ok else 'error'
+                lease['failed'] = not ok
+            return ok, error
+        except Exception as e:
+            logging.error(f"Задание {job['id']} прервано: {e}")
+            return False, str(e)
+        finally:
+            with self._lock:
+                self._active -= 1
+                idle = self._active == 0
+            if idle:
+                # В простое трасса сбрасывается на диск, чтобы список замеров не рос бесконечно
+                metrics.export(self.report_config.get('metrics'), reset=True)
+
+    def _log_stats(self):
+        """Периодически возвращает в очередь брошенные задания и пишет в лог глубину очереди и задержки."""
+        try:
+            with closing(connect(self.settings['db_path'])) as conn:
+                recover(conn, self.settings['stale_job_sec'])
+                logging.info(f"Очередь: {format_stats(queue_stats(conn))}")
+        except sqlite3.OperationalError as e:
+            logging.error(f"Не удалось прочитать очередь заданий: {e}")
+        if self.rate_limiter is not None:
+            logging.info(f"Ожидание из-за ограничения частоты запросов: {self.rate_limiter.waited_sec:.1f} с всего.")
+
+
+def settings_for(report_config):
+    """Возвращает настройки планировщика: раздел scheduler конфига поверх значений по умолчанию."""
+    return {**DEFAULT_SETTINGS, **(report_config.get('scheduler') or {})}
+
+def serve(report_config):
+    """Запускает планировщик по разделу scheduler конфига."""
+    Scheduler(report_config, settings_for(report_config)).run()
+
+@contextmanager
+def _transaction(conn):
+    """Транзакция с немедленной блокировкой записи: исполнители в разных потоках и процессах не заберут одно задание."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+def _percentile(sorted_values, percent):
+    """Перцентиль по отсортированному списку (ближайший ранг) или None для пустого списка."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[index], 1)
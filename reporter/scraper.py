@@ -1,44 +1,171 @@
-import logging
 import re
+import json
+import logging
+import importlib.util
 
-def scrape_presenter(soup, report_config):
-    """Парсит имя ведущего со страницы, используя селекторы из конфига."""
-    if not soup: return "Не удалось получить"
-    
-    scraper_selectors = report_config['source_settings']['selectors']['scraper']
-    presenter_text = scraper_selectors.get('presenter')
-    
-    if not presenter_text:
-        logging.warning("Селектор для имени ведущего не найден в конфиге.")
-        return "Не настроено"
-        
-    try:
-        presenter_tag = soup.find(string=re.compile(presenter_text))
-        if presenter_tag:
-            next_sibling = presenter_tag.find_next(string=True)
-            if next_sibling and next_sibling.strip():
-                name = next_sibling.strip()
-                parts = name.split()
-                return " ".join(parts[:3]) if len(parts) > 3 else name
-    except Exception as e:
-        logging.warning(f"Не удалось извлечь имя ведущего: {e}")
-    return "Не найдено"
-
-def scrape_new_emails(soup, report_config):
-    """Парсит количество новых email'ов, используя селекторы из конфига."""
-    if not soup: return "Не удалось получить"
-    
-    scraper_selectors = report_config['source_settings']['selectors']['scraper']
-    email_selector = scraper_selectors.get('new_emails')
-
-    if not email_selector:
-        logging.warning("Селектор для новых email не найден в конфиге.")
-        return "Не настроено"
-        
+# bs4 и soupsieve импортируются при первом разборе страницы: загрузка конфига (в том числе --queue-status
+# и проверка конфига) не тянет HTML-стек
+
+# lxml заметно быстрее встроенного парсера на больших страницах; используется, если установлен
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+NOT_AVAILABLE = "Не удалось получить"
+NOT_CONFIGURED = "Не настроено"
+NOT_FOUND = "Не найдено"
+
+# Старый формат конфига (строка вместо описания поля): для этих полей строка — текстовая метка, для остальных — CSS
+_LEGACY_LABEL_FIELDS = {'presenter': {'max_words': 3}}
+
+_ENGINE_CACHE = {}
+
+class ScrapeEngine:
+    """
+    Извлекает все настроенные поля страницы мероприятия, компилируя селекторы один раз.
+    Поддерживаемые описания полей:
+      css: "<селектор>" — текст первого подходящего элемента;
+      label: "<регулярное выражение>" — первый непустой текст после текстового узла с меткой.
+    Необязательно: max_words — обрезать значение до N слов; summary_label — вывести поле в сводный лист.
+    Описания полей и метки проверяются при создании, CSS-селекторы компилируются при первом разборе
+    или явным вызовом compile_selectors().
+    """
+    def __init__(self, scraper_settings):
+        self.fields = {}
+        self.css_fields = None
+        self.label_fields = []
+        self.strainer = None
+        self.css_union = None
+        self._css_specs = []
+        self._strainer_settings = scraper_settings.get('parse_only')
+
+        field_settings = scraper_settings.get('fields')
+        if field_settings is None:
+            # Совместимость со старым форматом: ключи на верхнем уровне, значения — строки
+            field_settings = {k: v for k, v in scraper_settings.items() if k != 'parse_only'}
+
+        for name, spec in field_settings.items():
+            if not spec:
+                continue
+            if isinstance(spec, str):
+                spec = {'label': spec, **_LEGACY_LABEL_FIELDS[name]} if name in _LEGACY_LABEL_FIELDS else {'css': spec}
+            self.fields[name] = spec
+            if spec.get('css'):
+                self._css_specs.append((name, spec['css']))
+            elif spec.get('label'):
+                self.label_fields.append((name, re.compile(spec['label'])))
+            else:
+                raise ValueError(f"Для поля '{name}' не задан ни css, ни label")
+
+    def compile_selectors(self):
+        """Компилирует CSS-селекторы и фильтр разбора (один раз). Синтаксическая ошибка CSS — ValueError."""
+        if self.css_fields is not None:
+            return
+        import soupsieve
+        from bs4 import SoupStrainer
+        css_fields = []
+        for name, css in self._css_specs:
+            try:
+                css_fields.append((name, soupsieve.compile(css)))
+            except soupsieve.SelectorSyntaxError as e:
+                raise ValueError(f"поле '{name}': {e}") from e
+        self.css_union = soupsieve.compile(", ".join(css for _, css in self._css_specs)) if css_fields else None
+        settings = self._strainer_settings
+        # Разбирается только нужная часть страницы (имя тега и атрибуты корневого элемента)
+        self.strainer = SoupStrainer(settings.get('name'), attrs=settings.get('attrs') or {}) if settings else None
+        self.css_fields = css_fields
+
+    def parse(self, html):
+        """
+        Разбирает HTML и извлекает значения всех полей.
+        :param html: Исходный код страницы.
+        :return: Словарь {имя поля: значение}; для ненайденных полей — "Не найдено".
+        """
+        from bs4 import BeautifulSoup
+        self.compile_selectors()
+        soup = BeautifulSoup(html, HTML_PARSER, parse_only=self.strainer)
+        return self.extract(soup)
+
+    def extract(self, root):
+        """
+        Извлекает значения полей из уже разобранного дерева.
+        Все CSS-поля ищутся одним обходом по объединенному селектору, все метки — одним обходом текстовых узлов;
+        каждый обход останавливается, как только найдены все его поля.
+        """
+        from bs4 import Comment, NavigableString
+        self.compile_selectors()
+        values = {}
+
+        pending_css = list(self.css_fields)
+        if pending_css:
+            for element in self.css_union.iselect(root):
+                matched = [item for item in pending_css if item[1].match(element)]
+                for name, _ in matched:
+                    values[name] = element.get_text().strip()
+                pending_css = [item for item in pending_css if item not in matched]
+                if not pending_css:
+                    break
+
+        pending_labels = list(self.label_fields)
+        awaiting = []  # поля, чья метка найдена и которые ждут следующий непустой текст
+        if pending_labels:
+            for node in root.descendants:
+                if not isinstance(node, NavigableString) or isinstance(node, Comment):
+                    continue
+                if awaiting and node.strip():
+                    for name in awaiting:
+                        values[name] = node.strip()
+                    awaiting = []
+                if pending_labels:
+                    matched = [item for item in pending_labels if item[1].search(node)]
+                    awaiting.extend(name for name, _ in matched)
+                    pending_labels = [item for item in pending_labels if item not in matched]
+                elif not awaiting:
+                    break
+
+        result = {}
+        for name, spec in self.fields.items():
+            value = values.get(name)
+            if not value:
+                result[name] = NOT_FOUND
+                continue
+            max_words = spec.get('max_words')
+            if max_words:
+                value = " ".join(value.split()[:max_words])
+            result[name] = value
+        return result
+
+    def summary_fields(self):
+        """Возвращает пары (подпись, имя поля) для полей, которые выводятся в сводный лист."""
+        return [(spec['summary_label'], name) for name, spec in self.fields.items() if spec.get('summary_label')]
+
+def get_engine(report_config):
+    """Возвращает скомпилированный ScrapeEngine для конфига (компилируется один раз)."""
+    engine = getattr(report_config, 'scraper_engine', None)
+    if engine is not None:
+        return engine
+    scraper_settings = report_config['source_settings']['selectors'].get('scraper') or {}
+    key = json.dumps(scraper_settings, sort_keys=True, ensure_ascii=False)
+    if key not in _ENGINE_CACHE:
+        _ENGINE_CACHE[key] = ScrapeEngine(scraper_settings)
+    return _ENGINE_CACHE[key]
+
+def scrape_page(html, report_config):
+    """
+    Извлекает все поля страницы мероприятия, описанные в source_settings.selectors.scraper.
+    :return: Словарь значений полей или None, если страница недоступна.
+    """
+    if not html:
+        return None
     try:
-        email_tag = soup.select_one(email_selector)
-        if email_tag:
-            return email_tag.text.strip()
+        return get_engine(report_config).parse(html)
     except Exception as e:
-        logging.warning(f"Не удалось извлечь количество новых email: {e}")
-    return "Не найдено"
\ No newline at end of file
+        logging.warning(f"Не удалось разобрать страницу мероприятия: {e}")
+        return None
+
+def field_value(page_data, name):
+    """Возвращает значение поля страницы или пояснение, почему его нет."""
+    if not page_data:
+        return NOT_AVAILABLE
+    if name not in page_data:
+        logging.warning(f"Селектор для поля '{name}' не найден в конфиге.")
+        return NOT_CONFIGURED
+    return page_data[name]
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import requests
+
+def save_session(path, cookies, max_age_hours):
+    """
+    Сохраняет cookies авторизованной сессии на диск вместе со сроком действия.
+    :param path: Путь к файлу хранилища сессии.
+    :param cookies: Список cookies в формате Selenium (name, value, domain, expiry...).
+    :param max_age_hours: Максимальный срок жизни сохраненной сессии в часах.
+    :return: True, если сессия сохранена, иначе False.
+    """
+    saved_at = time.time()
+    expires_at = saved_at + max_age_hours * 3600
+    # Сессия не может жить дольше самой короткой постоянной cookie
+    cookie_expiries = [c['expiry'] for c in cookies if c.get('expiry')]
+    if cookie_expiries:
+        expires_at = min(expires_at, min(cookie_expiries))
+
+    data = {
+        "saved_at": saved_at,
+        "expires_at": expires_at,
+        "cookies": [
+            {k: c[k] for k in ('name', 'value', 'domain', 'path', 'expiry', 'secure', 'httpOnly') if k in c}
+            for c in cookies
+        ],
+    }
+    tmp_path = None
+    try:
+        # Уникальное имя: сессии пула сервиса входят и сохраняются одновременно.
+        # mkstemp создает файл с правами 0600 — в нем токены авторизации
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp",
+                                        dir=os.path.dirname(path) or '.')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logging.info(f"Сессия сохранена в {path} (действительна до {time.strftime('%Y-%m-%d %H:%M', time.localtime(expires_at))}).")
+        return True
+    except OSError as e:
+        logging.warning(f"Не удалось сохранить сессию в {path}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def load_session(path):
+    """
+    Загружает сохраненные cookies, если они есть и срок их действия не истек.
+    :param path: Путь к файлу хранилища сессии.
+    :return: Список cookies или None.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Не удалось прочитать сохраненную сессию {path}: {e}")
+        return None
+
+    if data.get('expires_at', 0) <= time.time():
+        logging.info("Сохраненная сессия истекла.")
+        clear_session(path)
+        return None
+    return data.get('cookies') or None
+
+def clear_session(path):
+    """Удаляет сохраненную сессию."""
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        logging.warning(f"Не удалось удалить сохраненную сессию {path}: {e}")
+
+def apply_cookies(session, cookies):
+    """Переносит сохраненные cookies в requests.Session."""
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+def is_session_valid(session, check_url, check_marker=None, timeout=10):
+    """
+    Проверяет сессию одним легким запросом.
+    Неавторизованная сессия должна получить 401/403 или редирект на вход.
+    :param session: requests.Session с восстановленными cookies.
+    :param check_url: URL, доступный только авторизованному пользователю.
+    :param check_marker: Необязательный текст, который должен быть в ответе.
+    :return: True, если сессия принята сервером.
+    """
+    try:
+        resp = session.get(check_url, allow_redirects=False, timeout=timeout)
+    except requests.RequestException as e:
+        logging.warning(f"Не удалось проверить сохраненную сессию: {e}")
+        return False
+    if resp.status_code != 200:
+        logging.info(f"Сохраненная сессия отклонена сервером (HTTP {resp.status_code}).")
+        return False
+    if check_marker and check_marker not in resp.text:
+        logging.info("Сохраненная сессия отклонена: в ответе нет признака авторизации.")
+        return False
+    return True
@@ -0,0 +1,196 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .config_loader import IDENTITY_NAME
+
+DEFAULT_SETTINGS = {
+    'identity_key': ['email', IDENTITY_NAME],
+}
+
+def aggregate(df, attended=None, session_settings=None):
+    """
+    Сводит лист "Сеансы входов" (строка на сеанс) к строке на участника.
+    Участник определяется ключом identity_key: первая непустая составляющая по порядку
+    (например, email в нижнем регистре, а без него — имя и фамилия). Строки без ключа считаются разными участниками.
+    Все вычисления векторные (группировка по целочисленным кодам ключа), поэтому время растет почти линейно с числом сеансов.
+    :param df: Отфильтрованные сеансы с внутренними именами столбцов.
+    :param attended: Булева Series: состоялся ли сеанс (см. data_processor._attendance_mask); None — все сеансы состоялись.
+    :param session_settings: Раздел processing_settings.sessions.
+    :return: DataFrame участников в порядке первого появления: атрибуты из первого сеанса и столбцы
+             sessions, first_entry, last_exit, watch_minutes, а также attended (если передан attended).
+    """
+    settings = {**DEFAULT_SETTINGS, **(session_settings or {})}
+    if df.empty:
+        return df.assign(sessions=pd.Series(dtype='int64'), first_entry=pd.Series(dtype='datetime64[ns]'),
+                         last_exit=pd.Series(dtype='datetime64[ns]'), watch_minutes=pd.Series(dtype='Int64'))
+    held = pd.Series(True, index=df.index) if attended is None else attended.astype(bool)
+    result = summarize(df, _identity_codes(df, settings['identity_key']), held)
+
+    # Атрибуты участника (имя, регион, роль...) берутся из его первого сеанса
+    attendees = df.iloc[result['row'].to_numpy()].reset_index(drop=True)
+    attendees['sessions'] = result['sessions'].to_numpy()
+    attendees['first_entry'] = result['first_entry'].to_numpy()
+    attendees['last_exit'] = result['last_exit'].to_numpy()
+    attendees['watch_minutes'] = watch_minutes(result['watch'])
+    if attended is not None:
+        attendees['attended'] = result['held'].to_numpy()
+    logging.info(f"Сеансов: {len(df)}, участников: {len(attendees)} (ключ: {', '.join(settings['identity_key'])}).")
+    return attendees
+
+def summarize(df, codes, held):
+    """
+    Считает показатели сеансов по группам codes (участникам).
+    :param codes: Целочисленный код участника для каждой строки df.
+    :param held: Булева Series: состоялся ли сеанс.
+    :return: DataFrame, индексированный кодом, в порядке первого появления: row (позиция первого сеанса в df),
+             held, sessions, first_entry, last_exit, watch (секунды).
+    """
+    entry, exit_ = session_times(df, held)
+    sessions = pd.DataFrame({
+        'code': codes, 'row': np.arange(len(df)), 'held': held.to_numpy(),
+        'entry': entry.to_numpy(), 'exit': exit_.to_numpy(),
+    })
+    sessions['watch'] = _watch_seconds(sessions)
+
+    grouped = sessions.groupby('code', sort=True)
+    return pd.DataFrame({
+        'row': grouped['row'].min(),
+        'held': grouped['held'].any(),
+        'sessions': grouped['held'].sum().astype('int64'),
+        'first_entry': grouped['entry'].min(),
+        'last_exit': grouped['exit'].max(),
+        'watch': grouped['watch'].sum(min_count=1),
+    }).sort_values('row')
+
+def session_times(df, held):
+    """
+    Возвращает начало и конец каждого сеанса (datetime64; NaT — сеанс не состоялся или время неизвестно).
+    Сеанс без времени выхода считается досмотренным до конца мероприятия.
+    """
+    # Значения несостоявшихся сеансов ("Не посетил") отбрасываются до разбора дат
+    entry = _datetimes(df['entry_time'].where(held)) if 'entry_time' in df.columns else pd.Series(pd.NaT, index=df.index)
+    exit_ = _datetimes(df['exit_time']) if 'exit_time' in df.columns else pd.Series(pd.NaT, index=df.index)
+    if 'end_time' in df.columns:
+        exit_ = exit_.fillna(_datetimes(df['end_time']))
+    return entry, exit_.where(held & entry.notna())
+
+def merge_intervals(intervals):
+    """
+    Объединяет пересекающиеся интервалы просмотра каждого участника.
+    :param intervals: DataFrame со столбцами code, entry, exit; строки без начала или конца отбрасываются.
+    :return: DataFrame с теми же столбцами: непересекающиеся интервалы, по участникам и по времени.
+    """
+    ordered = intervals.dropna(subset=['entry', 'exit']).sort_values(['code', 'entry'], kind='stable')
+    covered_until = ordered.groupby('code')['exit'].cummax()
+    previous = covered_until.groupby(ordered['code']).shift()
+    # Новый интервал начинается, если сеанс начался позже конца всех предыдущих сеансов участника
+    interval_ids = (previous.isna() | (ordered['entry'] > previous)).cumsum()
+    grouped = ordered.groupby(interval_ids.to_numpy(), sort=False)
+    return pd.DataFrame({
+        'code': grouped['code'].first().to_numpy(),
+        'entry': grouped['entry'].min().to_numpy(),
+        'exit': grouped['exit'].max().to_numpy(),
+    })
+
+def watch_minutes(watch_seconds):
+    """Переводит время просмотра из секунд в целые минуты (NA — сеансов не было)."""
+    return pd.array(np.round(np.asarray(watch_seconds, dtype='float64') / 60), dtype='Int64')
+
+def average_watch_minutes(attendees):
+    """Среднее время просмотра присутствовавшего участника в минутах или None, если данных нет."""
+    if 'watch_minutes' not in attendees.columns:
+        return None
+    watched = attendees['watch_minutes']
+    if 'attended' in attendees.columns:
+        watched = watched[attendees['attended']]
+    watched = watched.dropna()
+    return round(float(watched.mean()), 1) if not watched.empty else None
+
+def identity_hashes(df, identity_key):
+    """
+    Возвращает 64-битный хэш ключа участника для каждого сеанса (0 — ключа нет).
+    В отличие от кодов, хэш не зависит от остальных строк, поэтому совпадает в разных блоках одного файла.
+    """
+    hashes = np.zeros(len(df), dtype='uint64')
+    for part, codes, labels in _identity_parts(df, identity_key):
+        if not labels:
+            continue
+        part_hashes = pd.util.hash_array(np.array([f"{part}:{label}" for label in labels], dtype=object))
+        take = (hashes == 0) & (codes >= 0)
+        hashes[take] = part_hashes[codes[take]]
+    return hashes
+
+def _identity_codes(df, identity_key):
+    """
+    Возвращает целочисленный код участника для каждого сеанса (в порядке первого появления).
+    Код — первая непустая составляющая ключа.
+    """
+    codes = np.full(len(df), -1, dtype='int64')
+    offset = 0
+    for _, part_codes, labels in _identity_parts(df, identity_key):
+        take = (codes < 0) & (part_codes >= 0)
+        codes[take] = part_codes[take] + offset
+        offset += len(labels)
+
+    # Сеансы без ключа — отдельные участники
+    no_key = codes < 0
+    codes[no_key] = offset + np.arange(int(no_key.sum()))
+    return pd.factorize(codes)[0]
+
+def _identity_parts(df, identity_key):
+    """
+    Кодирует составляющие ключа участника, присутствующие в df.
+    Нормализуются только уникальные значения столбцов, поэтому строковые операции не зависят от числа повторных сеансов.
+    :return: Генератор троек (составляющая, коды строк с -1 для пустых, список нормализованных значений).
+    """
+    for part in identity_key:
+        if part == IDENTITY_NAME:
+            if 'first_name' not in df.columns or 'last_name' not in df.columns:
+                continue
+            first, first_labels = _normalized_codes(df['first_name'])
+            last, last_labels = _normalized_codes(df['last_name'])
+            # Пара (имя, фамилия); пустая часть допустима, пусты обе — ключа нет
+            width = len(last_labels) + 1
+            pairs = (first + 1) * width + (last + 1)
+            present = (first >= 0) | (last >= 0)
+            codes = np.full(len(df), -1, dtype='int64')
+            codes[present], uniques = pd.factorize(pairs[present])
+            labels = [" ".join(filter(None, (first_labels[pair // width - 1] if pair // width else None,
+                                             last_labels[pair % width - 1] if pair % width else None)))
+                      for pair in uniques.tolist()]
+            yield part, codes, labels
+        elif part in df.columns:
+            codes, labels = _normalized_codes(df[part])
+            yield part, codes, labels
+
+def _normalized_codes(column):
+    """
+    Кодирует значения столбца после нормализации (без регистра, пробелы по краям убраны, внутри — одинарные).
+    :return: Пара (коды, список различных нормализованных значений); пустое значение — код -1.
+    """
+    raw_codes, uniques = pd.factorize(column)
+    normalized = [" ".join(str(value).split()).lower() or None for value in uniques]
+    value_codes, values = pd.factorize(pd.Series(normalized, dtype=object))
+    # Последний элемент -1 — для отсутствующих значений (raw_codes == -1)
+    codes = np.append(value_codes, -1)[raw_codes]
+    return codes.astype('int64'), list(values)
+
+def _datetimes(column):
+    """Приводит время (datetime из XLSX или строку вида ДД.ММ.ГГГГ ЧЧ:ММ) к datetime64; нераспознанное — NaT."""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    return pd.to_datetime(column.astype(object), errors='coerce', dayfirst=True)
+
+def _watch_seconds(sessions):
+    """
+    Считает вклад каждого сеанса во время просмотра в секундах. Пересекающиеся сеансы одного участника
+    (например, с двух устройств) не суммируются дважды: из сеанса вычитается часть, уже покрытая предыдущими.
+    """
+    ordered = sessions.sort_values(['code', 'entry'], kind='stable')
+    covered_until = ordered.groupby('code')['exit'].cummax()
+    previous = covered_until.groupby(ordered['code']).shift()
+    start = ordered['entry'].where(previous.isna() | (ordered['entry'] > previous), previous)
+    seconds = (ordered['exit'] - start).dt.total_seconds().clip(lower=0)
+    return seconds.reindex(sessions.index)